@@ -0,0 +1,915 @@
+#! /usr/bin/env python
+"""
+Assemble global finite element matrices on Argyris meshes and cache them
+(and their sparse LU factorizations) on disk.
+
+A cached operator is keyed by the fingerprint of the mesh (see
+ap.mesh.meshes.Mesh.fingerprint), the bilinear form, the quadrature rule,
+and the Dirichlet boundary conditions, so a warm start with the same inputs
+memory-maps the stored arrays instead of assembling or factoring anything.
+For example,
+
+    cache = OperatorCache("cache/", max_bytes=2**30)
+    factors = cache.factorization(mesh, 'biharmonic',
+                                  conditions={'land': 'clamped'})
+    solution = factors.solve(load_vector)
+"""
+import hashlib
+import json
+import os
+import tempfile
+from collections import namedtuple
+import numpy as np
+import ap.numeric as nm
+import ap.mesh.binary as binary
+import ap.mesh.meshtools as meshtools
+
+# The kernel computing the local matrix of each bilinear form and the
+# reference tables it needs: 0 through 5 are the tables of ap.numeric.ref_all
+# (values, dx, dy, dxx, dxy, dyy) and 6 through 9 are the third derivatives
+# (dxxx, dxxy, dxyy, dyyy).
+FORMS = {'mass': ('matrix_mass', (0,)),
+         'betaplane': ('matrix_betaplane', (0, 1, 2)),
+         'stiffness': ('matrix_stiffness', (1, 2)),
+         'biharmonic': ('matrix_biharmonic', (3, 4, 5)),
+         'mass_stabilized': ('matrix_mass_stabilized', (0, 1, 2)),
+         'betaplane_stabilized': ('matrix_betaplane_stabilized', (1, 2)),
+         'stiffness_stabilized': ('matrix_stiffness_stabilized',
+                                  (1, 2, 3, 4, 5)),
+         'biharmonic_stabilized': ('matrix_biharmonic_stabilized',
+                                   (3, 4, 5, 6, 7, 8, 9))}
+
+
+def _reference_tables(form, quadrature, kernels):
+    """
+    Return the reference tables needed by a form at the quadrature points.
+    """
+    if form not in FORMS:
+        raise ValueError("Unknown bilinear form " + str(form))
+    (x, y, weights) = quadrature
+    tables = list(kernels.ref_all(x, y))
+    if max(FORMS[form][1]) > 5:
+        tables.extend(kernels.ref_third_derivatives(x, y))
+    return [tables[index] for index in FORMS[form][1]]
+
+
+def element_chunks(mesh, form, quadrature=None, kernels=nm,
+                   chunk_size=1024):
+    """
+    Compute the local matrices of a bilinear form one block of elements at
+    a time.
+
+    Required Arguments
+    ------------------
+    * mesh : an ArgyrisMesh.
+    * form : a key of FORMS, such as 'mass' or 'biharmonic'.
+
+    Optional Arguments
+    ------------------
+    * quadrature : the tuple (x, y, weights) of a quadrature rule on the
+                   reference triangle. Defaults to the rule of
+                   ap.numeric.get_quad_points.
+    * kernels    : the module providing the kernels (see ap.verify).
+    * chunk_size : the number of elements in each block. Defaults to 1024
+                   (about 3.6 megabytes of local matrices).
+
+    Output
+    ------
+    A generator of Chunk objects, in the order of the elements.
+    """
+    if mesh.elements.shape[1] != 21:
+        raise ValueError("Assembly requires an ArgyrisMesh")
+    if chunk_size < 1:
+        raise ValueError("The chunk size must be positive")
+    if quadrature is None:
+        quadrature = kernels.get_quad_points()
+    tables = _reference_tables(form, quadrature, kernels)
+    kernel = getattr(kernels, FORMS[form][0])
+    weights = quadrature[2]
+
+    for first in range(0, len(mesh.elements), chunk_size):
+        elements = mesh.elements[first:first + chunk_size]
+        corners = mesh.points[mesh.node_points[elements[:, 0:3] - 1]]
+        xs = np.ascontiguousarray(corners[:, :, 0], dtype=np.float64)
+        ys = np.ascontiguousarray(corners[:, :, 1], dtype=np.float64)
+        matrices = np.empty((len(elements), 21, 21))
+        for index in range(len(elements)):
+            (C, B, b) = kernels.physical_maps(xs[index], ys[index])
+            matrices[index] = kernel(C, B, *(tables + [weights]))
+        yield Chunk(first, elements, matrices)
+
+
+class Chunk(namedtuple('Chunk', ['first', 'elements', 'matrices'])):
+    """
+    The local matrices of a block of elements: elements holds the rows
+    first through first + len(elements) - 1 (zero-based) of mesh.elements
+    and matrices the corresponding (k, 21, 21) local matrices.
+    """
+    __slots__ = ()
+
+    def triplets(self):
+        """
+        Return the tuple (rows, columns, values) of the (zero-based, int64)
+        global coordinates and values of every local matrix entry.
+        """
+        elements = self.elements.astype(np.int64) - 1
+        return (np.repeat(elements, 21, axis=1).ravel(),
+                np.tile(elements, (1, 21)).ravel(), self.matrices.ravel())
+
+
+def element_matrices(mesh, form, quadrature=None, kernels=nm):
+    """
+    Compute the local matrix of a bilinear form on every element.
+
+    Required Arguments
+    ------------------
+    * mesh : an ArgyrisMesh.
+    * form : a key of FORMS, such as 'mass' or 'biharmonic'.
+
+    Optional Arguments
+    ------------------
+    * quadrature, kernels : see element_chunks.
+
+    Output
+    ------
+    An (E, 21, 21) array, whose rows and columns follow the columns of
+    mesh.elements.
+    """
+    matrices = np.empty((len(mesh.elements), 21, 21))
+    for chunk in element_chunks(mesh, form, quadrature, kernels):
+        matrices[chunk.first:chunk.first + len(chunk.matrices)] = \
+            chunk.matrices
+    return matrices
+
+
+def triplet_chunks(mesh, form, quadrature=None, kernels=nm, chunk_size=1024):
+    """
+    Generate the triplet (IJV) form of the global matrix of a bilinear form
+    in chunks of 441*chunk_size entries (see Chunk.triplets), so that it
+    never has to fit in memory at once. The arguments are the same as those
+    of element_chunks.
+    """
+    for chunk in element_chunks(mesh, form, quadrature, kernels, chunk_size):
+        yield chunk.triplets()
+
+
+def _sum_duplicates(codes, values):
+    """
+    Sort the (int64) codes of matrix entries and sum the values of equal
+    codes. Return the tuple (unique codes, summed values).
+    """
+    order = np.argsort(codes, kind='mergesort')
+    codes = codes[order]
+    starts = np.flatnonzero(np.concatenate(([True],
+                                            codes[1:] != codes[:-1])))
+    return (codes[starts], np.add.reduceat(values[order], starts))
+
+
+class CSRSink(object):
+    """
+    Reduce chunks of triplets in to a compressed sparse row matrix as they
+    arrive. Duplicate entries are summed immediately and the partial sums
+    are merged like a binary counter (two partial sums of the same level
+    are merged in to one of the next level), so each entry is merged
+    O(log(chunks)) times and the memory used is at most a few times that of
+    the result plus one chunk. Entries are never dropped, even if they sum
+    to zero, so the sparsity pattern depends on the triplets alone.
+
+    Required Arguments
+    ------------------
+    * shape : the shape of the matrix.
+
+    Methods
+    -------
+    * add(rows, columns, values) : add a chunk of (zero-based) triplets.
+    * finish() : return the matrix as a scipy.sparse.csr_matrix.
+    """
+    def __init__(self, shape):
+        self.shape = tuple(shape)
+        self._partial_sums = []
+
+    def add(self, rows, columns, values):
+        """Add a chunk of triplets to the matrix."""
+        codes = np.asarray(rows, dtype=np.int64)*self.shape[1] \
+            + np.asarray(columns, dtype=np.int64)
+        (codes, values) = _sum_duplicates(codes,
+                                          np.asarray(values, dtype=np.float64))
+        level = 0
+        while self._partial_sums and self._partial_sums[-1][0] == level:
+            (_, other_codes, other_values) = self._partial_sums.pop()
+            (codes, values) = _sum_duplicates(
+                np.concatenate((other_codes, codes)),
+                np.concatenate((other_values, values)))
+            level += 1
+        self._partial_sums.append((level, codes, values))
+
+    def finish(self):
+        """Merge the partial sums in to a scipy.sparse.csr_matrix."""
+        import scipy.sparse as sparse
+
+        if self._partial_sums:
+            (codes, values) = _sum_duplicates(
+                np.concatenate([partial[1] for partial in
+                                self._partial_sums]),
+                np.concatenate([partial[2] for partial in
+                                self._partial_sums]))
+        else:
+            (codes, values) = (np.zeros(0, dtype=np.int64), np.zeros(0))
+        self._partial_sums = []
+        index_dtype = np.intc if max(self.shape[1], len(codes)) \
+            < np.iinfo(np.intc).max else np.int64
+        indptr = np.searchsorted(codes, np.arange(self.shape[0] + 1,
+                                                  dtype=np.int64)
+                                 * self.shape[1]).astype(index_dtype)
+        indices = (codes % self.shape[1]).astype(index_dtype)
+        return sparse.csr_matrix((values, indices, indptr), shape=self.shape)
+
+
+class DiskSink(object):
+    """
+    Write chunks of triplets to disk, one file (in the format of
+    ap.mesh.binary) per chunk, for out-of-core assembly. Read them back
+    (memory-mapped) with load_triplets, for example in to a CSRSink.
+
+    Required Arguments
+    ------------------
+    * prefix : the files are named prefix + '_000000.apt', and so on.
+    * shape  : the shape of the matrix.
+
+    Methods
+    -------
+    * add(rows, columns, values) : write a chunk of (zero-based) triplets.
+    * finish() : return the list of the names of the written files.
+    """
+    def __init__(self, prefix, shape):
+        self.prefix = prefix
+        self.shape = tuple(shape)
+        self.file_names = []
+
+    def add(self, rows, columns, values):
+        """Write a chunk of triplets to a new file."""
+        index_dtype = np.intc if max(self.shape) < np.iinfo(np.intc).max \
+            else np.int64
+        file_name = "{0}_{1:06d}.apt".format(self.prefix, len(self.file_names))
+        binary.save_arrays(file_name,
+                           {'rows': np.asarray(rows, dtype=index_dtype),
+                            'columns': np.asarray(columns, dtype=index_dtype),
+                            'values': np.asarray(values, dtype=np.float64)},
+                           {'shape': list(self.shape)})
+        self.file_names.append(file_name)
+
+    def finish(self):
+        """Return the list of the names of the written files."""
+        return list(self.file_names)
+
+
+def load_triplets(file_names, mmap_mode='r'):
+    """
+    Generate the (rows, columns, values) triplets stored by a DiskSink, one
+    memory-mapped chunk at a time.
+    """
+    for file_name in file_names:
+        (arrays, attributes) = binary.load_arrays(file_name,
+                                                  mmap_mode=mmap_mode)
+        yield (arrays['rows'], arrays['columns'], arrays['values'])
+
+
+def assemble(mesh, form, quadrature=None, kernels=nm, chunk_size=1024,
+             sink=None):
+    """
+    Assemble the global matrix of a bilinear form one block of elements at
+    a time, so that the triplet form of the matrix is never stored at once.
+
+    Required Arguments
+    ------------------
+    * mesh : an ArgyrisMesh.
+    * form : a key of FORMS.
+
+    Optional Arguments
+    ------------------
+    * quadrature, kernels, chunk_size : see element_chunks.
+    * sink : where the triplets go: anything with add(rows, columns, values)
+             and finish() methods, such as a DiskSink. Defaults to a CSRSink.
+
+    Output
+    ------
+    The result of sink.finish(); by default, a scipy.sparse.csr_matrix with
+    one row and column per node. Every entry coupling two nodes of an
+    element is stored (even if it is zero), so the sparsity pattern depends
+    on the mesh alone.
+    """
+    if sink is None:
+        sink = CSRSink((mesh.num_nodes, mesh.num_nodes))
+    for (rows, columns, values) in triplet_chunks(mesh, form, quadrature,
+                                                  kernels, chunk_size):
+        sink.add(rows, columns, values)
+    return sink.finish()
+
+
+def qg_jacobian(mesh, psi, quadrature=None, jacobian=False, chunk_size=1024,
+                kernels=nm):
+    """
+    Evaluate the quasi-geostrophic advection term J(psi, laplacian(psi)),
+    where J(a, b) = a_x b_y - a_y b_x, on a whole mesh with the native
+    kernel ap.numeric.qg_jacobian.
+
+    Required Arguments
+    ------------------
+    * mesh : an ArgyrisMesh.
+    * psi  : the global coefficient vector (indexed by node number - 1).
+
+    Optional Arguments
+    ------------------
+    * quadrature : see element_chunks. The default rule (degree 13) is
+                   exact for this term on straight-sided triangles.
+    * jacobian   : if True, also assemble the derivative of the residual
+                   with respect to psi. Defaults to False.
+    * chunk_size : the number of elements whose local Jacobians are
+                   computed at once (see element_chunks).
+    * kernels    : the module providing the kernels.
+
+    Output
+    ------
+    The residual vector, whose i-th entry is the integral of
+    J(psi, laplacian(psi)) times the i-th basis function, or, if jacobian is
+    True, the tuple (residual, Jacobian) where the Jacobian is a
+    scipy.sparse.csr_matrix (see CSRSink).
+    """
+    if mesh.elements.shape[1] != 21:
+        raise ValueError("The advection term requires an ArgyrisMesh")
+    if quadrature is None:
+        quadrature = kernels.get_quad_points()
+    (x, y, weights) = quadrature
+    tables = list(kernels.ref_all(x, y)[0:3]) \
+        + list(kernels.ref_third_derivatives(x, y))
+    psi = np.asarray(psi, dtype=np.float64)
+    if psi.shape != (mesh.num_nodes,):
+        raise ValueError("psi must have one entry per node")
+    dof_map = DofMap(mesh, kernels=kernels)
+
+    if jacobian:
+        sink = CSRSink((mesh.num_nodes, mesh.num_nodes))
+        step = chunk_size
+    else:
+        step = max(dof_map.num_elements, 1)
+    residual = np.zeros(mesh.num_nodes)
+    for first in range(0, dof_map.num_elements, step):
+        window = slice(first, first + step)
+        result = kernels.qg_jacobian(
+            dof_map.x[window], dof_map.y[window],
+            dof_map.element_dofs[window], psi, *(tables + [weights]),
+            jacobians=jacobian)
+        if jacobian:
+            residual += result[0]
+            sink.add(*Chunk(first, mesh.elements[window],
+                            result[1]).triplets())
+        else:
+            residual += result
+    if jacobian:
+        return (residual, sink.finish())
+    return residual
+
+
+class DofMap(object):
+    """
+    The map from the local degrees of freedom of every element of an
+    ArgyrisMesh to the global ones, with native gather and scatter kernels.
+
+    Required Arguments
+    ------------------
+    * mesh : an ArgyrisMesh.
+
+    Optional Arguments
+    ------------------
+    * kernels : the module providing the kernels (see ap.verify).
+
+    Attributes
+    ----------
+    * element_dofs : the (E, 21) int32 array of the zero-based global degree
+                     of freedom of every local one (mesh.elements - 1).
+    * num_dofs     : the number of global degrees of freedom.
+    * x, y         : the (E, 3) arrays of the corner coordinates of every
+                     element.
+
+    Methods
+    -------
+    * gather(fields) : the (E, 21) local coefficients of a global vector or
+      the (F, E, 21) coefficients of a (F, num_dofs) matrix of them (such
+      as the members of an ensemble).
+    * scatter_add(local, out=None) : the transpose of gather; sum local
+      coefficients in to one or more global vectors.
+    * evaluate(fields, quadrature=None) : the values and first and second
+      derivatives of one or more global vectors at the quadrature points of
+      every element, computed in one pass without forming the physical
+      basis functions.
+    """
+    def __init__(self, mesh, kernels=nm):
+        if mesh.elements.shape[1] != 21:
+            raise ValueError("A DofMap requires an ArgyrisMesh")
+        if mesh.num_nodes > np.iinfo(np.intc).max:
+            raise ValueError("Too many nodes for 32 bit indices")
+        self.kernels = kernels
+        self.num_dofs = mesh.num_nodes
+        self.element_dofs = np.ascontiguousarray(mesh.elements - 1,
+                                                 dtype=np.intc)
+        corners = mesh.points[mesh.node_points[mesh.elements[:, 0:3] - 1]]
+        self.x = np.ascontiguousarray(corners[:, :, 0], dtype=np.float64)
+        self.y = np.ascontiguousarray(corners[:, :, 1], dtype=np.float64)
+
+    @property
+    def num_elements(self):
+        return self.element_dofs.shape[0]
+
+    def _check_fields(self, fields):
+        fields = np.asarray(fields, dtype=np.float64)
+        if fields.ndim not in (1, 2) or fields.shape[-1] != self.num_dofs:
+            raise ValueError("fields must be a vector or a matrix with one "
+                             "column per degree of freedom")
+        return fields
+
+    def gather(self, fields):
+        """
+        Return the local coefficients of one (num_dofs,) vector as a (E, 21)
+        array or of a (F, num_dofs) matrix of vectors as a (F, E, 21) array.
+        """
+        return self.kernels.gather(self.element_dofs,
+                                   self._check_fields(fields))
+
+    def scatter_add(self, local, out=None):
+        """
+        Sum (E, 21) or (F, E, 21) local coefficients in to a (num_dofs,)
+        vector or a (F, num_dofs) matrix. If out is given it is updated in
+        place (it must be a C-contiguous float64 array) and returned.
+        """
+        local = np.asarray(local, dtype=np.float64)
+        if local.shape[-2:] != self.element_dofs.shape or local.ndim > 3:
+            raise ValueError("local must have the shape (E, 21) or "
+                             "(F, E, 21)")
+        if out is not None and \
+                out.shape != local.shape[0:-2] + (self.num_dofs,):
+            raise ValueError("out does not match the shape of local")
+        return self.kernels.scatter_add(self.element_dofs, local,
+                                        self.num_dofs, out=out)
+
+    def evaluate(self, fields, quadrature=None):
+        """
+        Evaluate one or more global vectors and their first and second
+        derivatives at the quadrature points of every element.
+
+        Required Arguments
+        ------------------
+        * fields : a (num_dofs,) vector or a (F, num_dofs) matrix of vectors.
+
+        Optional Arguments
+        ------------------
+        * quadrature : see element_chunks.
+
+        Output
+        ------
+        A (6, E, N) array for one vector or a (6, F, E, N) array for F
+        vectors, where N is the number of quadrature points and the first
+        index runs over the values, dx, dy, dxx, dxy, and dyy.
+        """
+        if quadrature is None:
+            quadrature = self.kernels.get_quad_points()
+        (x, y, weights) = quadrature
+        return self.kernels.gather_evaluate(
+            self.x, self.y, self.element_dofs, self._check_fields(fields),
+            self.kernels.ref_all(x, y))
+
+
+# Local columns of the six degrees of freedom (value, dx, dy, dxx, dxy, dyy)
+# of each vertex of an Argyris element and of the three normal derivatives.
+_VERTEX_COLUMNS = np.array([[0, 3, 4, 9, 10, 11], [1, 5, 6, 12, 13, 14],
+                            [2, 7, 8, 15, 16, 17]])
+_EDGE_COLUMNS = np.array([18, 19, 20])
+
+
+def _block_sparse(block_rows, block_columns, blocks, shape):
+    """
+    Sum the (K, r, c) blocks with the given (zero-based) block coordinates
+    in to a scipy.sparse.bsr_matrix with shape[0] by shape[1] blocks.
+    """
+    import scipy.sparse as sparse
+
+    (num_rows, num_columns) = blocks.shape[1:]
+    codes = block_rows.astype(np.int64)*shape[1] + block_columns
+    order = np.argsort(codes, kind='mergesort')
+    codes = codes[order]
+    starts = np.flatnonzero(np.concatenate(([True], codes[1:] != codes[:-1])))
+    data = np.add.reduceat(blocks[order], starts, axis=0)
+    indices = (codes[starts] % shape[1]).astype(np.intc)
+    indptr = np.searchsorted(codes[starts]//shape[1],
+                             np.arange(shape[0] + 1)).astype(np.intc)
+    return sparse.bsr_matrix((data, indices, indptr),
+                             shape=(shape[0]*num_rows, shape[1]*num_columns))
+
+
+def assemble_blocked(mesh, form, quadrature=None, kernels=nm):
+    """
+    Assemble the global matrix of a bilinear form directly in to block
+    sparse storage.
+
+    Required Arguments
+    ------------------
+    * mesh : an ArgyrisMesh numbered in vertex blocks (see
+             ArgyrisMesh.renumber and ArgyrisMesh.vertex_blocked).
+    * form : a key of FORMS.
+
+    Optional Arguments
+    ------------------
+    * quadrature, kernels : see element_chunks.
+
+    Output
+    ------
+    A BlockedMatrix.
+    """
+    if not mesh.vertex_blocked:
+        raise ValueError("The mesh must be numbered in vertex blocks; see "
+                         "ArgyrisMesh.renumber")
+    matrices = element_matrices(mesh, form, quadrature, kernels)
+    num_vertices = len(mesh.stacked_nodes)
+    num_edges = mesh.num_nodes - 6*num_vertices
+    vertices = (mesh.elements[:, 0:3].astype(np.int64) - 1)//6
+    edges = mesh.elements[:, 18:21].astype(np.int64) - 1 - 6*num_vertices
+
+    rows = _VERTEX_COLUMNS[:, np.newaxis, :, np.newaxis]
+    columns = _VERTEX_COLUMNS[np.newaxis, :, np.newaxis, :]
+    vertex = _block_sparse(
+        np.repeat(vertices, 3, axis=1).ravel(),
+        np.tile(vertices, (1, 3)).ravel(),
+        matrices[:, rows, columns].reshape((-1, 6, 6)),
+        (num_vertices, num_vertices))
+    vertex_edge = _block_sparse(
+        np.repeat(vertices, 3, axis=1).ravel(),
+        np.tile(edges, (1, 3)).ravel(),
+        matrices[:, _VERTEX_COLUMNS[:, np.newaxis, :],
+                 _EDGE_COLUMNS[np.newaxis, :, np.newaxis]].reshape(
+                     (-1, 6, 1)),
+        (num_vertices, num_edges)).tocsr()
+    edge_vertex = _block_sparse(
+        np.repeat(edges, 3, axis=1).ravel(),
+        np.tile(vertices, (1, 3)).ravel(),
+        matrices[:, _EDGE_COLUMNS[:, np.newaxis, np.newaxis],
+                 _VERTEX_COLUMNS[np.newaxis, :, :]].reshape((-1, 1, 6)),
+        (num_edges, num_vertices)).tocsr()
+    edge = _block_sparse(
+        np.repeat(edges, 3, axis=1).ravel(),
+        np.tile(edges, (1, 3)).ravel(),
+        matrices[:, _EDGE_COLUMNS[:, np.newaxis],
+                 _EDGE_COLUMNS[np.newaxis, :]].reshape((-1, 1, 1)),
+        (num_edges, num_edges)).tocsr()
+    return BlockedMatrix(vertex, vertex_edge, edge_vertex, edge)
+
+
+class BlockedMatrix(object):
+    """
+    A global matrix on a mesh numbered in vertex blocks, split in to
+
+        [vertex       vertex_edge]
+        [edge_vertex  edge       ]
+
+    where the first 6*V rows and columns belong to the vertices and the
+    rest to the normal derivatives. Nothing is padded: vertex, which holds
+    most of the entries, is a scipy.sparse.bsr_matrix of 6 by 6 blocks (one
+    column index per 36 entries) and the other parts are CSR matrices
+    (scipy multiplies by those faster than by skinny 6 by 1 blocks).
+
+    Required Arguments
+    ------------------
+    * vertex, vertex_edge, edge_vertex, edge : the blocks.
+
+    Methods
+    -------
+    * dot(x) : the product with a vector (or an (N, k) array).
+    * tocsr() : the whole matrix in compressed sparse row format.
+    * aslinearoperator() : the matrix as a scipy LinearOperator.
+    * vertex_diagonal() : the (V, 6, 6) diagonal blocks of the vertices.
+    """
+    def __init__(self, vertex, vertex_edge, edge_vertex, edge):
+        self.vertex = vertex
+        self.vertex_edge = vertex_edge
+        self.edge_vertex = edge_vertex
+        self.edge = edge
+        self.num_vertex_dofs = vertex.shape[0]
+        size = vertex.shape[0] + edge.shape[0]
+        self.shape = (size, size)
+
+    def dot(self, x):
+        """Multiply the matrix by a vector or by every column of an array."""
+        split = self.num_vertex_dofs
+        x = np.asarray(x)
+        result = np.empty(x.shape)
+        result[0:split] = self.vertex.dot(x[0:split])
+        result[0:split] += self.vertex_edge.dot(x[split:])
+        result[split:] = self.edge_vertex.dot(x[0:split])
+        result[split:] += self.edge.dot(x[split:])
+        return result
+
+    def tocsr(self):
+        """Convert the matrix to compressed sparse row format."""
+        import scipy.sparse as sparse
+
+        matrix = sparse.bmat([[self.vertex, self.vertex_edge],
+                              [self.edge_vertex, self.edge]], format='csr')
+        matrix.sort_indices()
+        return matrix
+
+    def aslinearoperator(self):
+        """Wrap the matrix as a scipy.sparse.linalg.LinearOperator."""
+        import scipy.sparse.linalg as linalg
+
+        return linalg.LinearOperator(self.shape, matvec=self.dot,
+                                     matmat=self.dot, dtype=np.float64)
+
+    def vertex_diagonal(self):
+        """Return the (V, 6, 6) array of the diagonal vertex blocks."""
+        vertex = self.vertex
+        rows = np.repeat(np.arange(len(vertex.indptr) - 1),
+                         np.diff(vertex.indptr))
+        diagonal = np.zeros((len(vertex.indptr) - 1, 6, 6))
+        on_diagonal = vertex.indices == rows
+        diagonal[rows[on_diagonal]] = vertex.data[on_diagonal]
+        return diagonal
+
+
+class Factorization(object):
+    """
+    A sparse LU factorization P_r A P_c = L U stored as arrays, which may be
+    memory-mapped from an OperatorCache file. Solving only reads the arrays,
+    so nothing is refactored when the factors are loaded.
+
+    Required Arguments
+    ------------------
+    * lower, upper : the triangular factors as tuples (indptr, indices,
+                     data) of compressed sparse row arrays.
+    * perm_r       : the row permutation (as computed by
+                     scipy.sparse.linalg.splu).
+    * perm_c       : the column permutation.
+
+    Methods
+    -------
+    * solve(rhs) : solve A x = rhs for a vector (or for each column of an
+                   (N, k) array).
+    """
+    def __init__(self, lower, upper, perm_r, perm_c):
+        self.lower = lower
+        self.upper = upper
+        self.perm_r = perm_r
+        self.perm_c = perm_c
+        self.shape = (len(perm_r), len(perm_c))
+
+    @classmethod
+    def from_superlu(cls, superlu):
+        """Copy the factors out of a scipy SuperLU object."""
+        def parts(factor):
+            factor = factor.tocsr()
+            return (factor.indptr.astype(np.intc),
+                    factor.indices.astype(np.intc), factor.data)
+        return cls(parts(superlu.L), parts(superlu.U), superlu.perm_r,
+                   superlu.perm_c)
+
+    def solve(self, rhs):
+        """Solve the factored system for one or more right hand sides."""
+        rhs = np.asarray(rhs, dtype=np.float64)
+        if rhs.ndim == 2:
+            return np.column_stack([self.solve(column) for column in rhs.T])
+        permuted = np.empty(self.shape[0])
+        permuted[self.perm_r] = rhs
+        permuted = nm.sparse_triangular_solve(*(self.lower + (permuted,)),
+                                              lower=True)
+        permuted = nm.sparse_triangular_solve(*(self.upper + (permuted,)),
+                                              lower=False)
+        return permuted[self.perm_c]
+
+    # the names of the arrays written by _arrays.
+    _ARRAY_NAMES = tuple(factor + '/' + part
+                         for factor in ['lower', 'upper']
+                         for part in ['indptr', 'indices', 'data']) \
+        + ('perm_r', 'perm_c')
+
+    def _arrays(self):
+        """Return the dictionary of arrays to save."""
+        return dict(zip(self._ARRAY_NAMES, self.lower + self.upper
+                        + (self.perm_r, self.perm_c)))
+
+    @classmethod
+    def _from_arrays(cls, arrays):
+        """Wrap the arrays written by _arrays without copying them."""
+        parts = [arrays[name] for name in cls._ARRAY_NAMES]
+        return cls(tuple(parts[0:3]), tuple(parts[3:6]), parts[6], parts[7])
+
+
+class OperatorCache(object):
+    """
+    An on-disk cache of assembled operators and their sparse LU
+    factorizations. Every entry is a single file (in the format of
+    ap.mesh.binary) named after its key; reading an entry memory-maps it.
+    When the files take more than max_bytes the least recently used ones
+    are deleted.
+
+    Required Arguments
+    ------------------
+    * directory : the directory holding the cache (created if necessary).
+
+    Optional Arguments
+    ------------------
+    * max_bytes : the largest total size of the cache files. Defaults to one
+                  gigabyte.
+    * mmap_mode : how to load the arrays (see ap.mesh.binary.load_arrays).
+                  The default, 'r', maps them read-only; use 'c' to modify
+                  loaded operators in place.
+
+    Methods
+    -------
+    * key(mesh, form, quadrature=None, conditions=None) : the hexadecimal key
+      of an operator.
+
+    * operator(mesh, form, quadrature=None, conditions=None) : the assembled
+      matrix (a scipy.sparse.csr_matrix) of a form, with Dirichlet
+      conditions (see ArgyrisMesh.get_dirichlet_dofs) applied.
+
+    * factorization(mesh, form, quadrature=None, conditions=None,
+      permc_spec='COLAMD') : a Factorization of that matrix.
+
+    * evict(keep=()) : delete the least recently used files until the cache
+      fits in max_bytes.
+
+    * clear() : delete every file in the cache.
+    """
+    _SUFFIXES = ('.apo', '.apf')
+
+    def __init__(self, directory, max_bytes=2**30, mmap_mode='r'):
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.mmap_mode = mmap_mode
+        self.evict()
+
+    def key(self, mesh, form, quadrature=None, conditions=None):
+        """
+        Return the hexadecimal digest identifying an operator.
+
+        Required Arguments
+        ------------------
+        * mesh : an ArgyrisMesh.
+        * form : a key of FORMS.
+
+        Optional Arguments
+        ------------------
+        * quadrature : see element_chunks.
+        * conditions : a dictionary relating node collection names to kinds
+                       of Dirichlet boundary conditions (see
+                       ArgyrisMesh.get_dirichlet_dofs). Defaults to none.
+        """
+        if form not in FORMS:
+            raise ValueError("Unknown bilinear form " + str(form))
+        if quadrature is None:
+            quadrature = nm.get_quad_points()
+        digest = hashlib.sha256(mesh.fingerprint().encode('utf-8'))
+        digest.update(form.encode('utf-8'))
+        for array in quadrature:
+            digest.update(np.ascontiguousarray(array, dtype='<f8').data)
+        digest.update(json.dumps(sorted((conditions or dict()).items()))
+                      .encode('utf-8'))
+        return digest.hexdigest()
+
+    def _file_name(self, key, suffix):
+        return os.path.join(self.directory, key + suffix)
+
+    def _load(self, file_name, names, attribute_names):
+        """
+        Return the arrays and attributes of a cache file (marking it as
+        recently used) or None if there is no such file. A file which cannot
+        be read or lacks one of the named arrays or attributes (such as one
+        left behind by a crashed writer) is deleted and treated as missing.
+        """
+        try:
+            (arrays, attributes) = binary.load_arrays(
+                file_name, mmap_mode=self.mmap_mode)
+        except (IOError, OSError):
+            return None
+        except (ValueError, KeyError):
+            self._discard(file_name)
+            return None
+        if any(name not in arrays for name in names) or \
+                any(name not in attributes for name in attribute_names):
+            self._discard(file_name)
+            return None
+        try:
+            os.utime(file_name, None)
+        except (IOError, OSError):
+            pass
+        return (arrays, attributes)
+
+    @staticmethod
+    def _discard(file_name):
+        """Delete a cache file unless another process already did."""
+        try:
+            os.remove(file_name)
+        except (IOError, OSError):
+            pass
+
+    def _store(self, file_name, arrays, attributes):
+        """
+        Write a cache file atomically (so that concurrent readers never see
+        a partial file) and then evict old files.
+        """
+        (handle, temporary_name) = tempfile.mkstemp(dir=self.directory,
+                                                    suffix='.tmp')
+        os.close(handle)
+        try:
+            binary.save_arrays(temporary_name, arrays, attributes)
+            os.rename(temporary_name, file_name)
+        except BaseException:
+            os.remove(temporary_name)
+            raise
+        self.evict(keep=(file_name,))
+
+    def operator(self, mesh, form, quadrature=None, conditions=None):
+        """
+        Return the matrix of a form with homogeneous Dirichlet conditions
+        applied (see meshtools.apply_dirichlet), loading it from the cache if
+        possible and assembling and storing it otherwise. The arguments are
+        the same as those of key.
+        """
+        import scipy.sparse as sparse
+
+        file_name = self._file_name(
+            self.key(mesh, form, quadrature, conditions), '.apo')
+        loaded = self._load(file_name, ['indptr', 'indices', 'data'],
+                            ['shape'])
+        if loaded is None:
+            matrix = assemble(mesh, form, quadrature)
+            if conditions:
+                meshtools.apply_dirichlet(
+                    matrix, np.zeros(matrix.shape[0]),
+                    mesh.get_dirichlet_dofs(conditions))
+            self._store(file_name, {'indptr': matrix.indptr,
+                                    'indices': matrix.indices,
+                                    'data': matrix.data},
+                        {'shape': list(matrix.shape)})
+            return matrix
+        (arrays, attributes) = loaded
+        return sparse.csr_matrix((arrays['data'], arrays['indices'],
+                                  arrays['indptr']),
+                                 shape=tuple(attributes['shape']), copy=False)
+
+    def factorization(self, mesh, form, quadrature=None, conditions=None,
+                      permc_spec='COLAMD'):
+        """
+        Return the sparse LU factorization (see Factorization) of the matrix
+        returned by operator, loading it from the cache if possible and
+        factoring (with scipy.sparse.linalg.splu and the given column
+        ordering) and storing it otherwise.
+        """
+        import scipy.sparse.linalg as linalg
+
+        key = self.key(mesh, form, quadrature, conditions)
+        file_name = self._file_name(key, '.apf')
+        loaded = self._load(file_name, list(Factorization._ARRAY_NAMES),
+                            ['permc_spec'])
+        if loaded is not None and loaded[1]['permc_spec'] == permc_spec:
+            return Factorization._from_arrays(loaded[0])
+        matrix = self.operator(mesh, form, quadrature, conditions)
+        factors = Factorization.from_superlu(
+            linalg.splu(matrix.tocsc(), permc_spec=permc_spec))
+        self._store(file_name, factors._arrays(), {'permc_spec': permc_spec})
+        return factors
+
+    def _entries(self):
+        """
+        Return the list of (modification time, size, path) of entries,
+        skipping any that another process deletes while they are listed.
+        """
+        entries = []
+        for name in os.listdir(self.directory):
+            if os.path.splitext(name)[1] in self._SUFFIXES:
+                path = os.path.join(self.directory, name)
+                try:
+                    status = os.stat(path)
+                except (IOError, OSError):
+                    continue
+                entries.append((status.st_mtime, status.st_size, path))
+        return sorted(entries)
+
+    def evict(self, keep=()):
+        """
+        Delete the least recently used files (except those in keep) until
+        the cache takes at most max_bytes. Memory maps of deleted files
+        remain valid.
+        """
+        entries = self._entries()
+        total = sum(size for (_, size, _) in entries)
+        for (_, size, path) in entries:
+            if total <= self.max_bytes:
+                break
+            if path not in keep:
+                self._discard(path)
+                total -= size
+
+    def clear(self):
+        """Delete every file in the cache."""
+        for (_, _, path) in self._entries():
+            self._discard(path)
@@ -0,0 +1,111 @@
+#! /usr/bin/env python
+"""
+A single-file binary container for the arrays of a mesh.
+
+The file starts with a short magic string and the length of a JSON header
+describing every array (dtype, shape, and offset). The arrays follow,
+each aligned to a 64 byte boundary, so that they may be memory-mapped in
+place. Loading a mesh therefore costs almost nothing until the data is
+touched, and several processes reading the same file share its pages.
+"""
+import json
+import mmap
+import struct
+import numpy as np
+
+_MAGIC = b"APMESH01"
+_ALIGNMENT = 64
+
+
+def _aligned(offset):
+    """Round offset up to the next multiple of the alignment."""
+    return (offset + _ALIGNMENT - 1)//_ALIGNMENT*_ALIGNMENT
+
+
+def save_arrays(file_name, arrays, attributes=None):
+    """
+    Save a collection of arrays (and some JSON-compatible attributes) to a
+    single binary file.
+
+    Required Arguments
+    ------------------
+    * file_name : path of the output file.
+
+    * arrays    : dictionary relating names to numpy arrays.
+
+    Optional Arguments
+    ------------------
+    * attributes : dictionary of small JSON-compatible values (strings,
+                   numbers, lists) saved in the header.
+    """
+    if attributes is None:
+        attributes = dict()
+    arrays = {name: np.ascontiguousarray(array)
+              for name, array in arrays.items()}
+
+    # offsets are relative to the (aligned) end of the header.
+    descriptions = dict()
+    offset = 0
+    for name in sorted(arrays.keys()):
+        descriptions[name] = {'dtype': arrays[name].dtype.str,
+                              'shape': list(arrays[name].shape),
+                              'offset': offset}
+        offset = _aligned(offset + arrays[name].nbytes)
+    header = json.dumps({'attributes': attributes,
+                         'arrays': descriptions}).encode('utf-8')
+    data_start = _aligned(len(_MAGIC) + 8 + len(header))
+
+    with open(file_name, 'wb') as out_file:
+        out_file.write(_MAGIC)
+        out_file.write(struct.pack('<Q', len(header)))
+        out_file.write(header)
+        for name in sorted(arrays.keys()):
+            padding = data_start + descriptions[name]['offset'] \
+                - out_file.tell()
+            out_file.write(b"\0"*padding)
+            out_file.write(arrays[name].tobytes())
+
+
+def load_arrays(file_name, mmap_mode='r'):
+    """
+    Load the arrays and attributes stored by save_arrays. Return the tuple
+    (arrays, attributes).
+
+    Required Arguments
+    ------------------
+    * file_name : path of the input file.
+
+    Optional Arguments
+    ------------------
+    * mmap_mode : 'r' (default) to memory-map the arrays read-only, 'c' to
+                  memory-map them copy-on-write (changes are never written
+                  back to the file), or None to read them in to memory.
+    """
+    with open(file_name, 'rb') as in_file:
+        if mmap_mode == 'r':
+            contents = mmap.mmap(in_file.fileno(), 0, access=mmap.ACCESS_READ)
+        elif mmap_mode == 'c':
+            contents = mmap.mmap(in_file.fileno(), 0, access=mmap.ACCESS_COPY)
+        elif mmap_mode is None:
+            contents = bytearray(in_file.read())
+        else:
+            raise ValueError("mmap_mode must be 'r', 'c', or None")
+
+    if contents[0:len(_MAGIC)] != _MAGIC or len(contents) < len(_MAGIC) + 8:
+        raise ValueError(file_name + " is not a binary mesh file")
+    (header_length,) = struct.unpack('<Q', contents[len(_MAGIC):
+                                                    len(_MAGIC) + 8])
+    header_start = len(_MAGIC) + 8
+    header = json.loads(contents[header_start:header_start + header_length]
+                        .decode('utf-8'))
+    data_start = _aligned(header_start + header_length)
+
+    arrays = dict()
+    for name, description in header['arrays'].items():
+        dtype = np.dtype(description['dtype'])
+        shape = tuple(description['shape'])
+        count = int(np.prod(shape))
+        offset = data_start + description['offset']
+        arrays[name] = np.frombuffer(contents, dtype=dtype, count=count,
+                                     offset=offset).reshape(shape)
+    return (arrays, header['attributes'])
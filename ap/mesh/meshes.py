@@ -1,8 +1,15 @@
 #! /usr/bin/env python
 """Collection of classes for representing finite element meshes."""
+import hashlib
+import json
 import math
 import numpy as np
 from collections import namedtuple
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+import ap.mesh.binary as binary
 import ap.mesh.meshtools as meshtools
 import ap.mesh.parsers as parsers
 
@@ -37,7 +44,10 @@ def mesh_factory(*args, **kwargs):
                        Defaults to None. This is not implemented yet.
 
     * projection     : function that projects nodes. Defaults to None
-                       (no projection)
+                       (no projection). Projections marked with
+                       ap.mesh.projections.vectorized (such as those in
+                       that module) project every node in one call; see
+                       meshtools.project_nodes.
 
     * borders        : a dictionary correlating names with GMSH 'Physical
                        Line' attributes. For example,
@@ -64,7 +74,460 @@ def mesh_factory(*args, **kwargs):
         return Mesh(parsed_mesh, **kwargs)
 
 
-class Mesh(object):
+def refine(mesh, levels=1, **kwargs):
+    """
+    Uniformly refine a mesh by splitting every element in to four, levels
+    times (see meshtools.red_refinement), and convert the result to a Mesh
+    or ArgyrisMesh object. The refined meshes are nested.
+
+    Required Arguments
+    ------------------
+    * mesh : a parsed mesh, Mesh, or ArgyrisMesh.
+
+    Optional Arguments
+    ------------------
+    * levels : number of times to refine the mesh. Defaults to 1.
+
+    Keyword Arguments
+    -----------------
+    The same as mesh_factory. If the mesh is a Mesh or ArgyrisMesh then, by
+    default, the result is of the same type and has the same edge
+    collections (and GMSH labels) as the input. The nodes of such meshes
+    are already projected, so there is no need for another projection.
+
+    For curved domains (such as a basin on a sphere) refine the parsed mesh
+    and supply a projection: the new nodes are then computed in the original
+    coordinates before being projected like the rest.
+    """
+    keywords = kwargs.copy()
+    argyris = isinstance(mesh, ArgyrisMesh)
+    for key in ['argyris', 'Argyris']:
+        if key in keywords:
+            argyris = keywords.pop(key)
+
+    border_edges = getattr(mesh, 'border_edges', None)
+    if isinstance(mesh, ArgyrisMesh):
+        # refine the quadratic mesh of the geometric points.
+        edges = border_edges.with_labels()
+        edges[:, 0:-1] = mesh.node_points[edges[:, 0:-1] - 1] + 1
+        mesh = parsers.ParseArrays(
+            mesh.node_points[mesh.elements[:, [0, 1, 2, 18, 20, 19]] - 1] + 1,
+            mesh.points, edges)
+    if border_edges is not None:
+        if 'borders' not in keywords:
+            default_border = keywords.get('default_border', 'land')
+            if default_border not in border_edges.names:
+                default_border = border_edges.names[0]
+            keywords['default_border'] = default_border
+            keywords['borders'] = {
+                name: set(np.unique(border_edges.labels[
+                    border_edges.slice(name)]).tolist())
+                for name in border_edges.names if name != default_border}
+
+    refined_mesh = meshtools.red_refinement(mesh, levels)
+    if argyris:
+        return ArgyrisMesh(refined_mesh, **keywords)
+    else:
+        return Mesh(refined_mesh, **keywords)
+
+
+def load(file_name, mmap_mode='r'):
+    """
+    Load a Mesh or ArgyrisMesh written by its `save` method.
+
+    Required Arguments
+    ------------------
+    * file_name : path to the binary mesh file.
+
+    Optional Arguments
+    ------------------
+    * mmap_mode : 'r' (default) to memory-map the arrays read-only, 'c' for
+                  copy-on-write memory maps, or None to read the arrays in to
+                  memory. See ap.mesh.binary.load_arrays.
+    """
+    (arrays, attributes) = binary.load_arrays(file_name, mmap_mode=mmap_mode)
+    if attributes['type'] == 'Mesh':
+        return Mesh._from_arrays(arrays, attributes)
+    elif attributes['type'] == 'ArgyrisMesh':
+        return ArgyrisMesh._from_arrays(arrays, attributes)
+    else:
+        raise ValueError("Unknown mesh type " + str(attributes['type']))
+
+
+def _index_dtype(largest):
+    """
+    Return the smallest integer type (int32 or int64) able to hold node
+    numbers up to largest.
+    """
+    if largest < np.iinfo(np.int32).max:
+        return np.dtype(np.int32)
+    return np.dtype(np.int64)
+
+
+def _group(arrays, prefix):
+    """
+    Return a dictionary of the arrays whose names start with prefix + '/',
+    keyed by the rest of the name.
+    """
+    return {name[len(prefix) + 1:]: array for name, array in arrays.items()
+            if name.startswith(prefix + '/')}
+
+
+class BorderEdges(object):
+    """
+    The boundary edges of a mesh stored as arrays and grouped in to borders
+    (edge collections) by their GMSH labels. The edges are sorted by border,
+    so the edges of each border form a contiguous slice of the arrays.
+
+    Required Arguments
+    ------------------
+    * edges  : (E, k) integer array of the nodes of every edge (endpoint,
+               endpoint, and, for quadratic meshes, midpoint).
+
+    * labels : array of the GMSH label of every edge (-1 if unknown).
+
+    Optional Arguments
+    ------------------
+    * borders, default_border : see meshtools.classify_edges.
+
+    Properties
+    ----------
+    * edges, labels : as above, sorted by border and then by node numbers.
+
+    * names         : the names of the borders (the default border first).
+
+    * border_ids    : the index in names of the border of every edge.
+
+    * offsets       : the edges of border names[k] are
+                      edges[offsets[k]:offsets[k + 1]].
+
+    Methods
+    -------
+    * relabel(borders=None, default_border="land") : reassign the edges to
+      borders without rebuilding anything else.
+
+    * renumber(old_to_new) : map the node numbers through an array (indexed
+      by old node number) and keep the edges of each border sorted.
+
+    * slice(name) : the slice of the arrays holding a border; border_edges[
+      name] is the corresponding (view of the) edges.
+
+    * with_labels(name=None) : the edges (of one border, or all of them)
+      with their labels appended as the last column.
+
+    * to_sets() : a dictionary relating border names to sets of edge tuples
+      (node, ..., label), the traditional form of edge collections.
+    """
+    def __init__(self, edges, labels, borders=None, default_border="land"):
+        self.labels = np.asarray(labels, dtype=int).reshape(-1)
+        self.edges = np.asarray(edges, dtype=int).reshape(
+            (len(self.labels), -1))
+        self.relabel(borders, default_border)
+
+    @classmethod
+    def from_tuples(cls, edges, borders=None, default_border="land"):
+        """
+        Build the arrays from a sequence of (distinct) edge tuples (node,
+        ..., label) or an equivalent integer array.
+        """
+        edges = np.asarray(edges, dtype=int)
+        if edges.size == 0:
+            return cls(np.zeros((0, 0), dtype=int), [], borders,
+                       default_border)
+        edges = np.unique(edges, axis=0)
+        return cls(edges[:, 0:-1], edges[:, -1], borders, default_border)
+
+    @classmethod
+    def from_collections(cls, edge_collections):
+        """
+        Build the arrays from a dictionary relating border names to
+        collections of edge tuples (see to_sets).
+        """
+        names = sorted(edge_collections.keys())
+        border_ids = np.repeat(np.arange(len(names), dtype=np.int32),
+                               [len(edge_collections[name])
+                                for name in names])
+        edges = [edge for name in names
+                 for edge in sorted(edge_collections[name])]
+        if len(edges) == 0:
+            edges = np.zeros((0, 1), dtype=int)
+        edges = np.array(edges, dtype=int)
+        return cls._from_arrays(edges[:, 0:-1], edges[:, -1], names,
+                                border_ids)
+
+    @classmethod
+    def _from_arrays(cls, edges, labels, names, border_ids):
+        """Wrap arrays which are already sorted by border."""
+        border_edges = cls.__new__(cls)
+        border_edges.edges = edges
+        border_edges.labels = labels
+        border_edges.names = list(names)
+        border_edges.border_ids = border_ids
+        border_edges.offsets = np.searchsorted(
+            border_ids, np.arange(len(names) + 1))
+        return border_edges
+
+    def relabel(self, borders=None, default_border="land"):
+        """
+        Reassign the edges to borders (see meshtools.classify_edges) and
+        reorder the arrays accordingly.
+        """
+        (self.names, self.border_ids) = meshtools.classify_edges(
+            self.labels, borders=borders, default_border=default_border)
+        self._sort()
+        self.offsets = np.searchsorted(self.border_ids,
+                                       np.arange(len(self.names) + 1))
+
+    def renumber(self, old_to_new):
+        """
+        Replace every node number n by old_to_new[n] and restore the order
+        of the edges within each border.
+        """
+        self.edges = old_to_new[self.edges]
+        self._sort()
+
+    def _sort(self):
+        """Sort the arrays by border and then by node numbers."""
+        order = np.lexsort(tuple(self.edges.T[::-1]) + (self.border_ids,))
+        self.edges = self.edges[order]
+        self.labels = self.labels[order]
+        self.border_ids = self.border_ids[order]
+
+    def slice(self, name):
+        """Return the slice of the arrays holding the edges of a border."""
+        index = self.names.index(name)
+        return slice(self.offsets[index], self.offsets[index + 1])
+
+    def __getitem__(self, name):
+        return self.edges[self.slice(name)]
+
+    def with_labels(self, name=None):
+        """
+        Return the edges of a border (or, by default, all edges) with their
+        labels appended as the last column.
+        """
+        rows = slice(None) if name is None else self.slice(name)
+        return np.column_stack((self.edges[rows], self.labels[rows]))
+
+    def to_sets(self):
+        """
+        Return a dictionary relating every border name to the set of its
+        edge tuples.
+        """
+        edges = self.with_labels().tolist()
+        return {name: set(map(tuple, edges[self.slice(name)]))
+                for name in self.names}
+
+    def _save_arrays(self, arrays):
+        """Add the arrays to a dictionary of arrays to save."""
+        arrays['border_edges/edges'] = self.edges
+        arrays['border_edges/labels'] = self.labels
+        arrays['border_edges/border_ids'] = self.border_ids
+
+    @classmethod
+    def _load_arrays(cls, arrays, attributes):
+        """
+        Load the arrays added by _save_arrays (or, for older files, the
+        saved edge collections).
+        """
+        if 'border_edges/edges' in arrays:
+            return cls._from_arrays(arrays['border_edges/edges'],
+                                    arrays['border_edges/labels'],
+                                    attributes['borders'],
+                                    arrays['border_edges/border_ids'])
+        return cls.from_collections({
+            name: set(map(tuple, collection.tolist()))
+            for name, collection in
+            _group(arrays, 'edge_collections').items()})
+
+
+class _CachedMeshProperties(object):
+    """
+    Lazily computed geometry (see meshtools.element_geometry) and topology
+    (see meshtools.edge_topology) of the elements of a mesh. The arrays are
+    computed on first use and cached until the nodes (for geometry) or the
+    elements (for both) are replaced; replace the arrays rather than
+    modifying them in place.
+    """
+    @property
+    def nodes(self):
+        """Nodal coordinates."""
+        return self._nodes
+
+    @nodes.setter
+    def nodes(self, nodes):
+        self._nodes = nodes
+        self._geometry = None
+
+    @property
+    def elements(self):
+        """Element connectivity matrix."""
+        return self._elements
+
+    @elements.setter
+    def elements(self, elements):
+        self._elements = elements
+        self._geometry = None
+        self._topology = dict()
+
+    @property
+    def num_nodes(self):
+        """Number of nodes."""
+        return self.nodes.shape[0]
+
+    @property
+    def edge_collections(self):
+        """
+        Dictionary relating border names to sets of edge tuples, built from
+        border_edges on every access (see BorderEdges.to_sets).
+        """
+        return self.border_edges.to_sets()
+
+    def _geometry_arguments(self):
+        """Return the elements and nodes whose geometry is cached."""
+        return (self.elements, self.nodes)
+
+    def _get_geometry(self, name):
+        """Return a cached geometry array, computing them if necessary."""
+        if getattr(self, '_geometry', None) is None:
+            self._geometry = meshtools.element_geometry(
+                *self._geometry_arguments())
+        return self._geometry[name]
+
+    def _get_topology(self, name):
+        """Return a cached topology array, computing it if necessary."""
+        if name not in self._topology:
+            if name == 'node_elements':
+                self._topology[name] = meshtools.node_to_element(
+                    self.elements, self.num_nodes)
+            elif name == 'element_neighbors':
+                self._topology[name] = meshtools.element_adjacency(
+                    self.elements, self._get_topology('edges'))
+            elif name == 'edges':
+                self._topology[name] = meshtools.edge_topology(self.elements)
+        return self._topology[name]
+
+    @property
+    def node_elements(self):
+        """
+        The tuple (offsets, elements) of zero-based arrays: node k + 1 is in
+        the elements elements[offsets[k]:offsets[k + 1]] + 1.
+        """
+        return self._get_topology('node_elements')
+
+    @property
+    def element_neighbors(self):
+        """
+        The tuple (offsets, neighbors) of zero-based arrays: element k + 1
+        shares an edge with elements neighbors[offsets[k]:offsets[k + 1]] + 1.
+        """
+        return self._get_topology('element_neighbors')
+
+    @property
+    def edge_corners(self):
+        """(M, 2) sorted corner nodes of every edge in the mesh."""
+        return self._get_topology('edges')['edges']
+
+    @property
+    def element_edges(self):
+        """
+        (E, 3) zero-based numbers of the local edges (0, 1), (1, 2), and
+        (2, 0) of every element.
+        """
+        return self._get_topology('edges')['element_edges']
+
+    @property
+    def edge_elements(self):
+        """
+        The tuple (offsets, elements, local_edges) of zero-based arrays: edge
+        k is local edge local_edges[j] of element elements[j] + 1 for
+        offsets[k] <= j < offsets[k + 1].
+        """
+        topology = self._get_topology('edges')
+        return (topology['offsets'], topology['elements'],
+                topology['local_edges'])
+
+    @property
+    def jacobians(self):
+        """(E, 2, 2) array of the affine maps B of the elements."""
+        return self._get_geometry('jacobians')
+
+    @property
+    def determinants(self):
+        """Determinants of the affine maps."""
+        return self._get_geometry('determinants')
+
+    @property
+    def areas(self):
+        """Element areas."""
+        return self._get_geometry('areas')
+
+    @property
+    def edge_lengths(self):
+        """(E, 3) lengths of the local edges (0, 1), (1, 2), and (2, 0)."""
+        return self._get_geometry('edge_lengths')
+
+    @property
+    def normals(self):
+        """(E, 3, 2) outward unit normals of the same edges."""
+        return self._get_geometry('normals')
+
+    @property
+    def inradii(self):
+        """Radii of the circles inscribed in the elements."""
+        return self._get_geometry('inradii')
+
+    @property
+    def qualities(self):
+        """Element qualities (2*inradius/circumradius; one is ideal)."""
+        return self._get_geometry('qualities')
+
+    @property
+    def min_stepsize(self):
+        """Length of the shortest element edge."""
+        return self.edge_lengths.min()
+
+    @property
+    def max_stepsize(self):
+        """Length of the longest element edge."""
+        return self.edge_lengths.max()
+
+    @property
+    def mean_stepsize(self):
+        """Average length of the element edges (corner to corner)."""
+        return self.edge_lengths.mean()
+
+    def _fingerprint_arrays(self):
+        """Return the arrays which determine the contents of the mesh."""
+        return [self.nodes, self.elements]
+
+    def fingerprint(self):
+        """
+        Return a hexadecimal SHA-256 digest of the contents of the mesh: its
+        type, coordinates, elements, and border edges (with their labels and
+        borders). Equal meshes have equal fingerprints no matter how they
+        were built, saved, or loaded, and the fingerprint changes whenever
+        the mesh is refined, renumbered, or relabeled, so it is a suitable
+        key for caching anything computed from the mesh.
+        """
+        digest = hashlib.sha256(type(self).__name__.encode('utf-8'))
+        border_edges = self.border_edges
+        integer_arrays = [border_edges.edges, border_edges.labels,
+                          border_edges.border_ids]
+        for array in self._fingerprint_arrays() + integer_arrays:
+            # normalize the types so that, e.g., int32 and int64 elements
+            # with the same values hash the same.
+            if np.issubdtype(np.asarray(array).dtype, np.integer):
+                array = np.ascontiguousarray(array, dtype='<i8')
+            else:
+                array = np.ascontiguousarray(array, dtype='<f8')
+            digest.update(json.dumps(array.shape).encode('utf-8'))
+            digest.update(array.data)
+        digest.update(json.dumps(border_edges.names).encode('utf-8'))
+        return digest.hexdigest()
+
+
+class Mesh(_CachedMeshProperties):
     """
     Representation of a finite element mesh. If every node shares the
     same final coordinate value (e.g. all z-values are the same) then
@@ -96,32 +559,49 @@ class Mesh(object):
 
           projection = lambda x : x[0:2]
 
-      will project the nodes down to the XY plane. Defaults to the
-      identity function.
+      will project the nodes down to the XY plane, one node at a time.
+      Vectorized projections (see ap.mesh.projections.vectorized) instead
+      map the whole (N, 3) array of nodes to an (N, 2) array in one call.
+      Defaults to None (no projection).
 
     Properties
     ----------
-    * elements         : element connectivity matrix.
+    * elements         : element connectivity matrix (int32 unless there
+                         are too many nodes).
 
     * nodes            : coordinates of nodes.
 
+    * border_edges     : the boundary edges as arrays sorted by border
+      (see BorderEdges); border_edges[name] is the array of edges on a
+      border.
+
     * edge_collections : a dictionary relating the border names to the
-      edge tuples that fall along that border. If possible, the last
-      number in the tuple is the geometrical item number that the edge
-      falls upon from GMSH. Otherwise it is -1. For example,
+      edge tuples that fall along that border, built from border_edges on
+      every access. If possible, the last number in the tuple is the
+      geometrical item number that the edge falls upon from GMSH.
+      Otherwise it is -1. For example,
 
         print(t.edge_collections)
         => {'land': set([(3, 4, 7, 3), (4, 1, 8, 4), (2, 3, 6, 2),
             (1, 2, 5, 1)])}
 
-    * boundary_nodes   : Set containing the node numbers of nodes on the
-                         boundary.
+    * boundary_nodes   : a dictionary relating the border names to sorted
+                         arrays of the node numbers on that border.
 
-    * interior_nodes   : Set containing the node numbers of nodes in the
+    * interior_nodes   : sorted array of the node numbers of nodes in the
                          interior.
 
     * order            : Order of the interpolating polynomials.
 
+    * jacobians, determinants, areas, edge_lengths, normals, inradii,
+      qualities, min_stepsize, max_stepsize, mean_stepsize : element
+      geometry, computed on first use and cached (see
+      meshtools.element_geometry).
+
+    * node_elements, element_neighbors, edge_corners, element_edges,
+      edge_elements : compressed (CSR-style) adjacency arrays, computed on
+      first use and cached (see meshtools.edge_topology).
+
     Methods
     -------
     * get_nnz() : Calculate the number of nonzero entries in a typical
@@ -138,6 +618,15 @@ class Mesh(object):
 
       and, additionally, for each edge collection save
       prefix + name + _edges.txt.
+
+    * save(file_name) : Save the mesh as a single binary file which may be
+      memory-mapped by ap.mesh.meshes.load.
+
+    * relabel_borders(borders=None, default_border="land") : reassign the
+      boundary edges to borders in place.
+
+    * fingerprint() : a digest of the contents of the mesh, suitable as a
+      cache key (see ap.assembly.OperatorCache).
     """
     def __init__(self, parsed_mesh, borders=None, default_border="land",
                  ignore_given_edges=False, projection=None):
@@ -147,29 +636,37 @@ class Mesh(object):
         self.nodes = meshtools.project_nodes(projection, parsed_mesh.elements,
                                              parsed_mesh.nodes,
                                              attempt_flatten=True)
-        self.edge_collections = \
-            meshtools.organize_edges(parsed_mesh.edges, borders=borders,
-                                     default_border=default_border)
-
-        if max(map(len, self.edge_collections.values())) == 0 \
-                or ignore_given_edges:
-            self.edge_collections = {default_border:
-                 set(meshtools.extract_boundary_edges(self.elements))}
+        if len(parsed_mesh.edges) == 0 or ignore_given_edges:
+            self.border_edges = BorderEdges.from_tuples(
+                meshtools.extract_boundary_edges(self.elements),
+                default_border=default_border)
+        else:
+            self.border_edges = BorderEdges.from_tuples(
+                parsed_mesh.edges, borders=borders,
+                default_border=default_border)
 
         if len(np.unique(self.elements)) != self.nodes.shape[0]:
             self._fix_unused_nodes()
+        self.elements = self.elements.astype(_index_dtype(len(self.nodes)),
+                                             copy=False)
+        self._build_boundary_nodes()
+        self.order = _element_order(self.elements.shape[1])
 
-        self.boundary_nodes = {}
-        interior_nodes = set(range(1, len(self.nodes)+1))
-        for name, edge_collection in self.edge_collections.items():
-            self.boundary_nodes[name] = \
-                np.fromiter(set(node for edge in edge_collection
-                                for node in edge[0:-1]), int)
-            interior_nodes -= set(self.boundary_nodes[name])
+    def relabel_borders(self, borders=None, default_border="land"):
+        """
+        Reassign the boundary edges to borders (with the same meaning of the
+        arguments as the constructor) and update the boundary node sets in
+        place, without rebuilding the mesh.
+        """
+        self.border_edges.relabel(borders, default_border)
+        self._build_boundary_nodes()
 
-        self.interior_nodes = np.fromiter(interior_nodes, int)
-        self.order = _element_order(self.elements.shape[1])
-        self.mean_stepsize = self._get_stepsize()
+    def _build_boundary_nodes(self):
+        """Collect the boundary and interior nodes from the border edges."""
+        self.boundary_nodes = {name: np.unique(self.border_edges[name])
+                               for name in self.border_edges.names}
+        self.interior_nodes = np.setdiff1d(
+            np.arange(1, len(self.nodes) + 1), self.border_edges.edges)
 
     def get_nnz(self):
         """
@@ -211,68 +708,119 @@ class Mesh(object):
             np.savetxt(prefix + name + "_boundary_nodes.txt", collection,
                        fmt="%d")
 
-        for name, collection in self.edge_collections.items():
-            np.savetxt(prefix + name + '_edges.txt', [t for t in collection],
-                       fmt='%d')
+        for name in self.border_edges.names:
+            np.savetxt(prefix + name + '_edges.txt',
+                       self.border_edges.with_labels(name), fmt='%d')
+
+    def save(self, file_name):
+        """
+        Save the mesh (nodes, elements, edge collections and boundary node
+        sets) as a single binary file. Reload it with ap.mesh.meshes.load.
+        """
+        arrays = {'nodes': self.nodes, 'elements': self.elements,
+                  'interior_nodes': self.interior_nodes}
+        for name, collection in self.boundary_nodes.items():
+            arrays['boundary_nodes/' + name] = collection
+        self.border_edges._save_arrays(arrays)
+        binary.save_arrays(file_name, arrays,
+                           {'type': 'Mesh', 'order': self.order,
+                            'borders': self.border_edges.names})
+
+    @classmethod
+    def _from_arrays(cls, arrays, attributes):
+        """
+        Build a mesh from the arrays written by save without recomputing
+        anything.
+        """
+        mesh = cls.__new__(cls)
+        mesh.nodes = arrays['nodes']
+        mesh.elements = arrays['elements']
+        mesh.interior_nodes = arrays['interior_nodes']
+        mesh.boundary_nodes = _group(arrays, 'boundary_nodes')
+        mesh.border_edges = BorderEdges._load_arrays(arrays, attributes)
+        mesh.order = attributes['order']
+        return mesh
 
     def _fix_unused_nodes(self):
         """
         GMSH has a bug where it saves non-mesh nodes (that is, nodes that
         are not members of any element) to some files. Get around that
         issue by deleting the extra nodes and renumbering accordingly.
+
+        Returns the array of original node numbers of the remaining nodes
+        (see meshtools.remove_unused_nodes) so that callers may remap their
+        own node data.
         """
-        number_of_mesh_nodes = len(np.unique(self.elements))
-        old_to_new = dict(zip(np.unique(self.elements),
-                              range(1, number_of_mesh_nodes + 1)))
-
-        new_to_old = {new_node: old_node
-                      for (old_node, new_node) in old_to_new.items()}
-        new_elements = np.array([[old_to_new[node] for node in element]
-                                 for element in self.elements])
-        new_nodes = np.array([self.nodes[new_to_old[new_node_number] - 1]
-                              for new_node_number in new_to_old.keys()])
-
-        try:
-            edge_size = {3: 2, 6: 3, 10: 4, 15: 5}[self.elements.shape[1]]
-        except KeyError:
-            raise ValueError("Unsupported mesh type")
-        new_edge_collections = dict()
-        for key, collection in self.edge_collections.items():
-            new_edge_collections[key] = set()
-            for edge in collection:
-                # geometrical information available
-                if len(edge) == edge_size + 1:
-                    new_edge = tuple([old_to_new[node]
-                                      for node in edge[0:-1]] + [edge[-1]])
-                    new_edge_collections[key].add(new_edge)
-                # geometrical information not available
-                elif len(edge) == edge_size:
-                    new_edge = tuple([old_to_new[node] for node in edge])
-                    new_edge_collections[key].add(new_edge)
-                else:
-                    raise ValueError("Mismatch between size of mesh and" +
-                                     " size of edges")
-
-        self.edge_collections = new_edge_collections
-        self.elements = new_elements
-        self.nodes = new_nodes
-
-    def _get_stepsize(self):
-        """
-        Calculate the average stepsize of the mesh (corner to corner).
-        """
-        return np.average(
-            np.sqrt((self.nodes[self.elements[:, 0] - 1, 0]
-                   - self.nodes[self.elements[:, 1] - 1, 0])**2 +
-                    (self.nodes[self.elements[:, 0] - 1, 1]
-                   - self.nodes[self.elements[:, 1] - 1, 1])**2))
+        (self.elements, self.nodes, _, used_nodes) = \
+            meshtools.remove_unused_nodes(self.elements, self.nodes)
+        edges = self.border_edges.edges
+        positions = np.minimum(np.searchsorted(used_nodes, edges),
+                               len(used_nodes) - 1)
+        if np.any(used_nodes[positions] != edges):
+            raise ValueError("Edges contain nodes that are not in the mesh")
+        self.border_edges.edges = positions + 1
+        return used_nodes
 
 
 ArgyrisEdge = namedtuple('ArgyrisEdge',
                          ['element_number', 'edge_type', 'edge'])
 
 
-class ArgyrisMesh(object):
+# Columns of an Argyris element holding the nodes stacked on each corner, in
+# the order (dx, dy, dxx, dxy, dyy), and the columns holding the geometric
+# points of the underlying quadratic element (corners, then midpoints).
+_STACKED_COLUMNS = [[3 + 2*corner, 4 + 2*corner, 9 + 3*corner, 10 + 3*corner,
+                     11 + 3*corner] for corner in range(3)]
+_POINT_COLUMNS = [0, 1, 2, 18, 19, 20]
+
+# Codes for the kind of degree of freedom (basis function) each node of an
+# Argyris mesh represents (see ArgyrisMesh.dof_types) and the code of each
+# column of an Argyris element.
+(DOF_VALUE, DOF_DX, DOF_DY, DOF_DXX, DOF_DXY, DOF_DYY, DOF_NORMAL) = range(7)
+_COLUMN_DOF_TYPES = np.array(
+    3*[DOF_VALUE] + 3*[DOF_DX, DOF_DY] + 3*[DOF_DXX, DOF_DXY, DOF_DYY]
+    + 3*[DOF_NORMAL], dtype=np.int8)
+
+
+_CORNER_ORDERS = [(0, 1, 2), (0, 2, 1), (1, 0, 2), (1, 2, 0), (2, 0, 1),
+                  (2, 1, 0)]
+
+
+def _corner_permutation(corners):
+    """
+    Compute the column permutation of an Argyris element corresponding to
+    reordering its corners as `corners`.
+    """
+    midpoint_columns = {(0, 1): 18, (0, 2): 19, (1, 2): 20}
+    columns = list(corners)
+    for corner in corners:
+        columns += _STACKED_COLUMNS[corner][0:2]
+    for corner in corners:
+        columns += _STACKED_COLUMNS[corner][2:5]
+    for (first, second) in [(0, 1), (0, 2), (1, 2)]:
+        columns.append(midpoint_columns[
+            tuple(sorted((corners[first], corners[second])))])
+    return columns
+
+
+def _sort_argyris_corners(elements):
+    """
+    Permute the columns of each Argyris element so that its corners are in
+    increasing order. This solves a lot of orientation problems later: for
+    example, the normal derivative at a midpoint always points in the same
+    direction in both elements sharing the edge.
+    """
+    permutations = np.array([_corner_permutation(corners)
+                             for corners in _CORNER_ORDERS])
+    lookup = np.zeros(27, dtype=int)
+    for index, (first, second, third) in enumerate(_CORNER_ORDERS):
+        lookup[9*first + 3*second + third] = index
+    order = np.argsort(elements[:, 0:3], axis=1, kind='mergesort')
+    codes = 9*order[:, 0] + 3*order[:, 1] + order[:, 2]
+    return np.take_along_axis(elements, permutations[lookup[codes]], axis=1)
+
+
+class ArgyrisMesh(_CachedMeshProperties):
     """
     Class to build an Argyris mesh from a parsed mesh. Can handle a mesh
     with multiple boundary conditions.
@@ -287,33 +835,76 @@ class ArgyrisMesh(object):
 
     Required Arguments
     ------------------
-    * mesh : a parsed mesh (inherits from the MeshParser class)
+    * mesh : a parsed mesh (inherits from the MeshParser class). Linear
+             meshes are converted to quadratic meshes first.
 
     Properties
     ----------
     * elements          : a numpy array listing the node numbers of
-                          every element.
+                          every element (int32 unless there are too many
+                          nodes).
+
+    * dof_types         : int8 array of the kind of degree of freedom of
+                          every node: one of DOF_VALUE, DOF_DX, DOF_DY,
+                          DOF_DXX, DOF_DXY, DOF_DYY, or DOF_NORMAL.
 
-    * edges_by_midpoint : a dictionary associating each element with a
-                          certain edge (indexed by the normal derivative
-                          basis function number)
+    * edges_by_midpoint : a (read-only) dictionary associating each
+                          element with a certain edge (indexed by the
+                          normal derivative basis function number); a view
+                          of the array edges_by_midpoint.table.
 
     * node_collections  : a list of ArgyrisNodeCollection objects.
 
-    * nodes             : a numpy array of node coordinates.
+    * border_edges, edge_collections : the edges (with GMSH labels) of the
+                          underlying quadratic mesh; see Mesh.
+
+    * jacobians, areas, ... : cached element geometry; see Mesh.
+
+    * node_elements, element_neighbors, ... : cached adjacency arrays; see
+                                              Mesh.
+
+    * points            : (P, 2) array of the coordinates of the geometric
+                          points (corners and midpoints), stored once.
+
+    * node_points       : array of the (zero-based) point at which each
+                          node lies; the five nodes stacked on a corner
+                          share its point.
+
+    * nodes             : a (N, 2) numpy array of node coordinates,
+                          expanded from points on every access (so prefer
+                          points and node_points in loops). Assigning to it
+                          stores the distinct coordinates as points.
+
+    * vertex_blocked    : True if every vertex owns a contiguous, aligned
+                          block of six nodes (see renumber).
 
     Methods
     -------
-    * savetxt : save the mesh in multiple text files.
+    * savetxt  : save the mesh in multiple text files.
+
+    * save     : save the mesh as a single binary file which may be
+                 memory-mapped by ap.mesh.meshes.load.
+
+    * renumber : renumber the nodes and elements to improve locality
+                 (optionally in blocks of six nodes per vertex; see
+                 vertex_blocked).
+
+    * get_dirichlet_dofs : collect the nodes fixed by boundary conditions.
+
+    * relabel_borders : reassign the boundary edges to borders and rebuild
+                        the node collections in place.
+
+    * fingerprint : a digest of the contents of the mesh; see Mesh.
     """
     def __init__(self, parsed_mesh, borders=None, default_border="land",
-                 ignore_given_edges=False, projection=lambda x: x):
+                 ignore_given_edges=False, projection=None):
         if borders is None:
             borders = dict()
-        if parsed_mesh.elements.shape[1] != 6:
-            raise NotImplementedError("Support for changing mesh order is not "
-                                      + "implemented.")
-            # parsed_mesh = meshtools.change_order(parsed_mesh, 2)
+        if parsed_mesh.elements.shape[1] == 3:
+            parsed_mesh = meshtools.change_order(parsed_mesh, 2)
+        elif parsed_mesh.elements.shape[1] != 6:
+            raise NotImplementedError("Support for changing mesh order is "
+                                      "only implemented for linears.")
 
         lagrange_mesh = Mesh(parsed_mesh, borders=borders,
                              default_border=default_border,
@@ -323,56 +914,124 @@ class ArgyrisMesh(object):
         if lagrange_mesh.nodes.shape[1] != 2:
             raise ValueError("Requires a 2D mesh; try a different projection.")
 
-        self.elements = np.zeros((lagrange_mesh.elements.shape[0], 21),
-                                 dtype=np.int)
-        self.elements[:, 0:6] = lagrange_mesh.elements
-
-        # solve a lot of orientation problems later by ensuring that the corner
-        # nodes are in sorted order.
-        for element in self.elements:
-            self._sort_corners_increasing(element[0:6])
-
-        # stack the extra basis function nodes on the corners.
-        max_lagrange_mesh = lagrange_mesh.elements.max() + 1
-        self.stacked_nodes = \
-            {node_number: np.arange(max_lagrange_mesh + 5*count,
-                                    max_lagrange_mesh + 5*count + 5)
-             for count, node_number in
-             enumerate(np.unique(self.elements[:, 0:3]))}
-
-        for element in self.elements:
-            element[6:11]  = self.stacked_nodes[element[0]]
-            element[11:16] = self.stacked_nodes[element[1]]
-            element[16:21] = self.stacked_nodes[element[2]]
-
-        self._fix_argyris_node_order()
+        # stack five extra basis function nodes on every corner, numbered
+        # after the nodes of the quadratic mesh.
+        num_lagrange_nodes = lagrange_mesh.elements.max()
+        corners = np.unique(lagrange_mesh.elements[:, 0:3])
+        first_stacked = num_lagrange_nodes + 1 + 5*np.arange(len(corners))
+        self.stacked_nodes = dict(zip(corners.tolist(),
+                                      first_stacked[:, np.newaxis]
+                                      + np.arange(5)))
+
+        elements = np.zeros((lagrange_mesh.elements.shape[0], 21),
+                            dtype=_index_dtype(num_lagrange_nodes
+                                               + 5*len(corners)))
+        elements[:, 0:3] = lagrange_mesh.elements[:, 0:3]
+        elements[:, 18:21] = lagrange_mesh.elements[:, [3, 5, 4]]
+        for corner in range(3):
+            elements[:, _STACKED_COLUMNS[corner]] = \
+                first_stacked[np.searchsorted(corners, elements[:, corner])][
+                    :, np.newaxis] + np.arange(5)
+        self.elements = _sort_argyris_corners(elements)
+        self._build_dof_types()
 
         # update the edges by elements.
-        self.edges_by_midpoint = dict()
-        edge_type_to_nodes = {1: (0, 1, 18), 2: (0, 2, 19), 3: (1, 2, 20)}
-        for element_number, element in enumerate(self.elements):
-            for edge_type in range(1, 4):
-                (i, j, k) = edge_type_to_nodes[edge_type]
-                edge = ArgyrisEdge(element_number=element_number + 1,
-                                   edge_type=edge_type,
-                                   edge=(element[i], element[j], element[k]))
-                if element[17 + edge_type] in self.edges_by_midpoint:
-                    if (self.edges_by_midpoint[element[17 + edge_type]].edge
-                       != edge.edge):
-                        raise ValueError("Mesh is not consistent")
-                else:
-                    self.edges_by_midpoint[element[17 + edge_type]] = edge
-
-        # set coordinates for the new nodes.
-        self.nodes = np.zeros((self.elements.max(), 2))
-        self.nodes.fill(np.nan)
-        self.nodes[0:lagrange_mesh.nodes.shape[0], :] = lagrange_mesh.nodes
-        for stacked_node, new_nodes in self.stacked_nodes.items():
-            self.nodes[new_nodes - 1] = self.nodes[stacked_node - 1]
-
-        # Construct the edge collections.
-        self.node_collections = []
-        self._build_node_collections(lagrange_mesh)
+        self._build_edges_by_midpoint()
+
+        # the stacked nodes lie on the points of their corners.
+        self.points = lagrange_mesh.nodes
+        node_points = np.arange(self.elements.max(),
+                                dtype=self.elements.dtype)
+        for corner in range(3):
+            node_points[self.elements[:, _STACKED_COLUMNS[corner]] - 1] = \
+                self.elements[:, corner, np.newaxis] - 1
+        self.node_points = node_points
+
+        # Construct the edge collections. The corners and midpoints keep their
+        # numbers, so the edges of the quadratic mesh remain valid.
+        self.border_edges = lagrange_mesh.border_edges
+        self._build_node_collections()
+
+    @property
+    def points(self):
+        """Coordinates of the geometric points."""
+        return self._points
+
+    @points.setter
+    def points(self, points):
+        self._points = points
+        self._geometry = None
+        self._expanded_nodes = None
+
+    @property
+    def node_points(self):
+        """Zero-based number of the point of every node."""
+        return self._node_points
+
+    @node_points.setter
+    def node_points(self, node_points):
+        self._node_points = node_points
+        self._expanded_nodes = None
+
+    @property
+    def nodes(self):
+        """
+        Nodal coordinates, expanded from points. The expansion is computed
+        once and cached (read-only) until points or node_points are
+        replaced.
+        """
+        if getattr(self, '_expanded_nodes', None) is None:
+            nodes = self.points[self.node_points]
+            nodes.flags.writeable = False
+            self._expanded_nodes = nodes
+        return self._expanded_nodes
+
+    @nodes.setter
+    def nodes(self, nodes):
+        """
+        Set the nodal coordinates. If every node of each current point gets
+        the same coordinates (e.g. when moving or scaling the mesh) only the
+        points change. Otherwise nodes with equal coordinates are merged in
+        to one point and the points are numbered in the order of their first
+        node.
+        """
+        nodes = np.asarray(nodes)
+        node_points = getattr(self, '_node_points', None)
+        if node_points is not None and len(node_points) == len(nodes):
+            (used_points, first_nodes) = np.unique(node_points,
+                                                   return_index=True)
+            if len(used_points) == len(self.points):
+                points = nodes[first_nodes]
+                if np.array_equal(points[node_points], nodes):
+                    self.points = points
+                    return
+
+        (points, first_nodes, node_points) = np.unique(
+            nodes, axis=0, return_index=True, return_inverse=True)
+        order = np.argsort(first_nodes)
+        new_numbers = np.empty(len(order), dtype=int)
+        new_numbers[order] = np.arange(len(order))
+        self.points = points[order]
+        self.node_points = new_numbers[node_points.reshape(-1)].astype(
+            _index_dtype(len(nodes)))
+
+    @property
+    def num_nodes(self):
+        """Number of nodes."""
+        return len(self.node_points)
+
+    def _fingerprint_arrays(self):
+        """Return the points, the points of the nodes, and the elements."""
+        return [self.points, self.node_points, self.elements]
+
+    def _geometry_arguments(self):
+        """Return the corners (as point numbers) and the points."""
+        return (self.node_points[self.elements[:, 0:3] - 1] + 1, self.points)
+
+    def _build_dof_types(self):
+        """Compute the kind of degree of freedom of every node."""
+        self.dof_types = np.zeros(self.elements.max(), dtype=np.int8)
+        self.dof_types[self.elements - 1] = _COLUMN_DOF_TYPES
 
     def savetxt(self, prefix=""):
         """
@@ -386,93 +1045,288 @@ class ArgyrisMesh(object):
             NAME_edges.txt : all edge tuples (end, end, midpoint)
             NAME_all.txt : all numbers of nodes in the collection.
         """
+        for collection in self.node_collections:
+            collection.savetxt(prefix)
+
         if prefix:
             prefix += "_"
         np.savetxt(prefix + 'nodes.txt', self.nodes)
         np.savetxt(prefix + 'elements.txt', self.elements, fmt="%d")
 
+    def save(self, file_name):
+        """
+        Save the mesh (points, elements, stacked nodes, edges and node
+        collections) as a single binary file. Reload it with
+        ap.mesh.meshes.load.
+
+        The stacked nodes are saved as a table whose first column is the
+        corner node and whose remaining five columns are the nodes stacked
+        upon it; similarly, edges_by_midpoint is saved as a table with
+        columns (midpoint, element number, edge type, edge).
+        """
+        stacked_corners = np.array(sorted(self.stacked_nodes.keys()),
+                                   dtype=int)
+        stacked_nodes = np.zeros((len(stacked_corners), 6), dtype=int)
+        stacked_nodes[:, 0] = stacked_corners
+        for row, corner in enumerate(stacked_corners):
+            stacked_nodes[row, 1:] = self.stacked_nodes[corner]
+
+        arrays = {'points': self.points, 'node_points': self.node_points,
+                  'elements': self.elements,
+                  'stacked_nodes': stacked_nodes,
+                  'edges_by_midpoint': self.edges_by_midpoint.table}
         for collection in self.node_collections:
-            prefix = prefix[0:-1]
-            collection.savetxt(prefix)
-
-    def _sort_corners_increasing(self, element):
-        """
-        Ensure that the corners of the input quadratic element are in
-        increasing order. For example, convert
-        1 3 2 4 6 5
-        to
-        1 2 3 5 6 4
-        """
-        if element[0] > element[1]:
-            element[0], element[1] = element[1], element[0]
-            element[4], element[5] = element[5], element[4]
-        if element[1] > element[2]:
-            element[2], element[1] = element[1], element[2]
-            element[3], element[5] = element[5], element[3]
-        if element[0] > element[2]:
-            element[2], element[0] = element[0], element[2]
-            element[3], element[4] = element[4], element[3]
-        if element[0] > element[1]:
-            element[0], element[1] = element[1], element[0]
-            element[4], element[5] = element[5], element[4]
-
-    def _build_node_collections(self, lagrange_mesh):
+            prefix = 'node_collections/' + collection.name + '/'
+            arrays[prefix + 'function_values'] = collection.function_values
+            arrays[prefix + 'normal_derivatives'] = \
+                collection.normal_derivatives
+            arrays[prefix + 'edges'] = np.array(
+                [edge.edge[-1] for edge in collection.edges], dtype=int)
+        self.border_edges._save_arrays(arrays)
+
+        binary.save_arrays(
+            file_name, arrays,
+            {'type': 'ArgyrisMesh',
+             'node_collections': [collection.name for collection in
+                                  self.node_collections],
+             'borders': self.border_edges.names})
+
+    @classmethod
+    def _from_arrays(cls, arrays, attributes):
         """
-        Handle the edges by building a list of ArgyrisNodeCollection
-        objects. This is done by extracting the information regarding
-        corner nodes and midpoints from the lagrange edge data and saving
-        the interior nodes as everything that was not a boundary node.
+        Build a mesh from the arrays written by save without recomputing
+        the Argyris node numbering.
+        """
+        mesh = cls.__new__(cls)
+        mesh.elements = arrays['elements']
+        if 'points' in arrays:
+            mesh.points = arrays['points']
+            mesh.node_points = arrays['node_points']
+        else:
+            mesh.nodes = arrays['nodes']
+        mesh._build_dof_types()
+        stacked_nodes = arrays['stacked_nodes']
+        mesh.stacked_nodes = dict(zip(stacked_nodes[:, 0].tolist(),
+                                      stacked_nodes[:, 1:]))
+        mesh.edges_by_midpoint = _EdgesByMidpoint(arrays['edges_by_midpoint'])
+        mesh.border_edges = BorderEdges._load_arrays(arrays, attributes)
+
+        mesh.node_collections = []
+        for name in attributes['node_collections']:
+            collection = ArgyrisNodeCollection.__new__(ArgyrisNodeCollection)
+            collection.name = name
+            prefix = 'node_collections/' + name + '/'
+            collection._set_nodes(arrays[prefix + 'function_values'],
+                                  arrays[prefix + 'normal_derivatives'], mesh)
+            collection.edges = [mesh.edges_by_midpoint[midpoint] for midpoint
+                                in arrays[prefix + 'edges'].tolist()]
+            mesh.node_collections.append(collection)
+        return mesh
+
+    def get_dirichlet_dofs(self, conditions):
         """
-        interior_function_values = set(lagrange_mesh.elements[:, 0:3].flat)
-        interior_normal_derivatives = set(lagrange_mesh.elements[:, 3:6].flat)
+        Collect the node numbers fixed by Dirichlet boundary conditions on
+        several borders (see ArgyrisNodeCollection.dirichlet_dofs).
 
-        for border_name, collection in lagrange_mesh.edge_collections.items():
-            # save left points of edges.
-            function_values = {x[0] for x in collection}
-            normal_derivatives = {x[2] for x in collection}
+        Required Arguments
+        ------------------
+        * conditions : a dictionary relating node collection names to the
+                       kind of boundary condition applied there. For example,
 
-            self.node_collections.append(
-                ArgyrisNodeCollection(function_values, normal_derivatives,
-                                      collection, self, name=border_name))
+                           {'land' : 'clamped', 'open' : 'normal_derivative'}
 
-            interior_function_values.difference_update(function_values)
-            interior_normal_derivatives.difference_update(normal_derivatives)
+        Output
+        ------
+        A sorted array of node numbers.
+        """
+        dofs = [np.zeros(0, dtype=int)]
+        for collection in self.node_collections:
+            if collection.name in conditions:
+                dofs.append(collection.dirichlet_dofs[
+                    conditions[collection.name]])
+        return np.unique(np.hstack(dofs))
 
-        self.node_collections.append(ArgyrisNodeCollection(
-            interior_function_values, interior_normal_derivatives, [], self,
-            name='interior'))
+    def renumber(self, method="rcm", blocked=False):
+        """
+        Renumber the nodes (that is, the degrees of freedom) and the
+        elements of the mesh in place to improve the locality of assembly
+        and reduce the bandwidth of the finite element matrices. The five
+        nodes stacked on a corner are numbered directly after it, so every
+        vertex owns a contiguous block of six degrees of freedom.
 
-    def _fix_argyris_node_order(self):
+        Optional Arguments
+        ------------------
+        * method : 'rcm' (default) to order the geometric points (corners
+                   and midpoints) by reverse Cuthill-McKee, or 'hilbert' to
+                   order them along a Hilbert curve.
+        * blocked : if True, number the vertices (in the chosen order)
+                    before the midpoints, so that the k-th vertex owns the
+                    nodes 6*k + 1 through 6*k + 6 (value, dx, dy, dxx, dxy,
+                    dyy) and the normal derivatives come last. Matrices of
+                    such meshes may be assembled in to block sparse storage
+                    (see ap.assembly.assemble_blocked). Defaults to False.
+
+        Output
+        ------
+        The tuple (node_order, element_order): the new node k + 1 is the old
+        node node_order[k] and the new element k + 1 is the old element
+        element_order[k]. Arrays indexed by node number (such as solution
+        vectors) may therefore be permuted with old_array[node_order - 1].
         """
-        Fix the node orderings from the constructed format
+        num_nodes = self.num_nodes
+        points = self.elements[:, _POINT_COLUMNS]
+        is_corner = np.zeros(num_nodes + 1, dtype=bool)
+        is_corner[self.elements[:, 0:3]] = True
+        if method == "rcm":
+            point_order = meshtools.reverse_cuthill_mckee(points, num_nodes)
+            is_point = np.zeros(num_nodes + 1, dtype=bool)
+            is_point[points] = True
+            point_order = point_order[is_point[point_order]]
+        elif method == "hilbert":
+            point_order = np.unique(points)
+            point_order = point_order[meshtools.hilbert_order(
+                self.points[self.node_points[point_order - 1]])]
+        else:
+            raise ValueError("Unsupported renumbering method: " + str(method))
+        if blocked:
+            point_order = np.concatenate(
+                (point_order[is_corner[point_order]],
+                 point_order[~is_corner[point_order]]))
+
+        # number each point followed by the nodes stacked upon it.
+        dofs_per_point = np.where(is_corner[point_order], 6, 1)
+        old_to_new = np.zeros(num_nodes + 1, dtype=int)
+        old_to_new[point_order] = np.cumsum(dofs_per_point) \
+            - dofs_per_point + 1
+        for corner in range(3):
+            columns = _STACKED_COLUMNS[corner]
+            old_to_new[self.elements[:, columns]] = \
+                old_to_new[self.elements[:, corner]][:, np.newaxis] \
+                + np.arange(1, 6)
+
+        elements = _sort_argyris_corners(
+            old_to_new[self.elements].astype(self.elements.dtype))
+        element_order = np.lexsort((elements[:, 2], elements[:, 1],
+                                    elements[:, 0]))
+        self.elements = elements[element_order]
+        node_order = np.zeros(num_nodes, dtype=int)
+        node_order[old_to_new[1:] - 1] = np.arange(1, num_nodes + 1)
+        self._build_dof_types()
+
+        # store the points in the order of their first node.
+        node_points = self.node_points[node_order - 1]
+        (point_order, first_nodes) = np.unique(node_points, return_index=True)
+        point_order = point_order[np.argsort(first_nodes)]
+        new_points = np.zeros(len(self.points), dtype=node_points.dtype)
+        new_points[point_order] = np.arange(len(point_order))
+        self.points = self.points[point_order]
+        self.node_points = new_points[node_points]
+
+        self.stacked_nodes = {old_to_new[corner]: old_to_new[stacked] for
+                              corner, stacked in self.stacked_nodes.items()}
+        self._build_edges_by_midpoint()
+        self.border_edges.renumber(old_to_new)
+        for collection in self.node_collections:
+            collection._set_nodes(old_to_new[collection.function_values],
+                                  old_to_new[collection.normal_derivatives],
+                                  self)
+            collection.edges = [
+                self.edges_by_midpoint[old_to_new[edge.edge[-1]]]
+                for edge in collection.edges]
 
-            [1 2 3 4 5 6 7 8 9 10 11 12 13 14 15 16 17 18 19 20 21]
+        return (node_order, element_order + 1)
 
-        to the usual Argyris format of
+    @property
+    def vertex_blocked(self):
+        """
+        True if the nodes are numbered as by renumber(blocked=True): vertex
+        k + 1 owns nodes 6*k + 1 through 6*k + 6 and the normal derivatives
+        follow all of them.
+        """
+        corners = self.elements[:, 0:3]
+        num_vertex_nodes = 6*len(self.stacked_nodes)
+        if corners.max() > num_vertex_nodes or np.any(corners % 6 != 1):
+            return False
+        for corner in range(3):
+            if np.any(self.elements[:, _STACKED_COLUMNS[corner]]
+                      != corners[:, corner, np.newaxis] + np.arange(1, 6)):
+                return False
+        return bool(np.all(self.elements[:, 18:21] > num_vertex_nodes))
+
+    def _build_edges_by_midpoint(self):
+        """
+        Associate each normal derivative node with the first element (and
+        local edge) containing it. Raise a ValueError if two elements
+        disagree on the endpoints of an edge.
+        """
+        edge_nodes = np.stack([self.elements[:, [0, 1, 18]],
+                               self.elements[:, [0, 2, 19]],
+                               self.elements[:, [1, 2, 20]]], axis=1)
+        edge_nodes = edge_nodes.reshape((-1, 3))
+        (midpoints, first, inverse) = np.unique(
+            edge_nodes[:, 2], return_index=True, return_inverse=True)
+        if np.any(edge_nodes[:, 0:2] != edge_nodes[first[inverse], 0:2]):
+            raise ValueError("Mesh is not consistent")
+
+        self.edges_by_midpoint = _EdgesByMidpoint(np.column_stack(
+            (midpoints, first//3 + 1, first % 3 + 1, edge_nodes[first])))
+
+    def relabel_borders(self, borders=None, default_border="land"):
+        """
+        Reassign the boundary edges to borders (with the same meaning of the
+        arguments as the constructor) and rebuild the node collections in
+        place, without rebuilding the mesh.
+        """
+        self.border_edges.relabel(borders, default_border)
+        self._build_node_collections()
 
-            [1 2 3 7 8 12 13 17 18 9 10 11 14 15 16 19 20 21 4 6 5].
+    def _build_node_collections(self):
+        """
+        Handle the edges by building a list of ArgyrisNodeCollection
+        objects. This is done by extracting the corner nodes and midpoints
+        of the border edges and saving the interior nodes as everything
+        that was not a boundary node.
         """
+        self.node_collections = []
+        for name in self.border_edges.names:
+            # save left points of edges.
+            edges = self.border_edges.with_labels(name)
+            self.node_collections.append(ArgyrisNodeCollection(
+                edges[:, 0], edges[:, 2], edges.tolist(), self, name=name))
+
+        edges = self.border_edges.edges
+        self.node_collections.append(ArgyrisNodeCollection(
+            np.setdiff1d(self.elements[:, 0:3], edges[:, 0]),
+            np.setdiff1d(self.elements[:, 18:21], edges[:, 2]), [], self,
+            name='interior'))
 
-        normal_derivatives1 = self.elements[:, 3].copy()
-        normal_derivatives2 = self.elements[:, 5].copy()
-        normal_derivatives3 = self.elements[:, 4].copy()
 
-        first_nodes  = self.elements[:, 6:11].copy()
-        second_nodes = self.elements[:, 11:16].copy()
-        third_nodes  = self.elements[:, 16:21].copy()
+class _EdgesByMidpoint(Mapping):
+    """
+    Read-only dictionary relating the midpoint (normal derivative) node of
+    every edge of an Argyris mesh to an ArgyrisEdge, stored as one array.
 
-        self.elements[:, 18]    = normal_derivatives1
-        self.elements[:, 19]    = normal_derivatives2
-        self.elements[:, 20]    = normal_derivatives3
+    Required Arguments
+    ------------------
+    * table : integer array whose rows are (midpoint, element number, edge
+              type, endpoint, endpoint, midpoint), sorted by midpoint.
+    """
+    def __init__(self, table):
+        self.table = table
 
-        self.elements[:, 3:5]   = first_nodes[:, 0:2]
-        self.elements[:, 9:12]  = first_nodes[:, 2:5]
+    def __getitem__(self, midpoint):
+        index = np.searchsorted(self.table[:, 0], midpoint)
+        if index == len(self.table) or self.table[index, 0] != midpoint:
+            raise KeyError(midpoint)
+        row = self.table[index].tolist()
+        return ArgyrisEdge(element_number=row[1], edge_type=row[2],
+                           edge=tuple(row[3:]))
 
-        self.elements[:, 5:7]   = second_nodes[:, 0:2]
-        self.elements[:, 12:15] = second_nodes[:, 2:5]
+    def __iter__(self):
+        return iter(self.table[:, 0].tolist())
 
-        self.elements[:, 7:9]   = third_nodes[:, 0:2]
-        self.elements[:, 15:18] = third_nodes[:, 2:5]
+    def __len__(self):
+        return len(self.table)
 
 
 class ArgyrisNodeCollection(object):
@@ -482,11 +1336,11 @@ class ArgyrisNodeCollection(object):
 
     Required Arguments
     ------------------
-    * function_values    : set of basis function numbers that
+    * function_values    : collection of basis function numbers that
                            approximate function values on the Argyris
                            mesh.
 
-    * normal_derivatives : set of the node numbers corresponding to
+    * normal_derivatives : collection of the node numbers corresponding to
                            normal derivative basis functions.
 
     * edges              : set of tuples corresponding to
@@ -497,18 +1351,50 @@ class ArgyrisNodeCollection(object):
     Optional Arguments
     ------------------
     * name : prefix on the output files. Defaults to 'inner'.
+
+    Properties
+    ----------
+    * function_values    : sorted array of function value node numbers.
+
+    * normal_derivatives : sorted array of normal derivative node numbers.
+
+    * stacked_nodes      : array whose kth row lists the five nodes stacked
+                           on function_values[k], in the order (dx, dy, dxx,
+                           dxy, dyy).
+
+    * dirichlet_dofs     : dictionary relating each kind of boundary
+                           condition ('clamped', 'simply_supported', or
+                           'normal_derivative') to the sorted array of node
+                           numbers which it fixes.
     """
     def __init__(self, function_values, normal_derivatives,
                  edges, mesh, name='inner'):
-        self.function_values = function_values
-        self.normal_derivatives = normal_derivatives
         self.name = name
-
-        self.stacked_nodes = {node: mesh.stacked_nodes[node] for node in
-                              self.function_values}
-
+        self._set_nodes(function_values, normal_derivatives, mesh)
         self.edges = [mesh.edges_by_midpoint[edge[-2]] for edge in edges]
 
+    def _set_nodes(self, function_values, normal_derivatives, mesh):
+        """
+        Store the node numbers as sorted arrays and precompute the stacked
+        nodes and the Dirichlet node sets.
+        """
+        self.function_values = np.unique(
+            np.fromiter(function_values, dtype=int))
+        self.normal_derivatives = np.unique(
+            np.fromiter(normal_derivatives, dtype=int))
+        self.stacked_nodes = np.array(
+            [mesh.stacked_nodes[node] for node in self.function_values.tolist()],
+            dtype=int).reshape((-1, 5))
+
+        # a clamped border fixes the function values and the gradient at the
+        # corners and the normal derivatives along the edges.
+        self.dirichlet_dofs = {
+            'clamped': np.unique(np.hstack((self.function_values,
+                                            self.stacked_nodes[:, 0:2].ravel(),
+                                            self.normal_derivatives))),
+            'simply_supported': self.function_values,
+            'normal_derivative': self.normal_derivatives}
+
     def savetxt(self, prefix=""):
         """
         Save the data to text files; place all node numbers in the collection
@@ -522,13 +1408,10 @@ class ArgyrisNodeCollection(object):
                                    for edge in self.edges])
             np.savetxt(prefix + self.name + "_edges.txt", edge_array, "%d")
 
-        # Use list comprehensions because they do the same thing in python2.7
-        # and python3.*; *.values() became an iterator in python3000.
         np.savetxt(prefix + self.name + "_all.txt",
-                   np.unique(np.hstack(
-                       [x for x in self.stacked_nodes.values()] +
-                       [x for x in self.stacked_nodes.keys()] +
-                       [x for x in self.normal_derivatives])), "%d")
+                   np.unique(np.hstack((self.stacked_nodes.ravel(),
+                                        self.function_values,
+                                        self.normal_derivatives))), "%d")
 
     def __str__(self):
         """For interactive debugging use."""
@@ -26,19 +26,31 @@ def sorted_edges(element, argyris=True):
         raise NotImplementedError
 
 
-def extract_boundary_edges(elements):
+def extract_boundary_edges(elements, return_adjacency=False):
     """
     Some meshes do not specify edge information. Extract it from the
     connectivity matrix.
 
+    All element edges are stacked in to one array and canonicalized by
+    sorting their endpoints; a lexicographic sort then places copies of the
+    same edge next to each other, so edges that appear once are on the
+    boundary and edges that appear twice are interior.
+
     Required Arguments
     ------------------
     * elements : element connectivity matrix. Assumes Lagrange elements
                  and GMSH-style ordering.
 
+    Optional Arguments
+    ------------------
+    * return_adjacency : If True, also return the interior edge-to-element
+                         adjacency computed in the same pass. Defaults to
+                         False.
+
     Output
     ------
-    The output is a list of edge tuples. For example:
+    The output is a list of edge tuples (in their original orientation).
+    For example:
 
         print(extract_boundary_edges(mesh.elements))
 
@@ -56,29 +68,489 @@ def extract_boundary_edges(elements):
 
     where the last index, rather than being an edge label (based on
     GMSHs line attribute), is -1.
+
+    If return_adjacency is True then the output is the tuple (edges,
+    adjacency) where adjacency is an integer array with one row per
+    interior edge of the form
+
+        (node, node, element, local edge, element, local edge)
+
+    The nodes are the sorted endpoints of the edge, elements are numbered
+    from 1, and local edges are numbered 0, 1, 2 for the edges starting at
+    the first, second and third corner.
+    """
+    (edges, keys) = _stacked_edges(elements)
+    order = np.lexsort((keys[:, 1], keys[:, 0]))
+    sorted_keys = keys[order]
+
+    group_starts = np.ones(len(order), dtype=bool)
+    group_starts[1:] = np.any(sorted_keys[1:] != sorted_keys[:-1], axis=1)
+    group_starts = np.flatnonzero(group_starts)
+    counts = np.diff(np.append(group_starts, len(order)))
+    if np.any(counts > 2):
+        raise ValueError("Mesh is not consistent: an edge is shared by more "
+                         "than two elements")
+
+    boundary = np.sort(order[group_starts[counts == 1]])
+    boundary_edges = np.column_stack((edges[boundary],
+                                      -np.ones(len(boundary), dtype=int)))
+    boundary_edges = list(map(tuple, boundary_edges.tolist()))
+    if not return_adjacency:
+        return boundary_edges
+
+    first = order[group_starts[counts == 2]]
+    second = order[group_starts[counts == 2] + 1]
+    adjacency = np.column_stack((keys[first], first//3 + 1, first % 3,
+                                 second//3 + 1, second % 3))
+    return (boundary_edges, adjacency)
+
+
+def _stacked_edges(elements):
+    """
+    Stack the edges of every element in to one array. Edge 3*k + i is local
+    edge i of element k (zero-based). Return the edges (corner, corner,
+    side nodes...) and the sorted corner pairs, which identify each edge
+    uniquely.
+    """
+    side_nodes = (elements.shape[1] - 3)//3
+    edges = np.empty((3*elements.shape[0], 2 + side_nodes),
+                     dtype=elements.dtype)
+    for local_edge, (i, j) in enumerate([(0, 1), (1, 2), (2, 0)]):
+        edges[local_edge::3, 0] = elements[:, i]
+        edges[local_edge::3, 1] = elements[:, j]
+        edges[local_edge::3, 2:] = \
+            elements[:, 3 + local_edge*side_nodes:
+                     3 + (local_edge + 1)*side_nodes]
+    # the pairs are combined in to codes elsewhere, so avoid int32 overflow.
+    return (edges, np.sort(edges[:, 0:2], axis=1).astype(np.int64))
+
+
+def remove_unused_nodes(elements, nodes, edge_collections=None):
+    """
+    Delete nodes that are not members of any element and renumber the
+    remaining nodes (in increasing order) from 1.
+
+    Required Arguments
+    ------------------
+    * elements : element connectivity matrix (node numbers start at 1).
+    * nodes    : nodal coordinates corresponding to elements.
+
+    Optional Arguments
+    ------------------
+    * edge_collections : dictionary relating names to sets of edge tuples,
+                         with or without a trailing geometrical label.
+
+    Output
+    ------
+    The tuple (elements, nodes, edge_collections, used_nodes), where
+    used_nodes[k] is the original number of new node k + 1. Node data
+    belonging to the original mesh may be remapped with
+
+        new_data = old_data[used_nodes - 1]
+    """
+    if edge_collections is None:
+        edge_collections = dict()
+    try:
+        edge_size = {3: 2, 6: 3, 10: 4, 15: 5}[elements.shape[1]]
+    except KeyError:
+        raise ValueError("Unsupported mesh type")
+
+    (used_nodes, inverse) = np.unique(elements, return_inverse=True)
+    new_elements = inverse.reshape(elements.shape) + 1
+    new_nodes = nodes[used_nodes - 1]
+
+    # zero marks a node that is not in any element.
+    old_to_new = np.zeros(max(used_nodes.max(), len(nodes)) + 1,
+                          dtype=new_elements.dtype)
+    old_to_new[used_nodes] = np.arange(1, len(used_nodes) + 1)
+
+    new_edge_collections = dict()
+    for key, collection in edge_collections.items():
+        if len(collection) == 0:
+            new_edge_collections[key] = set()
+            continue
+        edges = np.array(list(collection))
+        if edges.ndim != 2 or edges.shape[1] not in (edge_size,
+                                                     edge_size + 1):
+            raise ValueError("Mismatch between size of mesh and" +
+                             " size of edges")
+        # the last entry is the geometrical information, if available.
+        edges[:, 0:edge_size] = old_to_new[edges[:, 0:edge_size]]
+        if np.any(edges[:, 0:edge_size] == 0):
+            raise ValueError("Edges contain nodes that are not in the mesh")
+        new_edge_collections[key] = set(map(tuple, edges.tolist()))
+
+    return (new_elements, new_nodes, new_edge_collections, used_nodes)
+
+
+def node_adjacency(elements, num_nodes=None):
+    """
+    Compute the node adjacency graph of a mesh in compressed sparse row
+    form: two nodes are adjacent if they are members of the same element.
+
+    Required Arguments
+    ------------------
+    * elements : element connectivity matrix (node numbers start at 1).
+
+    Optional Arguments
+    ------------------
+    * num_nodes : number of nodes in the mesh. Defaults to the largest
+                  node number in elements.
+
+    Output
+    ------
+    The tuple (offsets, neighbors) of zero-based arrays: the neighbors of
+    node k + 1 are neighbors[offsets[k]:offsets[k + 1]] + 1.
+    """
+    if num_nodes is None:
+        num_nodes = elements.max()
+    elements = np.asarray(elements, dtype=np.int64)
+    nodes_per_element = elements.shape[1]
+    rows = np.repeat(elements - 1, nodes_per_element, axis=1).ravel()
+    columns = np.tile(elements - 1, (1, nodes_per_element)).ravel()
+    codes = np.unique(rows[rows != columns]*num_nodes
+                      + columns[rows != columns])
+    offsets = np.zeros(num_nodes + 1, dtype=int)
+    offsets[1:] = np.cumsum(np.bincount(codes//num_nodes,
+                                        minlength=num_nodes))
+    return (offsets, codes % num_nodes)
+
+
+def reverse_cuthill_mckee(elements, num_nodes=None):
+    """
+    Compute a reverse Cuthill-McKee ordering of the nodes of a mesh (see
+    node_adjacency for the graph), which reduces the bandwidth of the
+    resulting finite element matrices. Uses SciPy if it is available.
+
+    Required Arguments
+    ------------------
+    * elements : element connectivity matrix (node numbers start at 1).
+
+    Optional Arguments
+    ------------------
+    * num_nodes : number of nodes in the mesh. Defaults to the largest
+                  node number in elements.
+
+    Output
+    ------
+    An array `order` such that order[k] is the number of the node which
+    should be numbered k + 1.
+    """
+    if num_nodes is None:
+        num_nodes = elements.max()
+    return graph_reverse_cuthill_mckee(
+        *node_adjacency(elements, num_nodes)) + 1
+
+
+def graph_reverse_cuthill_mckee(offsets, neighbors):
+    """
+    Compute a reverse Cuthill-McKee ordering of a graph stored in
+    compressed sparse row form (see node_adjacency). Uses SciPy if it is
+    available.
+
+    Output
+    ------
+    A zero-based array `order` such that order[k] is the vertex which should
+    be placed in position k.
+    """
+    try:
+        import scipy.sparse as sparse
+        import scipy.sparse.csgraph as csgraph
+    except ImportError:
+        return _reverse_cuthill_mckee(offsets, neighbors)
+
+    size = len(offsets) - 1
+    graph = sparse.csr_matrix((np.ones(len(neighbors)), neighbors, offsets),
+                              shape=(size, size))
+    return csgraph.reverse_cuthill_mckee(graph, symmetric_mode=True)
+
+
+def element_adjacency(elements, topology=None):
+    """
+    Compute the dual graph of a mesh in compressed sparse row form: two
+    elements are adjacent if they share an edge.
+
+    Required Arguments
+    ------------------
+    * elements : element connectivity matrix (node numbers start at 1).
+
+    Optional Arguments
+    ------------------
+    * topology : the output of edge_topology(elements), if already known.
+
+    Output
+    ------
+    The tuple (offsets, neighbors) of zero-based arrays: the neighbors of
+    element k + 1 are neighbors[offsets[k]:offsets[k + 1]] + 1.
+    """
+    if topology is None:
+        topology = edge_topology(elements)
+    counts = np.diff(topology['offsets'])
+    if np.any(counts > 2):
+        raise ValueError("Mesh is not consistent: an edge is shared by more "
+                         "than two elements")
+    first = topology['elements'][topology['offsets'][:-1][counts == 2]]
+    second = topology['elements'][topology['offsets'][:-1][counts == 2] + 1]
+    rows = np.hstack((first, second))
+    columns = np.hstack((second, first))
+    order = np.lexsort((columns, rows))
+    offsets = np.zeros(elements.shape[0] + 1, dtype=int)
+    offsets[1:] = np.cumsum(np.bincount(rows, minlength=elements.shape[0]))
+    return (offsets, columns[order])
+
+
+def node_to_element(elements, num_nodes=None):
+    """
+    Compute the elements containing each node in compressed sparse row
+    form.
+
+    Required Arguments
+    ------------------
+    * elements : element connectivity matrix (node numbers start at 1).
+
+    Optional Arguments
+    ------------------
+    * num_nodes : number of nodes in the mesh. Defaults to the largest
+                  node number in elements.
+
+    Output
+    ------
+    The tuple (offsets, element_indices) of zero-based arrays: node k + 1
+    is in elements element_indices[offsets[k]:offsets[k + 1]] + 1 (in
+    increasing order).
+    """
+    if num_nodes is None:
+        num_nodes = elements.max()
+    nodes = elements.ravel() - 1
+    order = np.argsort(nodes, kind='mergesort')
+    offsets = np.zeros(num_nodes + 1, dtype=int)
+    offsets[1:] = np.cumsum(np.bincount(nodes, minlength=num_nodes))
+    return (offsets, order//elements.shape[1])
+
+
+def edge_topology(elements):
+    """
+    Number the edges (pairs of corners) of a mesh and relate them to the
+    elements in one sorting pass.
+
+    Required Arguments
+    ------------------
+    * elements : element connectivity matrix; the first three columns are
+                 the corners.
+
+    Output
+    ------
+    A dictionary with the following zero-based arrays:
+
+    * 'edges'         : (M, 2) corner node numbers of each edge, in
+                        increasing order; the edges are sorted.
+
+    * 'element_edges' : (E, 3) edge numbers of the local edges (0, 1),
+                        (1, 2), and (2, 0) of every element.
+
+    * 'offsets', 'elements', 'local_edges' : the edge to element map in
+      compressed sparse row form: edge k is local edge local_edges[j] of
+      element elements[j] for offsets[k] <= j < offsets[k + 1].
+    """
+    keys = _stacked_edges(elements[:, 0:3])[1]
+    order = np.lexsort((keys[:, 1], keys[:, 0]))
+    sorted_keys = keys[order]
+
+    group_starts = np.ones(len(order), dtype=bool)
+    group_starts[1:] = np.any(sorted_keys[1:] != sorted_keys[:-1], axis=1)
+    element_edges = np.empty(len(order), dtype=int)
+    element_edges[order] = np.cumsum(group_starts) - 1
+    return {'edges': sorted_keys[group_starts],
+            'element_edges': element_edges.reshape((-1, 3)),
+            'offsets': np.append(np.flatnonzero(group_starts), len(order)),
+            'elements': order//3, 'local_edges': order % 3}
+
+
+def _reverse_cuthill_mckee(offsets, neighbors):
+    """
+    Breadth-first search implementation of the reverse Cuthill-McKee
+    ordering (zero-based) for when SciPy is not available. Each connected
+    component is started from a node of minimal degree.
+    """
+    degrees = np.diff(offsets)
+    offsets = offsets.tolist()
+    neighbors = neighbors.tolist()
+    degree_list = degrees.tolist()
+    visited = [False]*len(degree_list)
+    order = []
+    for start in np.argsort(degrees, kind='mergesort').tolist():
+        if visited[start]:
+            continue
+        visited[start] = True
+        position = len(order)
+        order.append(start)
+        while position < len(order):
+            node = order[position]
+            position += 1
+            adjacent = [neighbor for neighbor in
+                        neighbors[offsets[node]:offsets[node + 1]]
+                        if not visited[neighbor]]
+            adjacent.sort(key=degree_list.__getitem__)
+            for neighbor in adjacent:
+                visited[neighbor] = True
+            order.extend(adjacent)
+    return np.array(order[::-1], dtype=int)
+
+
+def hilbert_order(points, bits=16):
+    """
+    Order two dimensional points along a Hilbert curve: points that are
+    close on the curve are close in space.
+
+    Required Arguments
+    ------------------
+    * points : (N, 2) array of coordinates.
+
+    Optional Arguments
+    ------------------
+    * bits : resolution of the curve; the bounding box of the points is
+             divided in to a 2**bits by 2**bits grid.
+
+    Output
+    ------
+    An array `order` such that points[order] is sorted along the curve.
     """
-    # Keep track of the original edges. At the end return the non-sorted edges.
-    original_order = dict()
-    sorted_edges = set()
+    side = 2**bits
+    lower = points.min(axis=0)
+    extent = np.max(points.max(axis=0) - lower)
+    if extent == 0.0:
+        extent = 1.0
+    scaled = np.minimum(((points - lower)/extent*side).astype(np.int64),
+                        side - 1)
+    (x, y) = (scaled[:, 0].copy(), scaled[:, 1].copy())
+
+    distance = np.zeros(len(points), dtype=np.int64)
+    step = side//2
+    while step > 0:
+        rx = (x & step) > 0
+        ry = (y & step) > 0
+        distance += step*step*((3*rx) ^ ry)
+        # rotate the quadrant so that the curve is continuous.
+        flip = rx & ~ry
+        x[flip] = side - 1 - x[flip]
+        y[flip] = side - 1 - y[flip]
+        swap = ~ry
+        (x[swap], y[swap]) = (y[swap], x[swap].copy())
+        step //= 2
+    return np.argsort(distance, kind='mergesort')
+
+
+def apply_dirichlet(matrix, rhs, dofs, values=0.0):
+    """
+    Apply Dirichlet boundary conditions to a linear system in place: the
+    rows and columns of the fixed degrees of freedom are zeroed (save for a
+    unit diagonal) and the known values are moved to the right hand side,
+    so symmetric matrices stay symmetric.
+
+    Required Arguments
+    ------------------
+    * matrix : a square matrix in compressed sparse row format; anything
+               with the attributes indptr, indices, and data (such as a
+               scipy.sparse.csr_matrix) will do. Every fixed row must
+               store its diagonal entry.
 
-    side_nodes = int((len(elements[0])-3)/3)
-    for element in elements:
-        # Guarantee uniqueness of edges by sorting the nodes. At the end map
-        # the sorted versions back to the original versions.
-        local_edges = [(element[i], ) + (element[j], ) +
-                       tuple(element[3+i*side_nodes:3+(i+1)*side_nodes])
-                       + (-1, ) for (i, j) in [(0, 1), (1, 2), (2, 0)]]
+    * rhs    : right hand side vector.
 
-        local_sorted_edges = [tuple(sorted(t)) for t in local_edges]
-        original_order.update(zip(local_sorted_edges, local_edges))
+    * dofs   : node numbers (starting at 1) of the fixed degrees of freedom;
+               for example, from ArgyrisMesh.get_dirichlet_dofs.
 
-        for edge in local_sorted_edges:
-            if edge in sorted_edges:
-                sorted_edges.remove(edge)
-            else:
-                sorted_edges.add(edge)
+    Optional Arguments
+    ------------------
+    * values : the values of the fixed degrees of freedom (either a scalar
+               or an array of the same length as dofs). Defaults to zero.
+
+    Output
+    ------
+    The tuple (matrix, rhs).
+    """
+    dofs = np.asarray(dofs, dtype=int) - 1
+    size = len(matrix.indptr) - 1
+    rows = np.repeat(np.arange(size), np.diff(matrix.indptr))
+    is_fixed = np.zeros(size, dtype=bool)
+    is_fixed[dofs] = True
+    fixed_values = np.zeros(size)
+    fixed_values[dofs] = values
+
+    fixed_row = is_fixed[rows]
+    fixed_column = is_fixed[matrix.indices]
+    moved = fixed_column & ~fixed_row
+    rhs -= np.bincount(rows[moved], weights=matrix.data[moved]
+                       *fixed_values[matrix.indices[moved]], minlength=size)
+
+    diagonal = fixed_row & (rows == matrix.indices)
+    if np.count_nonzero(diagonal) != len(np.unique(dofs)):
+        raise ValueError("The matrix does not store the diagonal entries of "
+                         "every fixed row")
+    matrix.data[fixed_row | fixed_column] = 0.0
+    matrix.data[diagonal] = 1.0
+    rhs[dofs] = fixed_values[dofs]
+    return (matrix, rhs)
+
+
+def element_geometry(elements, nodes):
+    """
+    Compute the geometric properties of every (straight sided) triangle in
+    a mesh at once.
+
+    Required Arguments
+    ------------------
+    * elements : element connectivity matrix; the first three columns are
+                 the corners.
+
+    * nodes    : two dimensional nodal coordinates.
+
+    Output
+    ------
+    A dictionary with the following arrays:
 
-    return [original_order[t] for t in sorted_edges]
+    * 'jacobians'    : (E, 2, 2) affine maps B from the reference triangle,
+                       [[x1 - x0, x2 - x0], [y1 - y0, y2 - y0]] (the same
+                       B as ap.numeric.physical_maps).
+
+    * 'determinants' : the determinants of B (twice the signed areas).
+
+    * 'areas'        : the element areas.
+
+    * 'edge_lengths' : (E, 3) lengths of the edges (0, 1), (1, 2), and
+                       (2, 0) in the local numbering of each element.
+
+    * 'normals'      : (E, 3, 2) outward unit normal vectors of the same
+                       edges.
+
+    * 'inradii'      : radii of the inscribed circles.
+
+    * 'qualities'    : the ratio of twice the inradius to the circumradius,
+                       which is one for equilateral triangles and tends to
+                       zero for degenerate ones.
+    """
+    corners = nodes[elements[:, 0:3] - 1]
+    jacobians = np.empty((elements.shape[0], 2, 2))
+    jacobians[:, :, 0] = corners[:, 1] - corners[:, 0]
+    jacobians[:, :, 1] = corners[:, 2] - corners[:, 0]
+    determinants = (jacobians[:, 0, 0]*jacobians[:, 1, 1]
+                    - jacobians[:, 0, 1]*jacobians[:, 1, 0])
+    areas = 0.5*np.abs(determinants)
+
+    tangents = corners[:, [1, 2, 0]] - corners
+    edge_lengths = np.sqrt(np.sum(tangents**2, axis=2))
+    # rotate the tangents clockwise; flip for clockwise elements.
+    normals = np.empty_like(tangents)
+    normals[:, :, 0] = tangents[:, :, 1]
+    normals[:, :, 1] = -tangents[:, :, 0]
+    normals *= (np.sign(determinants)[:, np.newaxis]
+                /edge_lengths)[:, :, np.newaxis]
+
+    inradii = 2.0*areas/edge_lengths.sum(axis=1)
+    circumradii = np.prod(edge_lengths, axis=1)/(4.0*areas)
+    return {'jacobians': jacobians, 'determinants': determinants,
+            'areas': areas, 'edge_lengths': edge_lengths,
+            'normals': normals, 'inradii': inradii,
+            'qualities': 2.0*inradii/circumradii}
 
 
 def project_nodes(projection, elements, original_nodes,
@@ -91,6 +563,12 @@ def project_nodes(projection, elements, original_nodes,
 
     Required Arguments
     ------------------
+    * projection : function that projects nodes, or None for no projection.
+                   Projections marked with ap.mesh.projections.vectorized
+                   (such as ap.mesh.projections.lambert_azimuthal) map the
+                   whole (N, 3) array of coordinates to an (N, 2) array in
+                   one call; any other function is applied to one node at a
+                   time.
     * elements : element connectivity matrix. Assumes Lagrange elements
                  and GMSH-style ordering.
     * original_nodes : nodal coordinates corresponding to elements.
@@ -109,52 +587,230 @@ def project_nodes(projection, elements, original_nodes,
             nodes = np.ascontiguousarray(original_nodes[:, 0:-1])
             return nodes
 
-    nodes = np.array([projection(node) for node in original_nodes])
+    if projection is None:
+        nodes = np.array(original_nodes, dtype=np.float64)
+    elif getattr(projection, 'vectorized', False):
+        nodes = np.asarray(projection(original_nodes), dtype=np.float64)
+        if nodes.shape[0] != original_nodes.shape[0] or nodes.ndim != 2:
+            raise ValueError("A vectorized projection must map an (N, 3) "
+                             "array to an (N, 2) array")
+        nodes = np.ascontiguousarray(nodes)
+    else:
+        nodes = np.array([projection(node) for node in original_nodes])
 
     # Do nothing for linears: there are no midpoints to fix.
     if elements.shape[1] == 3:
         pass
     # fix quadratics.
     elif elements.shape[1] == 6:
-        for i in range(2):
-            for (j, k) in [(0, 1), (1, 2), (2, 0)]:
-                nodes[elements[:, j + 3] - 1, i] = \
-                    0.5*(nodes[elements[:, j] - 1, i] +
-                         nodes[elements[:, k] - 1, i])
+        nodes[elements[:, 3:6] - 1] = 0.5*(nodes[elements[:, 0:3] - 1] +
+                                           nodes[elements[:, [1, 2, 0]] - 1])
     return nodes
 
 
+def _labelled_edges(mesh):
+    """
+    Return the edges of a parsed mesh (its edges) or of a Mesh (its
+    border_edges, as an array) with the label of each edge last.
+    """
+    if hasattr(mesh, 'border_edges'):
+        return mesh.border_edges.with_labels()
+    return mesh.edges
+
+
 def change_order(mesh, order):
     """
-    Change the order of the elements in a mesh.
+    Change the order of the elements in a mesh. Currently only linear to
+    quadratic conversion is supported.
+
+    Every element edge is identified by its sorted endpoints; the unique
+    edges (found by sorting) are numbered after the existing nodes and
+    their midpoints become the new nodes. Edges keep their geometrical
+    labels, so the result may still be split in to edge collections.
+
+    Required Arguments
+    ------------------
+    * mesh  : a parsed mesh (with elements, nodes, and edges) or a Mesh
+              (with elements, nodes, and border_edges).
+    * order : the new element order.
+
+    Output
+    ------
+    A ParseArrays object containing the new elements (in GMSH ordering),
+    nodes, and edges of the form (node, node, midpoint, label).
     """
-    max_node_num = mesh.elements.max()
     if mesh.elements.shape[1] == 3 and order == 2:
+        edges = _labelled_edges(mesh)
+
+        max_node_num = max(mesh.elements.max(), mesh.nodes.shape[0])
+        (corner_pairs, keys) = _stacked_edges(mesh.elements)
+        edge_codes = keys[:, 0]*(max_node_num + 1) + keys[:, 1]
+        (unique_codes, first_index, inverse) = np.unique(
+            edge_codes, return_index=True, return_inverse=True)
+
         new_elements = np.zeros((mesh.elements.shape[0], 6),
                                 dtype=mesh.elements.dtype)
-        new_elements[:, :3] = np.sort(mesh.elements, axis=1)
-
-        if len(mesh.edge_collections.items()) != 1:
-            raise NotImplementedError("Cannot handle multiple edge collections")
-        edge_lookup = dict()
-        midpoint_number = max_node_num + 1
-        for element in new_elements:
-            for k, (i, j) in enumerate([(0, 1), (1, 2), (0, 2)]):
-                pair = (element[i], element[j])
-                if pair not in edge_lookup:
-                    edge_lookup[pair] = midpoint_number
-                    midpoint_number += 1
-                element[k + 3] = edge_lookup[pair]
-
-        new_nodes = np.zeros((new_elements.max(), 2))
-        new_nodes[:max_node_num, :] = mesh.nodes
-        for edge, new_node in edge_lookup.items():
-            new_nodes[new_node - 1] = (
-                new_nodes[edge[0] - 1] + new_nodes[edge[1] - 1])/2.0
-
+        new_elements[:, 0:3] = mesh.elements
+        new_elements[:, 3:6] = (max_node_num + 1 + inverse).reshape((-1, 3))
+
+        unique_edges = corner_pairs[first_index]
+        new_nodes = np.zeros((max_node_num + len(unique_codes),
+                              mesh.nodes.shape[1]))
+        new_nodes[0:mesh.nodes.shape[0]] = mesh.nodes
+        new_nodes[max_node_num:] = 0.5*(mesh.nodes[unique_edges[:, 0] - 1] +
+                                        mesh.nodes[unique_edges[:, 1] - 1])
+
+        new_edges = []
+        if len(edges) > 0:
+            edges = np.array(list(edges))
+            if edges.shape[1] == 2:
+                edges = np.column_stack((edges, -np.ones(len(edges),
+                                                         dtype=int)))
+            edge_keys = np.sort(edges[:, 0:2], axis=1)
+            edge_codes = edge_keys[:, 0]*(max_node_num + 1) + edge_keys[:, 1]
+            position = np.searchsorted(unique_codes, edge_codes)
+            position[position == len(unique_codes)] = 0
+            if np.any(unique_codes[position] != edge_codes):
+                raise ValueError("Edges contain sides that are not in the "
+                                 "mesh")
+            new_edges = np.column_stack((edges[:, 0:2],
+                                         max_node_num + 1 + position,
+                                         edges[:, 2]))
+            new_edges = list(map(tuple, new_edges.tolist()))
     else:
         raise NotImplementedError("Unsupported mesh order conversion")
-    return parsers.ParseArrays(new_elements, new_nodes)
+    return parsers.ParseArrays(new_elements, new_nodes, new_edges)
+
+
+def split_elements(mesh):
+    """
+    Split every quadratic element in to four linear elements whose corners
+    are the corners and midpoints of the original element (a 'red'
+    refinement). The children of element k are elements 4*k + 1 through
+    4*k + 4 of the result, so the refined mesh is nested in the original.
+
+    Required Arguments
+    ------------------
+    * mesh : a parsed mesh (with elements, nodes, and edges) or a Mesh
+             (with elements, nodes, and border_edges) of quadratic
+             elements in GMSH ordering.
+
+    Output
+    ------
+    A ParseArrays object containing the new elements, the (unchanged)
+    nodes, and edges of the form (node, node, label): each edge is split
+    in two at its midpoint and both halves keep its label.
+    """
+    if mesh.elements.shape[1] != 6:
+        raise NotImplementedError("Only quadratic elements may be split")
+    edges = _labelled_edges(mesh)
+
+    new_elements = mesh.elements[:, [0, 3, 5, 3, 1, 4, 5, 4, 2, 3, 4, 5]]
+    new_elements = new_elements.reshape((-1, 3))
+
+    new_edges = []
+    if len(edges) > 0:
+        # find the midpoints from the elements so that edges without them
+        # (for example, from .mesh files) are handled too.
+        edges = np.array(list(edges))
+        max_node_num = max(mesh.elements.max(), mesh.nodes.shape[0])
+        (sides, keys) = _stacked_edges(mesh.elements)
+        side_codes = keys[:, 0]*(max_node_num + 1) + keys[:, 1]
+        (side_codes, first_index) = np.unique(side_codes, return_index=True)
+        edge_keys = np.sort(edges[:, 0:2], axis=1)
+        edge_codes = edge_keys[:, 0]*(max_node_num + 1) + edge_keys[:, 1]
+        position = np.searchsorted(side_codes, edge_codes)
+        position[position == len(side_codes)] = 0
+        if np.any(side_codes[position] != edge_codes):
+            raise ValueError("Edges contain sides that are not in the mesh")
+        midpoints = sides[first_index[position], 2]
+
+        new_edges = np.empty((2*len(edges), 3), dtype=int)
+        new_edges[0::2] = np.column_stack((edges[:, 0], midpoints,
+                                           edges[:, -1]))
+        new_edges[1::2] = np.column_stack((midpoints, edges[:, 1],
+                                           edges[:, -1]))
+        new_edges = list(map(tuple, new_edges.tolist()))
+    return parsers.ParseArrays(new_elements, mesh.nodes, new_edges)
+
+
+def red_refinement(mesh, levels=1):
+    """
+    Uniformly refine a mesh by splitting every element in to four, levels
+    times. New nodes are placed at the midpoints of the sides of the
+    elements in the coordinates of the input nodes.
+
+    Required Arguments
+    ------------------
+    * mesh : a parsed mesh (with elements, nodes, and edges) or a Mesh
+             (with elements, nodes, and border_edges) of linear or
+             quadratic elements.
+
+    Optional Arguments
+    ------------------
+    * levels : number of times to refine the mesh. Defaults to 1.
+
+    Output
+    ------
+    A ParseArrays object containing elements of the same order as the input
+    mesh, nodes, and edges (which keep their labels).
+    """
+    order = mesh.elements.shape[1]
+    if order not in (3, 6):
+        raise NotImplementedError("Unsupported element type")
+    edges = _labelled_edges(mesh)
+
+    refined_mesh = parsers.ParseArrays(mesh.elements, mesh.nodes, edges)
+    for level in range(levels):
+        if refined_mesh.elements.shape[1] == 3:
+            refined_mesh = change_order(refined_mesh, 2)
+        refined_mesh = split_elements(refined_mesh)
+    if order == 6 and levels > 0:
+        refined_mesh = change_order(refined_mesh, 2)
+    return refined_mesh
+
+
+def classify_edges(labels, borders=None, default_border='land'):
+    """
+    Assign edges to borders by their labels with one lookup per distinct
+    label (rather than per edge).
+
+    Required Arguments
+    ------------------
+    * labels : array of the (GMSH 'Physical Line') label of every edge.
+
+    Optional Arguments
+    ------------------
+    * borders        : a dictionary correlating border names with
+                       collections of labels. For example,
+
+          borders = {'ocean_in' : (1,), 'ocean_out' : (2, 3)}
+
+                       If a label belongs to several borders then the first
+                       name in sorted order wins.
+
+    * default_border : the border to place all other edges in. Defaults to
+                      'land'.
+
+    Output
+    ------
+    The tuple (names, border_ids) where names lists the default border
+    followed by the other borders in sorted order and border_ids is an
+    int32 array of the index in names of the border of each edge.
+    """
+    if borders is None:
+        borders = dict()
+    if default_border in borders:
+        raise ValueError("Specific border and default border share same name")
+
+    names = [default_border] + sorted(borders.keys())
+    labels = np.asarray(labels).reshape(-1)
+    (unique_labels, inverse) = np.unique(labels, return_inverse=True)
+    label_borders = np.zeros(len(unique_labels), dtype=np.int32)
+    for border_id in range(len(names) - 1, 0, -1):
+        border_labels = np.fromiter(borders[names[border_id]], dtype=int)
+        label_borders[np.isin(unique_labels, border_labels)] = border_id
+    return (names, label_borders[inverse.reshape(-1)])
 
 
 def organize_edges(edges, borders=None, default_border='land'):
@@ -172,23 +828,24 @@ def organize_edges(edges, borders=None, default_border='land'):
 
     Optional Arguments
     ------------------
-    * borders        : a dictionary correlating border numbers with names. For
-                       example,
+    * borders        : a dictionary correlating names with collections of
+                       labels. For example,
 
-          borders = {'ocean_in' : 1, 'ocean_out' : 2}
+          borders = {'ocean_in' : (1,), 'ocean_out' : (2,)}
 
     * default_border : the border to place all other edges in. Defaults to
                       'land'.
-    """
-    if borders is None:
-        borders = dict()
-    if default_border in borders:
-        raise ValueError("Specific border and default border share same name")
 
-    edge_collections = dict()
-    edge_collections[default_border] = set(edges)
-    for border, labels in borders.items():
-        edge_collections[border] = {t for t in edge_collections[default_border]
-                                    if t[-1] in labels}
-        edge_collections[default_border] -= edge_collections[border]
+    Output
+    ------
+    A dictionary relating border names to sets of edge tuples. Meshes store
+    their edges as arrays instead; see classify_edges and
+    ap.mesh.meshes.BorderEdges.
+    """
+    edges = list(set(edges))
+    (names, border_ids) = classify_edges([edge[-1] for edge in edges],
+                                         borders, default_border)
+    edge_collections = {name: set() for name in names}
+    for edge, border_id in zip(edges, border_ids.tolist()):
+        edge_collections[names[border_id]].add(edge)
     return edge_collections
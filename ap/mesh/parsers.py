@@ -1,9 +1,20 @@
 #! /usr/bin/env python
 """Parsers for loading common finite element text formats."""
 import abc
+import mmap
 import re
 import numpy as np
 
+# number of nodes in each GMSH element type. See the GMSH documentation for
+# more details.
+_MSH_NODES_PER_ELEMENT = {1: 2, 2: 3, 3: 4, 4: 4, 5: 8, 6: 6, 7: 5, 8: 3,
+                          9: 6, 10: 9, 11: 10, 12: 27, 13: 18, 14: 14, 15: 1,
+                          16: 8, 17: 20, 18: 15, 19: 13, 20: 9, 21: 10,
+                          22: 12, 23: 15, 24: 15, 25: 21, 26: 4, 27: 5, 28: 6}
+# hard-coded lists of triangular and line entities.
+_MSH_TRIANGLE_TYPES = [2, 9, 20, 21, 22, 23, 24, 25]
+_MSH_LINE_TYPES = [1, 8, 26, 27, 28]
+
 
 def parser_factory(*args):
     """
@@ -92,68 +103,88 @@ class ParseMESHFormat(MeshParser):
     """
     Parse a .mesh file generated by GMSH.
 
+    The file is read once; the offsets of every section are located with a
+    single regular expression scan and each numeric block is then tokenized
+    in bulk straight in to a NumPy array.
+
     Required Arguments
     ------------------
     * mesh_file : file path to the .mesh file.
     """
     __doc__ += MeshParser.__doc__
 
+    # a section starts with a line containing only a keyword; the next token
+    # is the number of rows in the section. Anchoring on the newline (instead
+    # of using re.M) is considerably faster on large files.
+    _section_header = re.compile(br"\n[ \t]*([A-Za-z]\w*)[ \t]*\r?(?=\n)")
+    _section_count = re.compile(br"\s*([0-9]+)[ \t]*\r?\n")
+
     def __init__(self, mesh_file):
         self._mesh_file = mesh_file
+        with open(self._mesh_file, 'rb') as mesh_file:
+            self._contents = mesh_file.read()
+        self._sections = self._find_sections()
 
-        def _element_parse(x):
-            xsplit = x.split()[0:-1]
-            return tuple(map(int, xsplit))
-        elements = self._parse_section("Triangles", _element_parse)
-        self.elements = np.vstack(elements)
+        elements = self._parse_section("Triangles", dtype=int)
+        self.elements = np.ascontiguousarray(elements[:, 0:-1])
 
-        def _node_parse(x):
-            xsplit = x.split()[0:-1]
-            return tuple(map(float, xsplit))
-
-        nodes = self._parse_section("Vertices", _node_parse)
-        self.nodes = np.vstack(nodes)
+        nodes = self._parse_section("Vertices", dtype=np.float64)
+        self.nodes = np.ascontiguousarray(nodes[:, 0:-1])
 
         # a .mesh value does not always have this section.
-        def _edge_parse(x):
-            return tuple(map(int, x.split()))
         try:
-            self.edges = self._parse_section("Edges", _edge_parse)
+            self.edges = list(map(tuple,
+                                  self._parse_section("Edges",
+                                                      dtype=int).tolist()))
         except ValueError:
             self.edges = list()
 
-    def _parse_section(self, pattern, line_parse_function):
+        del self._contents
+
+    def _find_sections(self):
+        """
+        Locate every section of the file in one pass. Return a list of
+        (keyword, count, data start, data end) tuples, where the offsets
+        delimit the numeric block following the count.
+        """
+        headers = list(self._section_header.finditer(self._contents))
+        sections = []
+        for index, header in enumerate(headers):
+            if index + 1 < len(headers):
+                section_end = headers[index + 1].start()
+            else:
+                section_end = len(self._contents)
+            count = self._section_count.match(self._contents, header.end(),
+                                              section_end)
+            if count is not None:
+                sections.append((header.group(1).decode(),
+                                 int(count.group(1)), count.end(),
+                                 section_end))
+        return sections
+
+    def _parse_section(self, pattern, dtype=np.float64):
         """
-        Parse one chunk of the file, starting with some regex. Apply the
-        function `line_parse_function` to each line in the section. Return a
-        list of the results. Stop when we get to another section (triggered by
-        reaching another line with alphabetical characters).
+        Parse one chunk of the file, starting with some keyword (such as
+        'Triangles', which also matches 'TrianglesP2'). Return the section
+        as a two dimensional array of type `dtype` with one row per line.
         """
-        found_section = False
-        found_count = False
-        parsed_section = []
-        with open(self._mesh_file) as mesh_file:
-            for line in mesh_file:
-                if (not found_section) and re.search(pattern, line):
-                    found_section = True
-
-                # if there is a lone number then we are on the next line.
-                # Ignore it.
-                if found_section:
-                    if not found_count and re.search(r"^ *[0-9]+$", line):
-                        found_count = True
-                        continue
-
-                    # if we have found another string then the section is over.
-                    if found_count and re.search(r"^ *[A-Z]?[a-z]+", line):
-                        break
-
-                    if found_count and (len(line) > 1):
-                        parsed_section.append(line_parse_function(line))
-
-        if not found_section:
+        for (keyword, count, data_start, data_end) in self._sections:
+            if keyword.startswith(pattern):
+                break
+        else:
             raise ValueError("Section with pattern " + pattern + " not found")
-        return parsed_section
+
+        block = self._contents[data_start:data_end]
+        first_line = re.match(br"\s*([^\n]*)", block).group(1)
+        num_columns = len(first_line.split())
+        if count == 0 or num_columns == 0:
+            return np.empty((0, num_columns), dtype=dtype)
+
+        # np.fromstring tokenizes the whole block in C and, since the size is
+        # known, allocates the output exactly once.
+        values = np.fromstring(block, dtype=dtype, count=count*num_columns,
+                               sep=" ")
+        return values.reshape((count, num_columns))
 
 
 class ParseTXTFormat(MeshParser):
@@ -172,7 +203,7 @@ class ParseTXTFormat(MeshParser):
 
     def __init__(self, element_file_name="elements.txt",
                  node_file_name="nodes.txt"):
-        self.elements = np.loadtxt(element_file_name, dtype=np.int)
+        self.elements = np.loadtxt(element_file_name, dtype=int)
         self.nodes = np.loadtxt(node_file_name, dtype=np.float64)
         self.edges = list()
 
@@ -183,6 +214,13 @@ class ParseTXTFormat(MeshParser):
 class ParseMSHFormat(MeshParser):
     """
     Parse a mesh stored in the .msh format, the standard file format for GMSH.
+    Versions 2.2 and 4.1 are supported in both ASCII and binary form.
+
+    Binary files are memory-mapped and every node and element block is read
+    in place as a typed array; ASCII blocks are tokenized in bulk. Triangles
+    and lines are then selected from the element blocks with masks on the
+    element type. As with GMSH's .mesh output, the last entry of each edge is
+    the elementary (geometrical) entity on which the edge lies.
 
     Required Arguments
     ------------------
@@ -192,67 +230,324 @@ class ParseMSHFormat(MeshParser):
 
     def __init__(self, mesh_file):
         self._mesh_file = mesh_file
+        with open(self._mesh_file, 'rb') as mesh_file:
+            self._contents = mmap.mmap(mesh_file.fileno(), 0,
+                                       access=mmap.ACCESS_READ)
+        try:
+            (elements, nodes, edges) = self._parse_contents()
+        except Exception:
+            # views on the map may survive in the traceback, so leave closing
+            # it to the garbage collector.
+            del self._contents
+            raise
+        # every array returned by _parse_contents owns its data, so nothing
+        # refers to the map any more.
+        self._contents.close()
+        del self._contents
 
-        mesh_format = self._parse_section("MeshFormat",
-            lambda x: tuple(x.split()), has_count=False)
-        if mesh_format[0][0] != "2.2":
+        self.elements = elements
+        self.nodes = nodes
+        self.edges = list(map(tuple, edges.tolist()))
+
+    def _parse_contents(self):
+        """
+        Parse the mapped file. Return the tuple (elements, nodes, edges) of
+        arrays, none of which is a view on the map.
+        """
+        (version, is_binary, size_t_size) = self._parse_mesh_format()
+        if version == "2.2" and is_binary:
+            (node_tags, nodes) = self._parse_nodes_22_binary()
+            element_blocks = self._parse_elements_22_binary()
+        elif version == "2.2":
+            (node_tags, nodes) = self._parse_nodes_22_ascii()
+            element_blocks = self._parse_elements_22_ascii()
+        elif version == "4.1" and is_binary:
+            (node_tags, nodes) = self._parse_nodes_41_binary(size_t_size)
+            element_blocks = self._parse_elements_41_binary(size_t_size)
+        elif version == "4.1":
+            (node_tags, nodes) = self._parse_nodes_41_ascii()
+            element_blocks = self._parse_elements_41_ascii()
+        else:
             raise ValueError("Unsupported .msh version")
 
-        elements = self._parse_section("Elements",
-            lambda x: tuple(map(int, x.split()[1:])))
-        # hard-coded list of triangular entities. See GMSH documentation for
-        # more details.
-        triangles = [x[4:] for x in elements
-                     if x[0] in [2, 9, 20, 21, 22, 23, 24, 25]]
-        edges = [x[4:] + (x[3],) for x in elements if x[0] in [1, 8]]
+        triangles = [block for block in element_blocks
+                     if block[0] in _MSH_TRIANGLE_TYPES]
+        lines = [block for block in element_blocks
+                 if block[0] in _MSH_LINE_TYPES]
         try:
-            self.elements = np.vstack(triangles)
+            elements = np.vstack([block[2] for block in triangles])
         except ValueError as np_error:
             raise ValueError(str(np_error) + ". Ensure that the mesh is"
                              " conforming (all elements the same order)")
 
-        self.edges = edges
-        nodes = self._parse_section("Nodes",
-            lambda x: (tuple(map(float, x.split()[1:])), int(x.split()[-1])))
-        self.nodes = np.vstack([x[0] for x in nodes])
+        if lines:
+            edges = np.vstack([np.column_stack((block[2], block[1]))
+                               for block in lines])
+        else:
+            edges = np.empty((0, 3), dtype=int)
 
-    def _parse_section(self, pattern, line_parse_function, has_count=True):
+        # GMSH does not require node tags to be contiguous or sorted.
+        # Renumber them as 1, 2, ... in order of increasing tag.
+        if not np.array_equal(node_tags, np.arange(1, len(node_tags) + 1)):
+            order = np.argsort(node_tags, kind='mergesort')
+            nodes = nodes[order]
+            tag_to_number = np.zeros(node_tags.max() + 1, dtype=int)
+            tag_to_number[node_tags[order]] = np.arange(1, len(node_tags) + 1)
+            elements = tag_to_number[elements]
+            edges[:, 0:-1] = tag_to_number[edges[:, 0:-1]]
+
+        return (elements, nodes, edges)
+
+    def _parse_section(self, pattern):
         """
-        Parse one chunk of the file, starting with some regex. Apply the
-        function 'line_parse_function' to each line in the section. Return a
-        list of the results. Stop when we get to another section (triggered by
-        reaching another line with alphabetical characters).
+        Locate the section named `pattern` (e.g. 'Nodes' for the data between
+        '$Nodes' and '$EndNodes'). Return the offsets of the first and one
+        past the last byte of the section's data.
         """
-        found_section = False
-        found_count = False
-        parsed_section = []
-        if not has_count:
-            found_count = True
-
-        with open(self._mesh_file) as mesh_file:
-            for line in mesh_file:
-                if not found_section and re.search(pattern, line):
-                    found_section = True
-                    continue
-
-                # if there is a lone number then we are on the next line.
-                # Ignore it.
-                if found_section:
-                    if not found_count and re.search(r"^ *[0-9]+$", line):
-                        found_count = True
-                        continue
-
-                    # if we have found another string then the section is over.
-                    if found_count and re.search(r"^ *\$\w+", line):
-                        break
-
-                    # correctly ignore blank lines.
-                    if found_count and not re.match(r"\s+$", line):
-                        parsed_section.append(line_parse_function(line))
-
-        if not found_section:
+        start = self._contents.find(b"$" + pattern.encode() + b"\n")
+        if start == -1:
+            start = self._contents.find(b"$" + pattern.encode() + b"\r\n")
+        if start == -1:
             raise ValueError("Section with pattern " + pattern + " not found")
-        return parsed_section
+        start = self._contents.find(b"\n", start) + 1
+        end = self._contents.find(b"$End" + pattern.encode(), start)
+        if end == -1:
+            raise ValueError("Section with pattern " + pattern +
+                             " is not terminated")
+        return (start, end)
+
+    def _parse_mesh_format(self):
+        """
+        Parse the MeshFormat section. Return the version string, whether or
+        not the file is binary, and the size of size_t in bytes. For binary
+        files, also determine the byte order from the stored integer one.
+        """
+        (start, end) = self._parse_section("MeshFormat")
+        line_end = self._contents.find(b"\n", start)
+        fields = self._contents[start:line_end].split()
+        (version, is_binary, size_t_size) = (fields[0].decode(),
+                                             int(fields[1]), int(fields[2]))
+        self._byte_order = "<"
+        if is_binary:
+            one = self._contents[line_end + 1:line_end + 5]
+            if np.frombuffer(one, dtype="<i4")[0] != 1:
+                self._byte_order = ">"
+        return (version, bool(is_binary), size_t_size)
+
+    def _ascii_block(self, start, end, dtype):
+        """Tokenize the bytes between `start` and `end` in bulk."""
+        return np.fromstring(self._contents[start:end], dtype=dtype, sep=" ")
+
+    def _binary_block(self, offset, dtype, count):
+        """
+        Interpret `count` items of type `dtype` at `offset` as an array. This
+        is a view on the memory-mapped file, so nothing is read until it is
+        used.
+        """
+        dtype = np.dtype(dtype).newbyteorder(self._byte_order)
+        return np.frombuffer(self._contents, dtype=dtype, count=count,
+                             offset=offset)
+
+    def _parse_nodes_22_ascii(self):
+        """Parse the nodes of an ASCII version 2.2 file."""
+        (start, end) = self._parse_section("Nodes")
+        values = self._ascii_block(start, end, np.float64)
+        num_nodes = int(values[0])
+        values = values[1:4*num_nodes + 1].reshape((num_nodes, 4))
+        return (values[:, 0].astype(int), np.ascontiguousarray(values[:, 1:]))
+
+    def _parse_nodes_22_binary(self):
+        """Parse the nodes of a binary version 2.2 file."""
+        (start, _) = self._parse_section("Nodes")
+        line_end = self._contents.find(b"\n", start)
+        num_nodes = int(self._contents[start:line_end])
+        records = self._binary_block(
+            line_end + 1, [('tag', 'i4'), ('coordinates', 'f8', (3,))],
+            num_nodes)
+        return (records['tag'].astype(int),
+                records['coordinates'].astype(np.float64))
+
+    def _parse_elements_22_ascii(self):
+        """
+        Parse the elements of an ASCII version 2.2 file. Rows have different
+        lengths (depending on element type and number of tags), so count
+        the tokens on every line and then extract all rows of the same
+        shape at once.
+        """
+        (start, end) = self._parse_section("Elements")
+        block = self._contents[start:end]
+        characters = np.frombuffer(block, dtype=np.uint8)
+        blank = np.isin(characters, np.frombuffer(b" \t\r\n", np.uint8))
+        token_starts = ~blank
+        token_starts[1:] &= blank[:-1]
+        newlines = np.flatnonzero(characters == ord("\n"))
+        tokens_per_line = np.bincount(
+            np.searchsorted(newlines, np.flatnonzero(token_starts)),
+            minlength=len(newlines) + 1)
+        # skip blank lines and the line containing the number of elements.
+        tokens_per_line = tokens_per_line[tokens_per_line > 0][1:]
+
+        tokens = np.fromstring(block, dtype=np.int64, sep=" ")[1:]
+        row_starts = np.zeros(len(tokens_per_line), dtype=int)
+        row_starts[1:] = np.cumsum(tokens_per_line)[:-1]
+        element_types = tokens[row_starts + 1]
+        num_tags = tokens[row_starts + 2]
+
+        blocks = []
+        wanted = np.isin(element_types,
+                         _MSH_TRIANGLE_TYPES + _MSH_LINE_TYPES)
+        for element_type in np.unique(element_types[wanted]):
+            for tag_count in np.unique(num_tags[element_types ==
+                                                element_type]):
+                rows = row_starts[(element_types == element_type)
+                                  & (num_tags == tag_count)]
+                width = 3 + tag_count + _MSH_NODES_PER_ELEMENT[element_type]
+                data = tokens[rows[:, np.newaxis] + np.arange(width)]
+                blocks.append((element_type,
+                               self._entity_tags_22(data[:, 3:3 + tag_count]),
+                               data[:, 3 + tag_count:]))
+        return blocks
+
+    def _parse_elements_22_binary(self):
+        """Parse the elements of a binary version 2.2 file."""
+        (start, _) = self._parse_section("Elements")
+        line_end = self._contents.find(b"\n", start)
+        num_elements = int(self._contents[start:line_end])
+        offset = line_end + 1
+        blocks = []
+        while num_elements > 0:
+            (element_type, num_following, tag_count) = \
+                self._binary_block(offset, 'i4', 3).tolist()
+            offset += 3*4
+            try:
+                width = 1 + tag_count + _MSH_NODES_PER_ELEMENT[element_type]
+            except KeyError:
+                raise ValueError("Unsupported element type " +
+                                 str(element_type))
+            if (element_type in _MSH_TRIANGLE_TYPES
+                    or element_type in _MSH_LINE_TYPES):
+                data = self._binary_block(offset, 'i4', num_following*width)
+                data = data.reshape((num_following, width)).astype(int)
+                blocks.append((element_type,
+                               self._entity_tags_22(data[:, 1:1 + tag_count]),
+                               data[:, 1 + tag_count:]))
+            offset += 4*num_following*width
+            num_elements -= num_following
+        return blocks
+
+    @staticmethod
+    def _entity_tags_22(tags):
+        """
+        Version 2.2 files store the physical entity first and then the
+        elementary entity. Return the elementary entity if it is available.
+        """
+        if tags.shape[1] >= 2:
+            return tags[:, 1]
+        elif tags.shape[1] == 1:
+            return tags[:, 0]
+        else:
+            return -np.ones(tags.shape[0], dtype=int)
+
+    def _parse_nodes_41_ascii(self):
+        """
+        Parse the nodes of an ASCII version 4.1 file. Each entity block lists
+        its node tags followed by its coordinates.
+        """
+        (start, end) = self._parse_section("Nodes")
+        values = self._ascii_block(start, end, np.float64)
+        num_blocks = int(values[0])
+        position = 4
+        tags = []
+        coordinates = []
+        for _ in range(num_blocks):
+            (entity_dim, _, parametric, num_nodes) = \
+                values[position:position + 4].astype(int)
+            position += 4
+            tags.append(values[position:position + num_nodes].astype(int))
+            position += num_nodes
+            width = 3 + (entity_dim if parametric else 0)
+            coordinates.append(values[position:position + num_nodes*width]
+                               .reshape((num_nodes, width))[:, 0:3])
+            position += num_nodes*width
+        return (np.hstack(tags), np.vstack(coordinates))
+
+    def _parse_nodes_41_binary(self, size_t_size):
+        """Parse the nodes of a binary version 4.1 file."""
+        size_t = 'u' + str(size_t_size)
+        (offset, _) = self._parse_section("Nodes")
+        num_blocks = int(self._binary_block(offset, size_t, 1)[0])
+        offset += 4*size_t_size
+        tags = []
+        coordinates = []
+        for _ in range(num_blocks):
+            (entity_dim, _, parametric) = \
+                self._binary_block(offset, 'i4', 3).tolist()
+            num_nodes = int(self._binary_block(offset + 12, size_t, 1)[0])
+            offset += 12 + size_t_size
+            tags.append(self._binary_block(offset, size_t, num_nodes))
+            offset += size_t_size*num_nodes
+            width = 3 + (entity_dim if parametric else 0)
+            coordinates.append(
+                self._binary_block(offset, 'f8', num_nodes*width)
+                .reshape((num_nodes, width))[:, 0:3])
+            offset += 8*num_nodes*width
+        return (np.hstack(tags).astype(int),
+                np.vstack(coordinates).astype(np.float64))
+
+    def _parse_elements_41_ascii(self):
+        """
+        Parse the elements of an ASCII version 4.1 file. Every entity block
+        contains elements of a single type.
+        """
+        (start, end) = self._parse_section("Elements")
+        values = self._ascii_block(start, end, np.int64)
+        num_blocks = int(values[0])
+        position = 4
+        blocks = []
+        for _ in range(num_blocks):
+            (_, entity_tag, element_type, num_elements) = \
+                values[position:position + 4].tolist()
+            position += 4
+            try:
+                width = 1 + _MSH_NODES_PER_ELEMENT[element_type]
+            except KeyError:
+                raise ValueError("Unsupported element type " +
+                                 str(element_type))
+            if (element_type in _MSH_TRIANGLE_TYPES
+                    or element_type in _MSH_LINE_TYPES):
+                data = values[position:position + num_elements*width]
+                blocks.append((element_type,
+                               np.repeat(entity_tag, num_elements),
+                               data.reshape((num_elements, width))[:, 1:]))
+            position += num_elements*width
+        return blocks
+
+    def _parse_elements_41_binary(self, size_t_size):
+        """Parse the elements of a binary version 4.1 file."""
+        size_t = 'u' + str(size_t_size)
+        (offset, _) = self._parse_section("Elements")
+        num_blocks = int(self._binary_block(offset, size_t, 1)[0])
+        offset += 4*size_t_size
+        blocks = []
+        for _ in range(num_blocks):
+            (_, entity_tag, element_type) = \
+                self._binary_block(offset, 'i4', 3).tolist()
+            num_elements = int(self._binary_block(offset + 12, size_t, 1)[0])
+            offset += 12 + size_t_size
+            try:
+                width = 1 + _MSH_NODES_PER_ELEMENT[element_type]
+            except KeyError:
+                raise ValueError("Unsupported element type " +
+                                 str(element_type))
+            if (element_type in _MSH_TRIANGLE_TYPES
+                    or element_type in _MSH_LINE_TYPES):
+                data = self._binary_block(offset, size_t, num_elements*width)
+                blocks.append((element_type,
+                               np.repeat(entity_tag, num_elements),
+                               data.reshape((num_elements, width))[:, 1:]
+                               .astype(int)))
+            offset += size_t_size*num_elements*width
+        return blocks
 
 
 class ParseArrays(MeshParser):
@@ -274,7 +569,7 @@ class ParseArrays(MeshParser):
     def __init__(self, elements, nodes, edges=None):
         self.elements = elements
         self.nodes = nodes
-        if edges:
+        if edges is not None and len(edges) > 0:
             self.edges = edges
         else:
             self.edges = []
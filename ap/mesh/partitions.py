@@ -0,0 +1,256 @@
+#! /usr/bin/env python
+"""
+Split a mesh in to submeshes for distributed assembly.
+
+Every element belongs to exactly one partition. A degree of freedom (node)
+belongs to every partition containing an element which uses it and is
+owned by the lowest numbered of those partitions; in the other partitions
+it is a ghost. Each worker may therefore assemble its local matrices
+independently and then only exchange the contributions to the interface
+degrees of freedom (see exchange).
+"""
+import numpy as np
+import ap.mesh.meshtools as meshtools
+
+
+def recursive_coordinate_bisection(points, num_parts):
+    """
+    Partition points by recursively splitting them, across the longest side
+    of their bounding box, in to groups whose sizes are proportional to the
+    number of partitions on each side.
+
+    Required Arguments
+    ------------------
+    * points    : (N, 2) array of coordinates.
+    * num_parts : the number of partitions.
+
+    Output
+    ------
+    An array of the (zero-based) partition number of each point.
+    """
+    parts = np.zeros(len(points), dtype=int)
+    _bisect(points, np.arange(len(points)), 0, num_parts, parts)
+    return parts
+
+
+def _bisect(points, indices, first_part, num_parts, parts):
+    """
+    Recursive step of recursive_coordinate_bisection: assign the points
+    indices to partitions first_part through first_part + num_parts - 1.
+    """
+    if num_parts == 1:
+        parts[indices] = first_part
+        return
+    coordinates = points[indices]
+    axis = np.argmax(coordinates.max(axis=0) - coordinates.min(axis=0))
+    order = indices[np.argsort(coordinates[:, axis], kind='mergesort')]
+    left_parts = num_parts//2
+    split = len(indices)*left_parts//num_parts
+    _bisect(points, order[0:split], first_part, left_parts, parts)
+    _bisect(points, order[split:], first_part + left_parts,
+            num_parts - left_parts, parts)
+
+
+def graph_bisection(offsets, neighbors, num_parts):
+    """
+    Partition a graph by cutting its reverse Cuthill-McKee ordering in to
+    contiguous pieces of equal size. Since the ordering sweeps through the
+    graph level by level, each piece is connected to few others.
+
+    Required Arguments
+    ------------------
+    * offsets, neighbors : the graph in compressed sparse row form (see
+                           meshtools.element_adjacency).
+    * num_parts          : the number of partitions.
+
+    Output
+    ------
+    An array of the (zero-based) partition number of each vertex.
+    """
+    order = meshtools.graph_reverse_cuthill_mckee(offsets, neighbors)
+    parts = np.empty(len(order), dtype=int)
+    parts[order] = np.arange(len(order))*num_parts//len(order)
+    return parts
+
+
+def partition_elements(mesh, num_parts, method="rcb"):
+    """
+    Assign every element of a mesh to a partition.
+
+    Required Arguments
+    ------------------
+    * mesh      : a Mesh or ArgyrisMesh (anything with elements and nodes).
+    * num_parts : the number of partitions.
+
+    Optional Arguments
+    ------------------
+    * method : 'rcb' (default) for recursive coordinate bisection of the
+               element centroids or 'graph' to split the element adjacency
+               graph (see graph_bisection).
+
+    Output
+    ------
+    An array of the (zero-based) partition number of each element.
+    """
+    if num_parts < 1 or num_parts > mesh.elements.shape[0]:
+        raise ValueError("The number of partitions must be between one and "
+                         "the number of elements")
+    if method == "rcb":
+        centroids = mesh.nodes[mesh.elements[:, 0:3] - 1].mean(axis=1)
+        return recursive_coordinate_bisection(centroids, num_parts)
+    elif method == "graph":
+        return graph_bisection(*meshtools.element_adjacency(mesh.elements),
+                               num_parts=num_parts)
+    else:
+        raise ValueError("Unsupported partitioning method: " + str(method))
+
+
+def partition(mesh, num_parts, method="rcb", parts=None):
+    """
+    Split a mesh in to submeshes.
+
+    Required Arguments
+    ------------------
+    * mesh      : a Mesh or ArgyrisMesh (anything with elements and nodes).
+    * num_parts : the number of partitions.
+
+    Optional Arguments
+    ------------------
+    * method : see partition_elements.
+    * parts  : the partition number of each element, if already known.
+
+    Output
+    ------
+    A list of Submesh objects, one per partition.
+    """
+    if parts is None:
+        parts = partition_elements(mesh, num_parts, method=method)
+    num_nodes = mesh.elements.max()
+    nodes_per_element = mesh.elements.shape[1]
+    nodes = mesh.nodes
+
+    # a node is owned by the lowest numbered partition that uses it.
+    owners = np.empty(num_nodes, dtype=int)
+    owners.fill(num_parts)
+    np.minimum.at(owners, mesh.elements.ravel() - 1,
+                  np.repeat(parts, nodes_per_element))
+
+    # find the unique (node, partition) pairs and, from them, every pair of
+    # partitions sharing a node.
+    codes = np.unique((mesh.elements.astype(np.int64) - 1)*num_parts
+                      + parts[:, np.newaxis])
+    (pair_nodes, pair_parts) = (codes//num_parts, codes % num_parts)
+    shared = [np.zeros((0, 3), dtype=int)]
+    for offset in range(1, num_parts):
+        first = np.flatnonzero(pair_nodes[offset:] ==
+                               pair_nodes[:len(pair_nodes) - offset])
+        if len(first) == 0:
+            break
+        second = first + offset
+        shared.append(np.column_stack((pair_parts[first], pair_parts[second],
+                                       pair_nodes[first])))
+        shared.append(np.column_stack((pair_parts[second], pair_parts[first],
+                                       pair_nodes[first])))
+    shared = np.vstack(shared)
+    shared = shared[np.lexsort((shared[:, 2], shared[:, 1], shared[:, 0]))]
+
+    submeshes = []
+    global_to_local = np.zeros(num_nodes + 1, dtype=int)
+    for part in range(num_parts):
+        element_numbers = np.flatnonzero(parts == part) + 1
+        elements = mesh.elements[element_numbers - 1]
+        global_nodes = np.unique(elements)
+        # number the owned nodes first and the ghosts last.
+        is_ghost = owners[global_nodes - 1] != part
+        local_to_global = global_nodes[np.argsort(is_ghost, kind='mergesort')]
+        global_to_local[local_to_global] = np.arange(1,
+                                                     len(local_to_global) + 1)
+
+        part_shared = shared[shared[:, 0] == part]
+        neighbors = dict()
+        for neighbor in np.unique(part_shared[:, 1]).tolist():
+            neighbors[neighbor] = global_to_local[
+                part_shared[part_shared[:, 1] == neighbor, 2] + 1]
+
+        submeshes.append(Submesh(
+            part, global_to_local[elements], nodes[local_to_global - 1],
+            element_numbers, local_to_global,
+            owners[local_to_global - 1], neighbors))
+        global_to_local[local_to_global] = 0
+    return submeshes
+
+
+def exchange(submeshes, local_vectors):
+    """
+    Sum the contributions of every partition to the interface nodes, as
+    each worker would by exchanging its shared entries with its neighbors.
+
+    Required Arguments
+    ------------------
+    * submeshes     : the output of partition.
+    * local_vectors : list of locally assembled vectors, one per submesh
+                      (indexed by local node number - 1).
+
+    Output
+    ------
+    A list of vectors holding the fully assembled value of every local node.
+    """
+    assembled = [np.array(vector, dtype=np.float64)
+                 for vector in local_vectors]
+    for submesh, vector in zip(submeshes, assembled):
+        for neighbor, shared_nodes in submesh.neighbors.items():
+            vector[shared_nodes - 1] += local_vectors[neighbor][
+                submeshes[neighbor].neighbors[submesh.partition] - 1]
+    return assembled
+
+
+class Submesh(object):
+    """
+    The part of a mesh belonging to one partition, renumbered locally.
+
+    Required Arguments
+    ------------------
+    * partition       : the (zero-based) partition number.
+    * elements        : element connectivity matrix in local node numbers.
+    * nodes           : coordinates of the local nodes.
+    * element_numbers : global numbers of the local elements.
+    * local_to_global : global number of each local node.
+    * owners          : owning partition of each local node.
+    * neighbors       : dictionary relating each neighboring partition to
+                        the local numbers of the nodes shared with it, in
+                        increasing order of global number (so the lists of
+                        two neighbors match entry by entry).
+
+    Properties
+    ----------
+    * num_owned      : the number of owned nodes. The owned nodes are
+                       numbered 1 through num_owned; the ghosts follow.
+    * ghost_nodes    : local numbers of the nodes owned by other partitions.
+    * interface_nodes: sorted local numbers of the nodes shared with any
+                       other partition.
+    * sends          : dictionary relating each neighbor to the local ghost
+                       nodes it owns; their contributions are sent to it.
+    * receives       : dictionary relating each neighbor to the local owned
+                       nodes it has as ghosts; their contributions are
+                       received from it.
+    """
+    def __init__(self, partition, elements, nodes, element_numbers,
+                 local_to_global, owners, neighbors):
+        self.partition = partition
+        self.elements = elements
+        self.nodes = nodes
+        self.element_numbers = element_numbers
+        self.local_to_global = local_to_global
+        self.owners = owners
+        self.neighbors = neighbors
+
+        self.num_owned = np.count_nonzero(owners == partition)
+        self.ghost_nodes = np.arange(self.num_owned + 1, len(owners) + 1)
+        self.interface_nodes = np.unique(np.hstack(
+            [np.zeros(0, dtype=int)] + list(neighbors.values())))
+        self.sends = {
+            neighbor: shared[owners[shared - 1] == neighbor]
+            for neighbor, shared in neighbors.items()}
+        self.receives = {
+            neighbor: shared[owners[shared - 1] == partition]
+            for neighbor, shared in neighbors.items()}
@@ -1,9 +1,25 @@
 #! /usr/bin/env python
-"""Map projections for use with geophysical data."""
+"""
+Map projections for use with geophysical data. The projections are
+vectorized: they map an (N, 3) array of coordinates to an (N, 2) array (or a
+single point to a pair) in one call.
+"""
 import numpy as np
 from numpy import pi
 
 
+def vectorized(projection):
+    """
+    Mark a projection as vectorized, that is, as mapping an (N, 3) array of
+    coordinates to an (N, 2) array of projected coordinates in one call, so
+    that ap.mesh.meshtools.project_nodes applies it to every node at once
+    instead of one node at a time. Usable as a decorator.
+    """
+    projection.vectorized = True
+    return projection
+
+
+@vectorized
 def lambert_azimuthal(coordinate_triples, longitude_offset=pi/8,
                       latitude_offset=pi/8):
     """
@@ -25,7 +41,8 @@ def lambert_azimuthal(coordinate_triples, longitude_offset=pi/8,
 
     Output
     ------
-    * Lambert Azimuthal projection (not scaled) of coordinate_triples.
+    * Lambert Azimuthal projection (not scaled) of coordinate_triples as a
+      2-column, N row array.
 
     References
     ----------
@@ -41,9 +58,10 @@ def lambert_azimuthal(coordinate_triples, longitude_offset=pi/8,
     x_projected = (k*np.cos(latitudes - latitude_offset)
                    *np.sin(longitudes - longitude_offset))
     y_projected = k*np.sin(latitudes - latitude_offset)
-    return np.array([x_projected, y_projected])
+    return np.stack([x_projected, y_projected], axis=-1)
 
 
+@vectorized
 def miller_cylindrical(coordinate_triples, longitude_offset=0,
                        latitude_offset=0):
     """
@@ -65,12 +83,13 @@ def miller_cylindrical(coordinate_triples, longitude_offset=0,
 
     Output
     ------
-    * Miller cylindrical projection (not scaled) of coordinate_triples.
+    * Miller cylindrical projection (not scaled) of coordinate_triples as a
+      2-column, N row array.
     """
     latitudes, longitudes = cartesian_to_geographical(coordinate_triples)
     x_projected = longitudes - longitude_offset
     y_projected = 1.25*np.log(np.tan(pi/4 + 0.4*(latitudes - latitude_offset)))
-    return np.array([x_projected, y_projected])
+    return np.stack([x_projected, y_projected], axis=-1)
 
 
 def cartesian_to_geographical(coordinate_triples):
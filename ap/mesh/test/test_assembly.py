@@ -0,0 +1,463 @@
+#! /usr/bin/env python
+import os
+import shutil
+import tempfile
+import numpy as np
+import numpy.testing as npt
+import scipy.sparse as sparse
+import scipy.sparse.linalg as linalg
+import ap.assembly as assembly
+import ap.mesh.binary as binary
+import ap.mesh.meshes as meshes
+import ap.mesh.meshtools as meshtools
+import ap.numeric as nm
+import ap.preconditioners as preconditioners
+import ap.verify as verify
+
+class TestOperatorCache(object):
+    """
+    Test case for assembling, factoring, and caching an operator: a cold
+    start stores the matrix and its factors, a warm start maps them, corrupt
+    entries are rebuilt, and the least recently used entries are evicted.
+    """
+    def __init__(self, mesh_file, form, conditions):
+        mesh = meshes.mesh_factory(*mesh_file, argyris=True)
+        rhs = np.random.RandomState(0).standard_normal(mesh.num_nodes)
+        directory = tempfile.mkdtemp()
+        try:
+            cache = assembly.OperatorCache(directory)
+            matrix = cache.operator(mesh, form, conditions=conditions)
+            factors = cache.factorization(mesh, form, conditions=conditions)
+            solution = factors.solve(rhs)
+            npt.assert_allclose(solution,
+                                linalg.spsolve(matrix.tocsc(), rhs),
+                                rtol=1e-8, atol=1e-12)
+            npt.assert_allclose(factors.solve(np.column_stack((rhs, 2*rhs))),
+                                np.column_stack((solution, 2*solution)))
+            key = cache.key(mesh, form, conditions=conditions)
+            assert key != cache.key(mesh, form)
+            assert sorted(os.listdir(directory)) == [key + '.apf',
+                                                     key + '.apo']
+
+            # a warm start maps the stored arrays instead of rebuilding them.
+            warm_cache = assembly.OperatorCache(directory)
+            warm_matrix = warm_cache.operator(mesh, form,
+                                              conditions=conditions)
+            assert not warm_matrix.data.flags.writeable
+            assert (warm_matrix != matrix).nnz == 0
+            warm_factors = warm_cache.factorization(mesh, form,
+                                                    conditions=conditions)
+            assert not warm_factors.perm_r.flags.writeable
+            npt.assert_equal(warm_factors.solve(rhs), solution)
+            (indptr, indices, data) = warm_factors.lower
+            for bad_indices in [indices - 1, indices + len(rhs)]:
+                _assert_raises(ValueError, lambda: nm.sparse_triangular_solve(
+                    indptr, bad_indices, data, rhs))
+            # a missing or zero diagonal entry is an error, not inf or nan.
+            _assert_raises(ValueError, lambda: nm.sparse_triangular_solve(
+                [0, 1, 2], [0, 0], [2.0, 1.0], [1.0, 1.0]))
+            rows = np.repeat(np.arange(len(rhs)), np.diff(indptr))
+            bad_data = np.array(data)
+            bad_data[(indices == rows) & (rows == len(rhs)//2)] = 0.0
+            _assert_raises(ValueError, lambda: nm.sparse_triangular_solve(
+                indptr, indices, bad_data, rhs))
+            _assert_raises(ValueError, lambda: nm.sparse_triangular_solve(
+                [0, 1, 2], [1, 1], [1.0, 2.0], [1.0, 1.0], lower=False))
+
+            # corrupt or incomplete entries are rebuilt.
+            operator_file = os.path.join(directory, key + '.apo')
+            factors_file = os.path.join(directory, key + '.apf')
+            with open(operator_file, 'rb') as in_file:
+                contents = in_file.read()
+            for corrupt in [b"", b"APMESH01", b"not a cache file",
+                            contents[0:len(contents)//2], None]:
+                for file_name in [operator_file, factors_file]:
+                    if corrupt is None:
+                        binary.save_arrays(file_name,
+                                           {'indptr': matrix.indptr})
+                    else:
+                        with open(file_name, 'wb') as out_file:
+                            out_file.write(corrupt)
+                rebuilt_matrix = warm_cache.operator(mesh, form,
+                                                     conditions=conditions)
+                assert (rebuilt_matrix != matrix).nnz == 0
+                npt.assert_allclose(
+                    warm_cache.factorization(
+                        mesh, form, conditions=conditions).solve(rhs),
+                    solution, rtol=1e-8, atol=1e-12)
+                for file_name in [operator_file, factors_file]:
+                    binary.load_arrays(file_name)
+
+            # loading an entry marks it as recently used, so eviction
+            # deletes the other one first.
+            os.utime(operator_file, (1, 1))
+            os.utime(factors_file, (2, 2))
+            warm_cache.operator(mesh, form, conditions=conditions)
+            warm_cache.max_bytes = os.path.getsize(operator_file)
+            warm_cache.evict()
+            assert os.listdir(directory) == [key + '.apo']
+            assembly.OperatorCache(directory, max_bytes=0)
+            assert os.listdir(directory) == []
+
+            # other processes sharing the cache may delete entries between
+            # listing them and reading their sizes or deleting them.
+            cache.operator(mesh, form, conditions=conditions)
+            cache.factorization(mesh, form, conditions=conditions)
+            listdir = os.listdir
+            os.listdir = lambda path: listdir(path) + [key + '0.apo']
+            try:
+                assert len(cache._entries()) == 2
+                RacingCache(directory).clear()
+                assert listdir(directory) == []
+                cache.operator(mesh, form, conditions=conditions)
+                RacingCache(directory, max_bytes=0)
+                assert listdir(directory) == []
+            finally:
+                os.listdir = listdir
+        finally:
+            shutil.rmtree(directory)
+
+class RacingCache(assembly.OperatorCache):
+    """
+    An OperatorCache whose entries are all deleted, as if by another
+    process, right after they are listed.
+    """
+    def _entries(self):
+        entries = super(RacingCache, self)._entries()
+        for (_, _, path) in entries:
+            os.remove(path)
+        return entries
+
+class TestBlockedAssembly(object):
+    """
+    Test case for assembling in to vertex blocks and for the block
+    preconditioners built from them: the blocked matrix equals the
+    assembled one, and preconditioned conjugate gradients converges in
+    fewer iterations than with point Jacobi.
+    """
+    def __init__(self, mesh_file, num_refinements):
+        mesh = meshes.refine(meshes.mesh_factory(*mesh_file, argyris=True),
+                             num_refinements)
+        try:
+            assembly.assemble_blocked(mesh, 'biharmonic')
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("assembled blocks of an unblocked mesh")
+        mesh.renumber(blocked=True)
+
+        matrix = assembly.assemble(mesh, 'biharmonic')
+        blocked = assembly.assemble_blocked(mesh, 'biharmonic')
+        scale = np.abs(matrix).max()
+        assert np.abs(blocked.tocsr() - matrix).max() <= 1e-14*scale
+        vectors = np.random.RandomState(0).standard_normal(
+            (matrix.shape[0], 2))
+        npt.assert_allclose(blocked.dot(vectors), matrix.dot(vectors),
+                            atol=1e-12*scale*np.abs(vectors).max())
+        npt.assert_allclose(blocked.aslinearoperator().matvec(vectors[:, 0]),
+                            matrix.dot(vectors[:, 0]),
+                            atol=1e-12*scale*np.abs(vectors).max())
+        vertex_dofs = preconditioners.vertex_blocks(mesh)
+        npt.assert_equal(vertex_dofs,
+                         np.arange(6*len(vertex_dofs)).reshape((-1, 6)))
+        for index in [0, len(vertex_dofs) - 1]:
+            dofs = vertex_dofs[index]
+            npt.assert_allclose(blocked.vertex_diagonal()[index],
+                                matrix[dofs][:, dofs].toarray(),
+                                atol=1e-14*scale)
+        npt.assert_allclose(
+            preconditioners.block_jacobi(blocked, mesh).solve(vectors[:, 0]),
+            preconditioners.block_jacobi(matrix, mesh).solve(vectors[:, 0]))
+
+        # clamped plate problem.
+        rhs = assembly.assemble(mesh, 'mass').dot(np.ones(mesh.num_nodes))
+        meshtools.apply_dirichlet(matrix, rhs,
+                                  mesh.get_dirichlet_dofs({'land': 'clamped'}))
+        diagonal = matrix.diagonal()
+        point_jacobi = linalg.LinearOperator(
+            matrix.shape, matvec=lambda residual: residual/diagonal,
+            dtype=np.float64)
+        iterations = []
+        for preconditioner in [
+                point_jacobi,
+                preconditioners.block_jacobi(matrix,
+                                             mesh).aslinearoperator(),
+                preconditioners.additive_schwarz(matrix,
+                                                 mesh).aslinearoperator()]:
+            count = [0]
+
+            def callback(iterate):
+                count[0] += 1
+            (solution, info) = linalg.cg(matrix, rhs, M=preconditioner,
+                                         maxiter=10*matrix.shape[0],
+                                         callback=callback)
+            assert info == 0
+            assert np.linalg.norm(matrix.dot(solution) - rhs) <= \
+                1e-5*np.linalg.norm(rhs)
+            iterations.append(count[0])
+        # point Jacobi > block Jacobi > additive Schwarz.
+        assert iterations[0] > iterations[1] > iterations[2], iterations
+
+class TestStreamingAssembly(object):
+    """
+    Test case for assembling in chunks: for every chunk size the CSRSink
+    result has the pattern of one-shot COO assembly (explicit zeros
+    included) and equal values, and triplets written by a DiskSink load
+    back unchanged.
+    """
+    def __init__(self, mesh_file, form, num_refinements):
+        mesh = meshes.refine(meshes.mesh_factory(*mesh_file, argyris=True),
+                             num_refinements)
+        num_elements = len(mesh.elements)
+        shape = (mesh.num_nodes, mesh.num_nodes)
+        matrices = assembly.element_matrices(mesh, form)
+        elements = mesh.elements.astype(np.int64) - 1
+        reference = sparse.coo_matrix(
+            (matrices.ravel(), (np.repeat(elements, 21, axis=1).ravel(),
+                                np.tile(elements, (1, 21)).ravel())),
+            shape=shape).tocsr()
+        reference.sum_duplicates()
+        scale = np.abs(reference.data).max()
+
+        for chunk_size in [1, 7, 64, num_elements, 2*num_elements]:
+            matrix = assembly.assemble(mesh, form, chunk_size=chunk_size)
+            assert matrix.shape == shape
+            assert matrix.has_sorted_indices
+            npt.assert_equal(matrix.indptr, reference.indptr)
+            npt.assert_equal(matrix.indices, reference.indices)
+            npt.assert_allclose(matrix.data, reference.data, rtol=0,
+                                atol=1e-14*scale)
+
+        # an empty sink gives an empty matrix.
+        empty = assembly.CSRSink(shape).finish()
+        assert empty.shape == shape and empty.nnz == 0
+
+        chunk_size = 10
+        directory = tempfile.mkdtemp()
+        try:
+            file_names = assembly.assemble(
+                mesh, form, chunk_size=chunk_size,
+                sink=assembly.DiskSink(os.path.join(directory, "triplets"),
+                                       shape))
+            assert len(file_names) == -(-num_elements//chunk_size)
+            assert sorted(os.listdir(directory)) == \
+                sorted(os.path.basename(name) for name in file_names)
+            for (loaded, expected) in zip(
+                    assembly.load_triplets(file_names),
+                    assembly.triplet_chunks(mesh, form,
+                                            chunk_size=chunk_size)):
+                for (loaded_array, expected_array) in zip(loaded, expected):
+                    assert not loaded_array.flags.writeable
+                    npt.assert_equal(loaded_array, expected_array)
+
+            sink = assembly.CSRSink(shape)
+            for triplets in assembly.load_triplets(file_names, mmap_mode=None):
+                sink.add(*triplets)
+            matrix = sink.finish()
+            direct = assembly.assemble(mesh, form, chunk_size=chunk_size)
+            npt.assert_equal(matrix.indptr, direct.indptr)
+            npt.assert_equal(matrix.indices, direct.indices)
+            npt.assert_equal(matrix.data, direct.data)
+        finally:
+            shutil.rmtree(directory)
+
+class TestIndexChecks(object):
+    """
+    Test case for the checks that guard the gather, scatter, and
+    quasi-geostrophic kernels: out of range or misshapen degrees of freedom
+    raise ValueError (also under python -O) before any native indexing.
+    """
+    def __init__(self, mesh_file):
+        mesh = meshes.mesh_factory(*mesh_file, argyris=True)
+        dof_map = assembly.DofMap(mesh)
+        element_dofs = dof_map.element_dofs
+        num_dofs = dof_map.num_dofs
+        psi = np.ones(num_dofs)
+        local = np.ones((len(element_dofs), 21))
+        (x, y, weights) = nm.get_quad_points()
+        ref_tables = nm.ref_all(x, y)
+        qg_tables = list(ref_tables[0:3]) \
+            + list(nm.ref_third_derivatives(x, y)) + [weights]
+
+        def kernel_calls(dofs):
+            return [
+                lambda: nm.gather(dofs, psi),
+                lambda: nm.scatter_add(dofs, local, num_dofs),
+                lambda: nm.gather_evaluate(dof_map.x, dof_map.y, dofs, psi,
+                                           ref_tables),
+                lambda: nm.qg_jacobian(dof_map.x, dof_map.y, dofs, psi,
+                                       *qg_tables)]
+        for call in kernel_calls(element_dofs):
+            call()
+        for bad_value in [-1, num_dofs, 2**32]:
+            bad_dofs = element_dofs.astype(np.int64)
+            bad_dofs[-1, -1] = bad_value
+            for call in kernel_calls(bad_dofs):
+                _assert_raises(ValueError, call)
+        for call in kernel_calls(element_dofs[:, 0:20]):
+            _assert_raises(ValueError, call)
+        _assert_raises(ValueError, lambda: nm.scatter_add(
+            element_dofs, local, num_dofs, out=np.zeros(num_dofs - 1)))
+        _assert_raises(ValueError, lambda: nm.gather_evaluate(
+            dof_map.x[1:], dof_map.y[1:], element_dofs, psi, ref_tables))
+        _assert_raises(ValueError, lambda: nm.gather_evaluate(
+            dof_map.x, dof_map.y, element_dofs, psi,
+            np.ascontiguousarray(ref_tables[:, 1:])))
+
+class TestLargeEnsembles(object):
+    """
+    Test case for evaluating many fields, or one field at many points, on
+    one element: the work arrays of gather_evaluate grow with both, and the
+    results agree with evaluating a few fields at a time.
+    """
+    def __init__(self, mesh_file, num_fields, num_points):
+        mesh = meshes.mesh_factory(*mesh_file, argyris=True)
+        dof_map = assembly.DofMap(mesh)
+        (x, y, element_dofs) = (dof_map.x[0:1], dof_map.y[0:1],
+                                dof_map.element_dofs[0:1])
+        random = np.random.RandomState(0)
+        fields = random.standard_normal((num_fields, dof_map.num_dofs))
+        (quad_x, quad_y, weights) = nm.get_quad_points()
+        ref_tables = nm.ref_all(quad_x, quad_y)
+        tables = nm.gather_evaluate(x, y, element_dofs, fields, ref_tables)
+        assert tables.shape == (6, num_fields, 1, len(weights))
+        some = [0, num_fields//2, num_fields - 1]
+        npt.assert_allclose(
+            tables[:, some],
+            nm.gather_evaluate(x, y, element_dofs, fields[some], ref_tables),
+            rtol=1e-14, atol=1e-14*np.abs(tables).max())
+
+        # one field at many points inside the reference triangle.
+        points = random.uniform(0.0, 0.5, (2, num_points))
+        ref_tables = nm.ref_all(points[0], points[1])
+        tables = nm.gather_evaluate(x, y, element_dofs, fields[0], ref_tables)
+        assert tables.shape == (6, 1, num_points)
+        npt.assert_allclose(
+            tables[:, :, 0:10],
+            nm.gather_evaluate(x, y, element_dofs, fields[0],
+                               np.ascontiguousarray(ref_tables[:, :, 0:10])),
+            rtol=1e-14, atol=1e-14*np.abs(tables).max())
+
+class TestQGJacobian(object):
+    """
+    Test case for assembling the quasi-geostrophic advection term on a
+    mesh: the residual does not depend on the chunk size, and, since the
+    term is quadratic in psi, the assembled Jacobian times a direction
+    equals the central difference of the residual exactly.
+    """
+    def __init__(self, mesh_file, chunk_sizes):
+        mesh = meshes.mesh_factory(*mesh_file, argyris=True)
+        random = np.random.RandomState(0)
+        (psi, direction) = random.standard_normal((2, mesh.num_nodes))
+        residual = assembly.qg_jacobian(mesh, psi)
+        scale = np.abs(residual).max()
+        assert scale > 0.0
+        difference = (assembly.qg_jacobian(mesh, psi + direction)
+                      - assembly.qg_jacobian(mesh, psi - direction))/2
+        (_, whole_jacobian) = assembly.qg_jacobian(
+            mesh, psi, jacobian=True, chunk_size=len(mesh.elements))
+
+        for chunk_size in chunk_sizes:
+            (chunked_residual, jacobian) = assembly.qg_jacobian(
+                mesh, psi, jacobian=True, chunk_size=chunk_size)
+            npt.assert_allclose(chunked_residual, residual, rtol=0,
+                                atol=1e-12*scale)
+            assert sparse.isspmatrix_csr(jacobian)
+            assert jacobian.shape == (mesh.num_nodes, mesh.num_nodes)
+            npt.assert_equal(jacobian.indptr, whole_jacobian.indptr)
+            npt.assert_equal(jacobian.indices, whole_jacobian.indices)
+            npt.assert_allclose(jacobian.data, whole_jacobian.data, rtol=0,
+                                atol=1e-12*np.abs(whole_jacobian.data).max())
+            npt.assert_allclose(jacobian.dot(direction), difference, rtol=0,
+                                atol=1e-10*np.abs(difference).max())
+
+        for bad_psi in [psi[1:], np.column_stack((psi, psi))]:
+            _assert_raises(ValueError,
+                           lambda: assembly.qg_jacobian(mesh, bad_psi))
+
+class TestDofMap(object):
+    """
+    Test case for the DofMap methods against NumPy indexing of
+    mesh.elements: gathering and scatter-adding one or several fields
+    (also in to a given output array) and evaluating them at quadrature
+    points.
+    """
+    def __init__(self, mesh_file, num_fields):
+        mesh = meshes.mesh_factory(*mesh_file, argyris=True)
+        dof_map = assembly.DofMap(mesh)
+        element_dofs = mesh.elements - 1
+        npt.assert_equal(dof_map.element_dofs, element_dofs)
+        assert dof_map.num_dofs == mesh.num_nodes
+        corners = mesh.nodes[element_dofs[:, 0:3]]
+        npt.assert_equal(dof_map.x, corners[:, :, 0])
+        npt.assert_equal(dof_map.y, corners[:, :, 1])
+
+        random = np.random.RandomState(0)
+        fields = random.standard_normal((num_fields, mesh.num_nodes))
+        local = random.standard_normal((num_fields,) + element_dofs.shape)
+        npt.assert_equal(dof_map.gather(fields[0]),
+                         fields[0][element_dofs])
+        npt.assert_equal(dof_map.gather(fields), fields[:, element_dofs])
+
+        sums = np.zeros((num_fields, mesh.num_nodes))
+        for index in range(num_fields):
+            np.add.at(sums[index], element_dofs, local[index])
+        tolerance = dict(rtol=0, atol=1e-14*np.abs(sums).max())
+        npt.assert_allclose(dof_map.scatter_add(local[0]), sums[0],
+                            **tolerance)
+        npt.assert_allclose(dof_map.scatter_add(local), sums, **tolerance)
+        out = np.ones(mesh.num_nodes)
+        result = dof_map.scatter_add(local[0], out=out)
+        assert result is out
+        npt.assert_allclose(out, 1.0 + sums[0], **tolerance)
+        out = np.ones((num_fields, mesh.num_nodes))
+        result = dof_map.scatter_add(local, out=out)
+        assert result is out
+        npt.assert_allclose(out, 1.0 + sums, **tolerance)
+        _assert_raises(ValueError, lambda: dof_map.scatter_add(
+            local, out=np.ones(mesh.num_nodes)))
+
+        quadrature = nm.get_quad_points()
+        tables = verify.physical_tables(nm, dof_map.x, dof_map.y,
+                                        *quadrature[0:2])
+        expected = np.einsum('fei,keiq->kfeq', fields[:, element_dofs],
+                             tables)
+        atol = 1e-13*np.abs(expected).max()
+        npt.assert_allclose(dof_map.evaluate(fields), expected, rtol=0,
+                            atol=atol)
+        npt.assert_allclose(dof_map.evaluate(fields[0], quadrature),
+                            expected[:, 0], rtol=0, atol=atol)
+
+def _assert_raises(exception, call):
+    """
+    Raise AssertionError unless call() raises the given exception.
+    """
+    try:
+        call()
+    except exception:
+        pass
+    else:
+        raise AssertionError("expected {0}".format(exception.__name__))
+
+def main():
+    """
+    Run every test case. Each class runs its checks when instantiated.
+    """
+    original_directory = os.getcwd()
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        TestOperatorCache(["unitsquare.msh"], 'biharmonic',
+                          {'land': 'clamped'})
+        TestBlockedAssembly(["unitsquare.msh"], 2)
+        TestStreamingAssembly(["unitsquare.msh"], 'biharmonic', 1)
+        TestQGJacobian(["unitsquare.msh"], [5, 7])
+        TestDofMap(["unitsquare.msh"], 3)
+        TestIndexChecks(["unitsquare.msh"])
+        TestLargeEnsembles(["unitsquare.msh"], 5000, 300000)
+    finally:
+        os.chdir(original_directory)
+    print("all assembly tests passed")
+
+
+if __name__ == '__main__':
+    main()
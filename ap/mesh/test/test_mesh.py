@@ -1,12 +1,19 @@
 #! /usr/bin/env python
+import contextlib
+import io
+import multiprocessing
 import os
-import sys
+import shutil
+import tempfile
 from functools import reduce
 import numpy as np
 import numpy.testing as npt
 import ap.mesh.parsers as parsers
 import ap.mesh.meshtools as meshtools
 import ap.mesh.meshes as meshes
+import ap.mesh.partitions as partitions
+import ap.mesh.projections as projections
+import ap.runMESH as runMESH
 
 class TestMeshParser(object):
     def __init__(self, nodes, elements, edges, mesh_files):
@@ -18,6 +25,8 @@ class TestMeshParser(object):
             self.elements = elements
             self.edges = edges
             parsed_mesh = parsers.parser_factory(*mesh_file)
+            # the parsers do not keep the file (or a map of it) open.
+            assert not hasattr(parsed_mesh, '_contents')
 
             npt.assert_almost_equal(self.nodes, parsed_mesh.nodes)
             npt.assert_equal(self.elements, parsed_mesh.elements)
@@ -27,12 +36,21 @@ class TestMeshParser(object):
             npt.assert_almost_equal(meshtools.project_nodes(lambda x : x[0:2],
                                                      self.elements, self.nodes),
                              self.nodes[:, 0:2], decimal=10)
+            npt.assert_almost_equal(meshtools.project_nodes(
+                projections.vectorized(lambda x : x[:, 0:2]), self.elements,
+                self.nodes), self.nodes[:, 0:2], decimal=10)
 
             if parsed_mesh.edges:
                 assert set(map(lambda x : x[0:-1], self.edges)) == \
                        set(map(lambda x : x[0:-1],
                            meshtools.extract_boundary_edges(self.elements)))
 
+            # every interior edge is shared by exactly two elements.
+            boundary_edges, adjacency = meshtools.extract_boundary_edges(
+                self.elements, return_adjacency=True)
+            assert 2*len(adjacency) + len(boundary_edges) == \
+                   3*self.elements.shape[0]
+
             # Test Argyris stuff.
             if self.elements.shape[1] == 6:
                 TestArgyrisCase(mesh_file, parsed_mesh)
@@ -55,7 +73,7 @@ class TestLagrangeMesh(object):
             npt.assert_equal(self.nodes, mesh.nodes)
             npt.assert_equal(self.elements, mesh.elements)
             if parsed_mesh.edges:
-                assert set(self.edges) == reduce(lambda a, b : a + b,
+                assert set(self.edges) == reduce(lambda a, b : a | b,
                                                  mesh.edge_collections.values())
 
             npt.assert_almost_equal(meshtools.project_nodes(lambda x : x[0:2],
@@ -71,6 +89,225 @@ class TestLagrangeMesh(object):
             if self.elements.shape[1] == 6:
                 TestArgyrisCase(mesh_file, parsed_mesh)
 
+class TestChangeOrder(object):
+    """
+    Test case for converting a linear mesh to a quadratic mesh (and then to
+    an Argyris mesh).
+    """
+    def __init__(self, mesh_file):
+        parsed_mesh = parsers.parser_factory(*mesh_file)
+        quadratic_mesh = meshtools.change_order(parsed_mesh, 2)
+        elements = quadratic_mesh.elements
+        npt.assert_equal(elements[:, 0:3], parsed_mesh.elements)
+
+        midpoints = dict()
+        for local_edge, (i, j) in enumerate([(0, 1), (1, 2), (2, 0)]):
+            npt.assert_almost_equal(
+                quadratic_mesh.nodes[elements[:, 3 + local_edge] - 1],
+                0.5*(quadratic_mesh.nodes[elements[:, i] - 1] +
+                     quadratic_mesh.nodes[elements[:, j] - 1]))
+            for element in elements:
+                corners = tuple(sorted((element[i], element[j])))
+                midpoint = midpoints.setdefault(corners,
+                                                element[3 + local_edge])
+                assert midpoint == element[3 + local_edge]
+
+        # the edges keep their labels and gain midpoints.
+        for edge, quadratic_edge in zip(parsed_mesh.edges,
+                                        quadratic_mesh.edges):
+            assert edge[0:2] == quadratic_edge[0:2]
+            assert edge[-1] == quadratic_edge[-1]
+            assert midpoints[tuple(sorted(edge[0:2]))] == quadratic_edge[2]
+
+        argyris_mesh = meshes.mesh_factory(*mesh_file, argyris=True)
+        assert argyris_mesh.elements.shape == (elements.shape[0], 21)
+
+class TestRefine(object):
+    """
+    Test case for uniformly refining Lagrange and Argyris meshes.
+    """
+    def __init__(self, mesh_file, borders):
+        lagrange_mesh = meshes.mesh_factory(*mesh_file, borders=borders)
+        refined_mesh = meshes.refine(lagrange_mesh, 2)
+        assert refined_mesh.elements.shape == \
+            (16*lagrange_mesh.elements.shape[0],
+             lagrange_mesh.elements.shape[1])
+        # the meshes are nested and the edges keep their labels.
+        npt.assert_almost_equal(refined_mesh.areas.reshape((-1, 16)).sum(1),
+                                lagrange_mesh.areas)
+        npt.assert_almost_equal(refined_mesh.max_stepsize,
+                                lagrange_mesh.max_stepsize/4)
+        for name, collection in lagrange_mesh.edge_collections.items():
+            refined_collection = refined_mesh.edge_collections[name]
+            assert len(refined_collection) == 4*len(collection)
+            assert ({edge[-1] for edge in refined_collection} ==
+                    {edge[-1] for edge in collection})
+
+        argyris_mesh = meshes.mesh_factory(*mesh_file, argyris=True,
+                                           borders=borders)
+        refined_mesh = meshes.refine(argyris_mesh)
+        assert isinstance(refined_mesh, meshes.ArgyrisMesh)
+        assert refined_mesh.elements.shape[0] == \
+            4*argyris_mesh.elements.shape[0]
+        npt.assert_almost_equal(refined_mesh.areas.sum(),
+                                argyris_mesh.areas.sum())
+
+        # the cached geometry is recomputed when the nodes change, and
+        # moving the nodes keeps the numbering of the points.
+        points = refined_mesh.points
+        assert refined_mesh.nodes is refined_mesh.nodes
+        refined_mesh.nodes = 2*refined_mesh.nodes
+        npt.assert_equal(refined_mesh.points, 2*points)
+        npt.assert_equal(refined_mesh.nodes,
+                         2*points[refined_mesh.node_points])
+        npt.assert_almost_equal(refined_mesh.areas.sum(),
+                                4*argyris_mesh.areas.sum())
+        assert np.all(refined_mesh.qualities <= 1 + 1e-12)
+        for collection in argyris_mesh.node_collections:
+            refined_collection = [
+                refined for refined in refined_mesh.node_collections
+                if refined.name == collection.name][0]
+            assert len(refined_collection.edges) == 2*len(collection.edges)
+
+        # relabeling the borders in place matches building the mesh with them.
+        relabeled_mesh = meshes.mesh_factory(*mesh_file)
+        relabeled_mesh.relabel_borders(borders)
+        assert relabeled_mesh.edge_collections == \
+            lagrange_mesh.edge_collections
+        for name, nodes in lagrange_mesh.boundary_nodes.items():
+            npt.assert_equal(relabeled_mesh.boundary_nodes[name], nodes)
+        npt.assert_equal(relabeled_mesh.interior_nodes,
+                         lagrange_mesh.interior_nodes)
+        border_edges = relabeled_mesh.border_edges
+        for name in border_edges.names:
+            assert np.all(border_edges.border_ids[border_edges.slice(name)]
+                          == border_edges.names.index(name))
+
+        relabeled_mesh = meshes.mesh_factory(*mesh_file, argyris=True)
+        relabeled_mesh.relabel_borders(borders)
+        for collection in argyris_mesh.node_collections:
+            relabeled_collection = [
+                relabeled for relabeled in relabeled_mesh.node_collections
+                if relabeled.name == collection.name][0]
+            npt.assert_equal(relabeled_collection.function_values,
+                             collection.function_values)
+            npt.assert_equal(relabeled_collection.normal_derivatives,
+                             collection.normal_derivatives)
+
+class TestApplyDirichlet(object):
+    """
+    Test case for applying Dirichlet boundary conditions to a CSR matrix.
+    """
+    def __init__(self):
+        class CSRMatrix(object):
+            def __init__(self, dense):
+                self.indptr = np.hstack([[0], np.cumsum((dense != 0).sum(1))])
+                self.indices = np.nonzero(dense)[1]
+                self.data = dense[np.nonzero(dense)]
+
+            def todense(self):
+                dense = np.zeros((len(self.indptr) - 1,)*2)
+                for row in range(len(self.indptr) - 1):
+                    columns = slice(self.indptr[row], self.indptr[row + 1])
+                    dense[row, self.indices[columns]] = self.data[columns]
+                return dense
+
+        dense = np.array([[4.0, -1.0, 0.0, -1.0], [-1.0, 4.0, -1.0, 0.0],
+                          [0.0, -1.0, 4.0, -1.0], [-1.0, 0.0, -1.0, 4.0]])
+        rhs = np.ones(4)
+        matrix, rhs = meshtools.apply_dirichlet(CSRMatrix(dense), rhs,
+                                                [1, 3], [2.0, 3.0])
+        solution = np.linalg.solve(matrix.todense(), rhs)
+        npt.assert_almost_equal(solution, [2.0, 1.5, 3.0, 1.5])
+        npt.assert_equal(matrix.todense(), matrix.todense().T)
+
+class TestPartition(object):
+    """
+    Test case for partitioning a mesh and assembling on each partition in a
+    separate process.
+    """
+    def __init__(self, mesh_file, num_parts):
+        mesh = meshes.refine(meshes.mesh_factory(*mesh_file, argyris=True))
+        num_nodes = mesh.nodes.shape[0]
+
+        def lumped_areas(elements, areas, size):
+            return np.bincount(elements.ravel() - 1, minlength=size,
+                               weights=np.repeat(areas, elements.shape[1]))
+
+        expected = lumped_areas(mesh.elements, mesh.areas, num_nodes)
+        for method in ["rcb", "graph"]:
+            submeshes = partitions.partition(mesh, num_parts, method=method)
+            owned = np.hstack([submesh.local_to_global[0:submesh.num_owned]
+                               for submesh in submeshes])
+            npt.assert_equal(np.sort(owned), np.arange(1, num_nodes + 1))
+
+            pool = multiprocessing.Pool(2)
+            try:
+                geometries = pool.starmap(
+                    meshtools.element_geometry,
+                    [(submesh.elements, submesh.nodes)
+                     for submesh in submeshes])
+            finally:
+                pool.close()
+                pool.join()
+            local_vectors = [
+                lumped_areas(submesh.elements, geometry['areas'],
+                             len(submesh.local_to_global))
+                for submesh, geometry in zip(submeshes, geometries)]
+            for submesh, vector in zip(
+                    submeshes, partitions.exchange(submeshes, local_vectors)):
+                npt.assert_almost_equal(
+                    vector, expected[submesh.local_to_global - 1])
+                assert np.all(submesh.owners[submesh.ghost_nodes - 1]
+                              != submesh.partition)
+
+class TestRunMESH(object):
+    """
+    Test case for converting a batch of meshes (including a pair of text
+    files) with the runMESH command line tool.
+    """
+    def __init__(self, mesh_files):
+        directory = tempfile.mkdtemp()
+        try:
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                status = runMESH.main(
+                    ["--format", "binary", "--processes", "2",
+                     "--output-directory", directory,
+                     "--border", "west=4"] +
+                    [",".join(mesh_file) for mesh_file in mesh_files])
+            assert status == 0
+            assert "converted {0} of {0} meshes".format(len(mesh_files)) \
+                in output.getvalue()
+            # only a trailing "_elements" is dropped from a text file name.
+            for mesh_file, name in zip(mesh_files,
+                                       ["linears1", "unitsquare",
+                                        "linears1_elements_shifted"]):
+                loaded_mesh = meshes.load(os.path.join(directory,
+                                                       name + ".apm"))
+                mesh = meshes.mesh_factory(*mesh_file, argyris=True,
+                                           borders={'west': (4,)})
+                npt.assert_equal(loaded_mesh.elements, mesh.elements)
+                assert loaded_mesh.fingerprint() == mesh.fingerprint()
+
+            # two inputs that would be saved to the same files are refused
+            # before anything is written.
+            for duplicates in [["linears1.mesh", "linears1_elements.txt,"
+                                "linears1_nodes.txt"],
+                               ["linears1.mesh", "./linears1.mesh"]]:
+                clash_directory = os.path.join(directory, "clash")
+                try:
+                    with contextlib.redirect_stderr(io.StringIO()):
+                        runMESH.main(["--output-directory", clash_directory]
+                                     + duplicates)
+                except SystemExit as exit_status:
+                    assert exit_status.code == 2
+                else:
+                    raise AssertionError("duplicate outputs were accepted")
+                assert not os.path.exists(clash_directory)
+        finally:
+            shutil.rmtree(directory)
+
 class TestArgyrisCase(object):
     """
     Test case for an Argyris mesh.
@@ -89,7 +326,7 @@ class TestArgyrisCase(object):
                                 element[9 + 3*local_number],
                                 element[9 + 3*local_number + 1],
                                 element[9 + 3*local_number + 2])
-                if stacked_nodes.has_key(global_number):
+                if global_number in stacked_nodes:
                     assert corner_nodes == stacked_nodes[global_number]
                 else:
                     stacked_nodes[global_number] = corner_nodes
@@ -100,7 +337,7 @@ class TestArgyrisCase(object):
 
             for midpoint_number, local_edge in enumerate([[0,1], [0,2], [1,2]]):
                 midpoint = element[18 + midpoint_number]
-                if edges_by_midpoint.has_key(midpoint):
+                if midpoint in edges_by_midpoint:
                     npt.assert_equal(edges_by_midpoint[midpoint],
                                      element[local_edge])
                 else:
@@ -109,147 +346,260 @@ class TestArgyrisCase(object):
         # Ensure that the Argyris mesh and the Lagrange mesh come up with the
         # same edges.
         for name, collection in lagrange_mesh.edge_collections.items():
-            argyris_collection = \
-                map(lambda x : x.edge,
-                    filter(lambda x : x.name == name,
-                           argyris_mesh.node_collections)[0].edges)
+            argyris_collection = [
+                x.edge for x in next(x for x in argyris_mesh.node_collections
+                                     if x.name == name).edges]
             for edge in collection:
                 argyris_edge = (min(edge[0:2]), max(edge[0:2]), edge[2])
                 assert argyris_edge in argyris_collection
 
-# The tests rely on parsing several files. Change the directory and then change
-# back.
-original_directory = os.getcwd()
-os.chdir(os.path.dirname(os.path.abspath(sys.argv[0])))
-try:
-    TestMeshParser(np.array([[0,0,0],[1,0,0],[1,1,0],[0,1,0],[0.5,0.5,0]]),
-                   np.array([[1,2,5],[2,3,5],[3,4,5],[4,1,5]]),
-                   [(1,2,1),(2,3,2),(3,4,3),(4,1,4)],
-                   [["linears1.mesh"], ["linears1_nodes.txt",
-                                        "linears1_elements.txt"],
-                    ["linears1_elements.txt", "linears1_nodes.txt"]])
-
-    # case for extra nodes
-    TestLagrangeMesh(np.array([[0,0,0],[1,0,0],[1,1,0],[0,1,0],[0.5,0.5,0]]),
-                   np.array([[1,2,5],[2,3,5],[3,4,5],[4,1,5]]),
-                   [(1,2,1),(2,3,2),(3,4,3),(4,1,4)],
-                   [["linears1_shifted.mesh"], ["linears1_nodes_shifted.txt",
-                                        "linears1_elements_shifted.txt"],
-                    ["linears1_elements_shifted.txt", "linears1_nodes_shifted.txt"]])
-
-    TestMeshParser(np.array([[0.000000, 0.000000], [0.000000, 0.000000],
-     [0.500000, 0.000000], [0.500000, 0.000000], [0.000000, 0.000000],
-     [1.000000, 0.000000], [0.500000, 0.500000], [0.000000, 1.000000],
-     [0.000000, 0.000000], [0.000000, 1.500000], [0.000000, 0.500000],
-     [1.000000, 0.000000], [1.000000, 0.500000], [0.000000, 1.500000],
-     [0.000000, 0.000000], [0.000000, 4.000000], [0.000000, 2.000000],
-     [4.000000, 0.000000], [1.500000, 4.000000], [0.000000, 1.000000],
-     [4.000000, 0.000000], [0.500000, 4.000000], [0.000000, 0.000000],
-     [3.500000, 0.000000], [0.000000, 3.000000], [0.000000, 0.000000],
-     [2.500000, 0.000000], [0.000000, 2.000000], [0.000000, 0.500000],
-     [1.500000, 0.000000], [1.000000, 1.000000], [0.000000, 1.500000],
-     [0.500000, 0.000000], [2.000000, 0.000000], [0.000000, 0.500000],
-     [3.500000, 0.000000], [2.000000, 3.500000], [0.000000, 1.500000],
-     [3.500000, 0.000000], [1.000000, 3.500000], [0.000000, 0.500000],
-     [3.000000, 0.000000], [0.500000, 2.500000], [0.000000, 0.500000],
-     [2.000000, 0.000000], [1.000000, 1.500000], [0.000000, 1.500000],
-     [1.000000, 0.000000], [2.000000, 0.500000], [0.000000, 2.500000],
-     [0.000000, 0.000000], [1.000000, 3.000000], [0.000000, 2.000000],
-     [3.000000, 0.000000], [1.500000, 3.000000], [0.000000, 1.000000],
-     [2.500000, 0.000000], [1.000000, 2.000000], [0.000000, 1.500000],
-     [1.500000, 0.000000], [2.000000, 1.000000], [0.000000, 2.500000],
-     [0.500000, 0.000000], [3.000000, 0.000000], [0.000000, 1.500000]]),
-     np.array([[1, 3, 2], [6, 5, 3], [4, 2, 5], [3, 5, 2], [23, 22, 10], [21, 9, 22],
-     [6, 10, 9], [22, 9, 10], [19, 7, 20], [4, 8, 7], [21, 20, 8], [7, 8, 20],
-     [6, 9, 5], [21, 8, 9], [4, 5, 8], [9, 8, 5], [52, 46, 48], [39, 40, 46],
-     [41, 48, 40], [46, 40, 48], [19, 20, 30], [21, 31, 20], [39, 30, 31],
-     [20, 31, 30], [23, 33, 22], [41, 32, 33], [21, 22, 32], [33, 32, 22],
-     [39, 31, 40], [21, 32, 31], [41, 40, 32], [31, 32, 40], [23, 34, 33],
-     [43, 42, 34], [41, 33, 42], [34, 42, 33], [51, 53, 47], [55, 50, 53],
-     [43, 47, 50], [53, 50, 47], [52, 48, 54], [41, 49, 48], [55, 54, 49],
-     [48, 49, 54], [43, 50, 42], [55, 49, 50], [41, 42, 49], [50, 49, 42],
-     [65, 64, 63], [61, 62, 64], [60, 63, 62], [64, 62, 63], [52, 54, 57],
-     [55, 59, 54], [61, 57, 59], [54, 59, 57], [51, 56, 53], [60, 58, 56],
-     [55, 53, 58], [56, 58, 53], [61, 59, 62], [55, 58, 59], [60, 62, 58],
-     [59, 58, 62], [19, 30, 18], [39, 29, 30], [17, 18, 29], [30, 29, 18],
-     [52, 44, 46], [35, 38, 44], [39, 46, 38], [44, 38, 46], [11, 16, 24],
-     [17, 28, 16], [35, 24, 28], [16, 28, 24], [39, 38, 29], [35, 28, 38],
-     [17, 29, 28], [38, 28, 29], [12, 13, 25], [14, 26, 13], [36, 25, 26],
-     [13, 26, 25], [11, 24, 15], [35, 27, 24], [14, 15, 27], [24, 27, 15],
-     [52, 45, 44], [36, 37, 45], [35, 44, 37], [45, 37, 44], [14, 27, 26],
-     [35, 37, 27], [36, 26, 37], [27, 37, 26]]), [], [["ell.mesh"]])
-
-    TestMeshParser(np.array([[0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0],
-    [0.3333333333325, 0, 0], [0.66666666666579, 0, 0], [0.16666666666633, 0, 0],
-    [0.49999999999868, 0, 0], [0.83333333333289, 0, 0], [1, 0.3333333333325, 0],
-    [1, 0.66666666666579, 0], [1, 0.16666666666633, 0], [1, 0.49999999999868, 0],
-    [1, 0.83333333333289, 0], [0.66666666666759, 1, 0], [0.33333333333472, 1, 0],
-    [0.83333333333364, 1, 0], [0.50000000000141, 1, 0], [0.16666666666736, 1, 0],
-    [0, 0.66666666666759, 0], [0, 0.33333333333472, 0], [0, 0.83333333333364, 0],
-    [0, 0.50000000000141, 0], [0, 0.16666666666736, 0],
-    [0.50000000000007, 0.49999999999997, 0], [0.29166666666684, 0.70833333333344, 0],
-    [0.29166666666653, 0.2916666666668, 0], [0.70833333333346, 0.70833333333324, 0],
-    [0.70833333333328, 0.29166666666651, 0], [0.49999999999982, 0.17261904761947, 0],
-    [0.17261904761972, 0.50000000000021, 0], [0.82738095238055, 0.49999999999982, 0],
-    [0.50000000000021, 0.8273809523803, 0], [0.14583333333342, 0.85416666666672, 0],
-    [0.31250000000078, 0.85416666666672, 0], [0.14583333333326, 0.1458333333334, 0],
-    [0.14583333333326, 0.31250000000076, 0], [0.14583333333342, 0.68750000000052, 0],
-    [0.31249999999951, 0.1458333333334, 0], [0.68750000000053, 0.85416666666662, 0],
-    [0.85416666666673, 0.85416666666662, 0], [0.85416666666673, 0.68749999999951, 0],
-    [0.85416666666664, 0.31249999999951, 0], [0.85416666666664, 0.14583333333326, 0],
-    [0.68749999999953, 0.14583333333326, 0], [0.39583333333317, 0.23214285714314, 0],
-    [0.49999999999994, 0.33630952380972, 0], [0.3958333333333, 0.39583333333339, 0],
-    [0.23214285714328, 0.60416666666683, 0], [0.33630952380989, 0.50000000000009, 0],
-    [0.39583333333346, 0.60416666666671, 0], [0.23214285714312, 0.39583333333351, 0],
-    [0.50000000000014, 0.66369047619013, 0], [0.39583333333353, 0.76785714285687, 0],
-    [0.60416666666667, 0.39583333333324, 0], [0.60416666666655, 0.23214285714299, 0],
-    [0.66369047619031, 0.49999999999989, 0], [0.767857142857, 0.60416666666653, 0],
-    [0.60416666666676, 0.6041666666666, 0], [0.76785714285691, 0.39583333333317, 0],
-    [0.60416666666684, 0.76785714285677, 0], [0.5833333333328, 0.086309523809735, 0],
-    [0.41666666666616, 0.086309523809735, 0], [0.91369047619027, 0.5833333333328, 0],
-    [0.91369047619027, 0.41666666666616, 0], [0.086309523809858, 0.41666666666747, 0],
-    [0.086309523809858, 0.5833333333339, 0], [0.41666666666747, 0.91369047619015, 0],
-    [0.5833333333339, 0.91369047619015, 0]]),
-    np.array([[16, 4, 26, 19, 34, 35],
-     [1, 27, 21, 36, 37, 24],
-     [4, 20, 26, 22, 38, 34],
-     [1, 5, 27, 7, 39, 36],
-     [3, 15, 28, 17, 40, 41],
-     [3, 28, 11, 41, 42, 14],
-     [10, 29, 2, 43, 44, 12],
-     [2, 29, 6, 44, 45, 9],
-     [27, 30, 25, 46, 47, 48],
-     [26, 31, 25, 49, 50, 51],
-     [27, 25, 31, 48, 50, 52],
-     [26, 25, 33, 51, 53, 54],
-     [29, 25, 30, 55, 47, 56],
-     [25, 32, 28, 57, 58, 59],
-     [29, 32, 25, 60, 57, 55],
-     [25, 28, 33, 59, 61, 53],
-     [5, 6, 30, 8, 62, 63],
-     [10, 11, 32, 13, 64, 65],
-     [20, 21, 31, 23, 66, 67],
-     [16, 33, 15, 68, 69, 18],
-     [26, 20, 31, 38, 67, 49],
-     [15, 33, 28, 69, 61, 40],
-     [5, 30, 27, 63, 46, 39],
-     [10, 32, 29, 65, 60, 43],
-     [27, 31, 21, 52, 66, 37],
-     [16, 26, 33, 35, 54, 68],
-     [6, 29, 30, 45, 56, 62],
-     [11, 28, 32, 42, 58, 64]]),
-   [(1, 5, 7, 1),
-    (5, 6, 8, 1),
-    (6, 2, 9, 1),
-    (2, 10, 12, 2),
-    (10, 11, 13, 2),
-    (11, 3, 14, 2),
-    (3, 15, 17, 3),
-    (15, 16, 18, 3),
-    (16, 4, 19, 3),
-    (4, 20, 22, 4),
-    (20, 21, 23, 4),
-    (21, 1, 24, 4)],
-     [["unitsquare.mesh"], ["unitsquare.msh"]])
-finally:
-    os.chdir(original_directory)
+        # The connectivity is compact, every geometric point is stored once,
+        # and each column of an element holds one kind of basis function.
+        assert argyris_mesh.elements.dtype == np.int32
+        assert len(argyris_mesh.points) == lagrange_mesh.nodes.shape[0]
+        npt.assert_equal(argyris_mesh.nodes,
+                         argyris_mesh.points[argyris_mesh.node_points])
+        npt.assert_equal(argyris_mesh.dof_types[argyris_mesh.elements - 1],
+                         np.tile(meshes._COLUMN_DOF_TYPES,
+                                 (argyris_mesh.elements.shape[0], 1)))
+        assert np.count_nonzero(argyris_mesh.dof_types == meshes.DOF_DXY) \
+            == len(argyris_mesh.stacked_nodes)
+
+        # The adjacency arrays agree with each other and with the edges.
+        offsets, elements, local_edges = argyris_mesh.edge_elements
+        assert len(argyris_mesh.edge_corners) == \
+            len(argyris_mesh.edges_by_midpoint)
+        npt.assert_equal(argyris_mesh.element_edges[elements, local_edges],
+                         np.repeat(np.arange(len(offsets) - 1),
+                                   np.diff(offsets)))
+        assert len(argyris_mesh.element_neighbors[1]) == \
+            2*np.count_nonzero(np.diff(offsets) == 2)
+        node_offsets, node_elements = argyris_mesh.node_elements
+        for node in [1, argyris_mesh.nodes.shape[0]]:
+            containing = node_elements[node_offsets[node - 1]:
+                                       node_offsets[node]]
+            assert np.all(np.any(argyris_mesh.elements[containing] == node,
+                                 axis=1))
+
+        # A clamped border fixes everything a simply supported one does.
+        for collection in argyris_mesh.node_collections:
+            dofs = collection.dirichlet_dofs
+            assert np.all(np.isin(dofs['simply_supported'], dofs['clamped']))
+            assert collection.stacked_nodes.shape == \
+                (len(collection.function_values), 5)
+
+        # Ensure that the binary format reproduces the mesh.
+        handle, file_name = tempfile.mkstemp(suffix=".apm")
+        os.close(handle)
+        try:
+            argyris_mesh.save(file_name)
+            loaded_mesh = meshes.load(file_name)
+            npt.assert_equal(argyris_mesh.elements, loaded_mesh.elements)
+            npt.assert_equal(argyris_mesh.nodes, loaded_mesh.nodes)
+            assert (argyris_mesh.edges_by_midpoint ==
+                    loaded_mesh.edges_by_midpoint)
+            for collection, loaded_collection in \
+                    zip(argyris_mesh.node_collections,
+                        loaded_mesh.node_collections):
+                assert collection.edges == loaded_collection.edges
+            assert argyris_mesh.fingerprint() == loaded_mesh.fingerprint()
+        finally:
+            os.remove(file_name)
+
+        # Ensure that renumbering permutes the nodes and elements
+        # consistently and keeps the stacked nodes contiguous.
+        for method, blocked in [("rcm", False), ("hilbert", False),
+                                ("rcm", True)]:
+            renumbered_mesh = meshes.mesh_factory(*mesh_file, argyris=True)
+            # the cached expansion of the nodes is rebuilt after renumbering.
+            npt.assert_equal(renumbered_mesh.nodes, argyris_mesh.nodes)
+            node_order, element_order = renumbered_mesh.renumber(
+                method, blocked=blocked)
+            assert renumbered_mesh.vertex_blocked == blocked
+            npt.assert_equal(np.sort(node_order),
+                             np.arange(1, argyris_mesh.nodes.shape[0] + 1))
+            npt.assert_almost_equal(renumbered_mesh.nodes,
+                                    argyris_mesh.nodes[node_order - 1])
+            npt.assert_equal(
+                np.sort(node_order[renumbered_mesh.elements - 1], axis=1),
+                np.sort(argyris_mesh.elements[element_order - 1], axis=1))
+            assert np.all(np.diff(renumbered_mesh.elements[:, 0:3]) > 0)
+            for corner, stacked in renumbered_mesh.stacked_nodes.items():
+                npt.assert_equal(stacked, np.arange(corner + 1, corner + 6))
+            for midpoint, edge in renumbered_mesh.edges_by_midpoint.items():
+                element = renumbered_mesh.elements[edge.element_number - 1]
+                assert element[17 + edge.edge_type] == midpoint
+            border_edges = renumbered_mesh.border_edges
+            for name in border_edges.names:
+                edges = border_edges[name]
+                order = np.lexsort(tuple(edges.T[::-1]))
+                npt.assert_equal(order, np.arange(len(edges)))
+            assert renumbered_mesh.fingerprint() != argyris_mesh.fingerprint()
+
+        # The fingerprint depends on the contents of the mesh alone.
+        same_mesh = meshes.mesh_factory(*mesh_file, argyris=True)
+        assert same_mesh.fingerprint() == argyris_mesh.fingerprint()
+        assert lagrange_mesh.fingerprint() != argyris_mesh.fingerprint()
+        same_mesh.relabel_borders(default_border="open")
+        assert same_mesh.fingerprint() != argyris_mesh.fingerprint()
+
+def main():
+    """
+    Run every test case. Each class runs its checks when instantiated, so
+    the cases below are executed in order and the first failure stops the
+    script with a traceback (and a nonzero exit status).
+    """
+    # The tests rely on parsing several files. Change the directory and then change
+    # back.
+    original_directory = os.getcwd()
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        TestMeshParser(np.array([[0,0,0],[1,0,0],[1,1,0],[0,1,0],[0.5,0.5,0]]),
+                       np.array([[1,2,5],[2,3,5],[3,4,5],[4,1,5]]),
+                       [(1,2,1),(2,3,2),(3,4,3),(4,1,4)],
+                       [["linears1.mesh"],
+                        ["linears1_elements.txt", "linears1_nodes.txt"]])
+
+        TestChangeOrder(["linears1.mesh"])
+        TestChangeOrder(["linears1_shifted.mesh"])
+
+        TestApplyDirichlet()
+
+        TestRefine(["linears1.mesh"], {'west' : (4,)})
+        TestRefine(["unitsquare.msh"], {'west' : (4,), 'east' : (2,)})
+
+        TestPartition(["unitsquare.msh"], 3)
+
+        TestRunMESH([["linears1.mesh"], ["unitsquare.msh"],
+                     ["linears1_elements_shifted.txt",
+                      "linears1_nodes_shifted.txt"]])
+
+        # case for extra nodes
+        TestLagrangeMesh(np.array([[0,0,0],[1,0,0],[1,1,0],[0,1,0],[0.5,0.5,0]]),
+                       np.array([[1,2,5],[2,3,5],[3,4,5],[4,1,5]]),
+                       [(1,2,1),(2,3,2),(3,4,3),(4,1,4)],
+                       [["linears1_shifted.mesh"],
+                        ["linears1_elements_shifted.txt", "linears1_nodes_shifted.txt"]])
+
+        TestMeshParser(np.array([[0.000000, 0.000000], [0.000000, 0.000000],
+         [0.500000, 0.000000], [0.500000, 0.000000], [0.000000, 0.000000],
+         [1.000000, 0.000000], [0.500000, 0.500000], [0.000000, 1.000000],
+         [0.000000, 0.000000], [0.000000, 1.500000], [0.000000, 0.500000],
+         [1.000000, 0.000000], [1.000000, 0.500000], [0.000000, 1.500000],
+         [0.000000, 0.000000], [0.000000, 4.000000], [0.000000, 2.000000],
+         [4.000000, 0.000000], [1.500000, 4.000000], [0.000000, 1.000000],
+         [4.000000, 0.000000], [0.500000, 4.000000], [0.000000, 0.000000],
+         [3.500000, 0.000000], [0.000000, 3.000000], [0.000000, 0.000000],
+         [2.500000, 0.000000], [0.000000, 2.000000], [0.000000, 0.500000],
+         [1.500000, 0.000000], [1.000000, 1.000000], [0.000000, 1.500000],
+         [0.500000, 0.000000], [2.000000, 0.000000], [0.000000, 0.500000],
+         [3.500000, 0.000000], [2.000000, 3.500000], [0.000000, 1.500000],
+         [3.500000, 0.000000], [1.000000, 3.500000], [0.000000, 0.500000],
+         [3.000000, 0.000000], [0.500000, 2.500000], [0.000000, 0.500000],
+         [2.000000, 0.000000], [1.000000, 1.500000], [0.000000, 1.500000],
+         [1.000000, 0.000000], [2.000000, 0.500000], [0.000000, 2.500000],
+         [0.000000, 0.000000], [1.000000, 3.000000], [0.000000, 2.000000],
+         [3.000000, 0.000000], [1.500000, 3.000000], [0.000000, 1.000000],
+         [2.500000, 0.000000], [1.000000, 2.000000], [0.000000, 1.500000],
+         [1.500000, 0.000000], [2.000000, 1.000000], [0.000000, 2.500000],
+         [0.500000, 0.000000], [3.000000, 0.000000], [0.000000, 1.500000]]),
+         np.array([[1, 3, 2], [6, 5, 3], [4, 2, 5], [3, 5, 2], [23, 22, 10], [21, 9, 22],
+         [6, 10, 9], [22, 9, 10], [19, 7, 20], [4, 8, 7], [21, 20, 8], [7, 8, 20],
+         [6, 9, 5], [21, 8, 9], [4, 5, 8], [9, 8, 5], [52, 46, 48], [39, 40, 46],
+         [41, 48, 40], [46, 40, 48], [19, 20, 30], [21, 31, 20], [39, 30, 31],
+         [20, 31, 30], [23, 33, 22], [41, 32, 33], [21, 22, 32], [33, 32, 22],
+         [39, 31, 40], [21, 32, 31], [41, 40, 32], [31, 32, 40], [23, 34, 33],
+         [43, 42, 34], [41, 33, 42], [34, 42, 33], [51, 53, 47], [55, 50, 53],
+         [43, 47, 50], [53, 50, 47], [52, 48, 54], [41, 49, 48], [55, 54, 49],
+         [48, 49, 54], [43, 50, 42], [55, 49, 50], [41, 42, 49], [50, 49, 42],
+         [65, 64, 63], [61, 62, 64], [60, 63, 62], [64, 62, 63], [52, 54, 57],
+         [55, 59, 54], [61, 57, 59], [54, 59, 57], [51, 56, 53], [60, 58, 56],
+         [55, 53, 58], [56, 58, 53], [61, 59, 62], [55, 58, 59], [60, 62, 58],
+         [59, 58, 62], [19, 30, 18], [39, 29, 30], [17, 18, 29], [30, 29, 18],
+         [52, 44, 46], [35, 38, 44], [39, 46, 38], [44, 38, 46], [11, 16, 24],
+         [17, 28, 16], [35, 24, 28], [16, 28, 24], [39, 38, 29], [35, 28, 38],
+         [17, 29, 28], [38, 28, 29], [12, 13, 25], [14, 26, 13], [36, 25, 26],
+         [13, 26, 25], [11, 24, 15], [35, 27, 24], [14, 15, 27], [24, 27, 15],
+         [52, 45, 44], [36, 37, 45], [35, 44, 37], [45, 37, 44], [14, 27, 26],
+         [35, 37, 27], [36, 26, 37], [27, 37, 26]]), [], [["ell.mesh"]])
+
+        TestMeshParser(np.array([[0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0],
+        [0.3333333333325, 0, 0], [0.66666666666579, 0, 0], [0.16666666666633, 0, 0],
+        [0.49999999999868, 0, 0], [0.83333333333289, 0, 0], [1, 0.3333333333325, 0],
+        [1, 0.66666666666579, 0], [1, 0.16666666666633, 0], [1, 0.49999999999868, 0],
+        [1, 0.83333333333289, 0], [0.66666666666759, 1, 0], [0.33333333333472, 1, 0],
+        [0.83333333333364, 1, 0], [0.50000000000141, 1, 0], [0.16666666666736, 1, 0],
+        [0, 0.66666666666759, 0], [0, 0.33333333333472, 0], [0, 0.83333333333364, 0],
+        [0, 0.50000000000141, 0], [0, 0.16666666666736, 0],
+        [0.50000000000007, 0.49999999999997, 0], [0.29166666666684, 0.70833333333344, 0],
+        [0.29166666666653, 0.2916666666668, 0], [0.70833333333346, 0.70833333333324, 0],
+        [0.70833333333328, 0.29166666666651, 0], [0.49999999999982, 0.17261904761947, 0],
+        [0.17261904761972, 0.50000000000021, 0], [0.82738095238055, 0.49999999999982, 0],
+        [0.50000000000021, 0.8273809523803, 0], [0.14583333333342, 0.85416666666672, 0],
+        [0.31250000000078, 0.85416666666672, 0], [0.14583333333326, 0.1458333333334, 0],
+        [0.14583333333326, 0.31250000000076, 0], [0.14583333333342, 0.68750000000052, 0],
+        [0.31249999999951, 0.1458333333334, 0], [0.68750000000053, 0.85416666666662, 0],
+        [0.85416666666673, 0.85416666666662, 0], [0.85416666666673, 0.68749999999951, 0],
+        [0.85416666666664, 0.31249999999951, 0], [0.85416666666664, 0.14583333333326, 0],
+        [0.68749999999953, 0.14583333333326, 0], [0.39583333333317, 0.23214285714314, 0],
+        [0.49999999999994, 0.33630952380972, 0], [0.3958333333333, 0.39583333333339, 0],
+        [0.23214285714328, 0.60416666666683, 0], [0.33630952380989, 0.50000000000009, 0],
+        [0.39583333333346, 0.60416666666671, 0], [0.23214285714312, 0.39583333333351, 0],
+        [0.50000000000014, 0.66369047619013, 0], [0.39583333333353, 0.76785714285687, 0],
+        [0.60416666666667, 0.39583333333324, 0], [0.60416666666655, 0.23214285714299, 0],
+        [0.66369047619031, 0.49999999999989, 0], [0.767857142857, 0.60416666666653, 0],
+        [0.60416666666676, 0.6041666666666, 0], [0.76785714285691, 0.39583333333317, 0],
+        [0.60416666666684, 0.76785714285677, 0], [0.5833333333328, 0.086309523809735, 0],
+        [0.41666666666616, 0.086309523809735, 0], [0.91369047619027, 0.5833333333328, 0],
+        [0.91369047619027, 0.41666666666616, 0], [0.086309523809858, 0.41666666666747, 0],
+        [0.086309523809858, 0.5833333333339, 0], [0.41666666666747, 0.91369047619015, 0],
+        [0.5833333333339, 0.91369047619015, 0]]),
+        np.array([[16, 4, 26, 19, 34, 35],
+         [1, 27, 21, 36, 37, 24],
+         [4, 20, 26, 22, 38, 34],
+         [1, 5, 27, 7, 39, 36],
+         [3, 15, 28, 17, 40, 41],
+         [3, 28, 11, 41, 42, 14],
+         [10, 29, 2, 43, 44, 12],
+         [2, 29, 6, 44, 45, 9],
+         [27, 30, 25, 46, 47, 48],
+         [26, 31, 25, 49, 50, 51],
+         [27, 25, 31, 48, 50, 52],
+         [26, 25, 33, 51, 53, 54],
+         [29, 25, 30, 55, 47, 56],
+         [25, 32, 28, 57, 58, 59],
+         [29, 32, 25, 60, 57, 55],
+         [25, 28, 33, 59, 61, 53],
+         [5, 6, 30, 8, 62, 63],
+         [10, 11, 32, 13, 64, 65],
+         [20, 21, 31, 23, 66, 67],
+         [16, 33, 15, 68, 69, 18],
+         [26, 20, 31, 38, 67, 49],
+         [15, 33, 28, 69, 61, 40],
+         [5, 30, 27, 63, 46, 39],
+         [10, 32, 29, 65, 60, 43],
+         [27, 31, 21, 52, 66, 37],
+         [16, 26, 33, 35, 54, 68],
+         [6, 29, 30, 45, 56, 62],
+         [11, 28, 32, 42, 58, 64]]),
+       [(1, 5, 7, 1),
+        (5, 6, 8, 1),
+        (6, 2, 9, 1),
+        (2, 10, 12, 2),
+        (10, 11, 13, 2),
+        (11, 3, 14, 2),
+        (3, 15, 17, 3),
+        (15, 16, 18, 3),
+        (16, 4, 19, 3),
+        (4, 20, 22, 4),
+        (20, 21, 23, 4),
+        (21, 1, 24, 4)],
+         [["unitsquare.mesh"], ["unitsquare.msh"], ["unitsquare_22_binary.msh"],
+          ["unitsquare_41.msh"], ["unitsquare_41_binary.msh"]])
+    finally:
+        os.chdir(original_directory)
+    print("all mesh tests passed")
+
+
+if __name__ == '__main__':
+    main()
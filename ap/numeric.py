@@ -1,15 +1,21 @@
 #! /usr/bin/env python
 import os
-import sys
 import numpy as np
 import ctypes as ct
 
-_module_path = os.path.dirname(unicode(os.path.abspath(__file__),
-        sys.getfilesystemencoding())) + os.sep + ".." + os.sep
+_module_path = os.path.dirname(os.path.abspath(__file__)) + os.sep + ".." \
+    + os.sep
 _ap = np.ctypeslib.load_library('libargyris_pack.so', _module_path)
 
+# Above this many points the ref_* functions evaluate the basis functions
+# directly, in blocks, instead of building a table of monomials.
+direct_threshold = ct.c_int.in_dll(_ap, 'ap_direct_threshold').value
+
 array_1d_double = np.ctypeslib.ndpointer(dtype=np.double, ndim=1, flags='C_CONTIGUOUS')
 array_2d_double = np.ctypeslib.ndpointer(dtype=np.double, ndim=2, flags='C_CONTIGUOUS')
+array_3d_double = np.ctypeslib.ndpointer(dtype=np.double, ndim=3, flags='C_CONTIGUOUS')
+array_1d_int = np.ctypeslib.ndpointer(dtype=np.intc, ndim=1, flags='C_CONTIGUOUS')
+array_2d_int = np.ctypeslib.ndpointer(dtype=np.intc, ndim=2, flags='C_CONTIGUOUS')
 
 _ap.ap_ref_values.restype  = None
 _ap.ap_ref_values.argtypes = [array_1d_double, array_1d_double,
@@ -25,6 +31,16 @@ _ap.ap_ref_hessians.argtypes = [array_1d_double, array_1d_double,
                                 ct.c_int, array_2d_double,
                                 array_2d_double, array_2d_double]
 
+_ap.ap_ref_third_derivatives.restype  = None
+_ap.ap_ref_third_derivatives.argtypes = [array_1d_double, array_1d_double,
+                                         ct.c_int, array_2d_double,
+                                         array_2d_double, array_2d_double,
+                                         array_2d_double]
+
+_ap.ap_ref_all.restype  = None
+_ap.ap_ref_all.argtypes = [array_1d_double, array_1d_double, ct.c_int,
+                           array_3d_double]
+
 _ap.ap_physical_maps.restype  = None
 _ap.ap_physical_maps.argtypes = [array_1d_double, array_1d_double,
                                  array_2d_double, array_2d_double,
@@ -47,6 +63,18 @@ _ap.ap_physical_hessians.argtypes = [array_2d_double, array_2d_double,
                                      array_2d_double, array_2d_double,
                                      array_2d_double]
 
+_ap.ap_physical_third_derivatives.restype  = None
+_ap.ap_physical_third_derivatives.argtypes = [array_2d_double, array_2d_double,
+                                              array_2d_double, array_2d_double,
+                                              array_2d_double, array_2d_double,
+                                              ct.c_int,
+                                              array_2d_double, array_2d_double,
+                                              array_2d_double, array_2d_double]
+
+_ap.ap_physical_all.restype  = None
+_ap.ap_physical_all.argtypes = [array_2d_double, array_2d_double,
+                                array_3d_double, ct.c_int, array_3d_double]
+
 _ap.ap_matrix_mass.restype  = None
 _ap.ap_matrix_mass.argtypes = [array_2d_double, array_2d_double,
                                array_2d_double, array_1d_double,
@@ -70,6 +98,57 @@ _ap.ap_matrix_biharmonic.argtypes = [array_2d_double, array_2d_double,
                                      array_2d_double, array_1d_double,
                                      ct.c_int, array_2d_double]
 
+_ap.ap_matrix_mass_stabilized.restype  = None
+_ap.ap_matrix_mass_stabilized.argtypes = [array_2d_double, array_2d_double,
+                                          array_2d_double, array_2d_double,
+                                          array_2d_double, array_1d_double,
+                                          ct.c_int, array_2d_double]
+
+_ap.ap_matrix_betaplane_stabilized.restype  = None
+_ap.ap_matrix_betaplane_stabilized.argtypes = [array_2d_double, array_2d_double,
+                                               array_2d_double, array_2d_double,
+                                               array_1d_double, ct.c_int,
+                                               array_2d_double]
+
+_ap.ap_matrix_stiffness_stabilized.restype  = None
+_ap.ap_matrix_stiffness_stabilized.argtypes = [array_2d_double, array_2d_double,
+                                               array_2d_double, array_2d_double,
+                                               array_2d_double, array_2d_double,
+                                               array_2d_double, array_1d_double,
+                                               ct.c_int, array_2d_double]
+
+_ap.ap_matrix_biharmonic_stabilized.restype  = None
+_ap.ap_matrix_biharmonic_stabilized.argtypes = [
+    array_2d_double, array_2d_double, array_2d_double, array_2d_double,
+    array_2d_double, array_2d_double, array_2d_double, array_2d_double,
+    array_2d_double, array_1d_double, ct.c_int, array_2d_double]
+
+_ap.ap_sparse_triangular_solve.restype  = ct.c_int
+_ap.ap_sparse_triangular_solve.argtypes = [array_1d_int, array_1d_int,
+                                           array_1d_double, ct.c_int, ct.c_int,
+                                           array_1d_double]
+
+_ap.ap_qg_jacobian.restype  = None
+_ap.ap_qg_jacobian.argtypes = [
+    array_2d_double, array_2d_double, array_2d_int, ct.c_int,
+    array_1d_double, array_2d_double, array_2d_double, array_2d_double,
+    array_2d_double, array_2d_double, array_2d_double, array_2d_double,
+    array_1d_double, ct.c_int, array_1d_double, ct.c_void_p]
+
+_ap.ap_gather.restype  = None
+_ap.ap_gather.argtypes = [array_2d_int, ct.c_int, array_2d_double, ct.c_int,
+                          ct.c_int, array_3d_double]
+
+_ap.ap_scatter_add.restype  = None
+_ap.ap_scatter_add.argtypes = [array_2d_int, ct.c_int, array_3d_double,
+                               ct.c_int, ct.c_int, array_2d_double]
+
+_ap.ap_gather_evaluate.restype  = ct.c_int
+_ap.ap_gather_evaluate.argtypes = [
+    array_2d_double, array_2d_double, array_2d_int, ct.c_int,
+    array_2d_double, ct.c_int, ct.c_int, array_3d_double, ct.c_int,
+    ct.c_void_p]
+
 def ref_values(x, y):
     """
     Calculate the values of the Argyris basis functions at given reference
@@ -115,6 +194,44 @@ def ref_hessians(x, y):
     _ap.ap_ref_hessians(x, y, x.shape[0], ref_dxx, ref_dxy, ref_dyy)
     return (ref_dxx, ref_dxy, ref_dyy)
 
+def ref_third_derivatives(x, y):
+    """
+    Calculate the third derivatives of the Argyris basis functions at given
+    reference points.
+
+    Arguments:
+    - `x` : 1-dimensional matrix of x-coordinates.
+    - `y` : 1-dimensional matrix of y-coordinates.
+    """
+    check_evaluation_points(x, y)
+    ref_dxxx = np.empty((21,x.shape[0]))
+    ref_dxxy = np.empty((21,x.shape[0]))
+    ref_dxyy = np.empty((21,x.shape[0]))
+    ref_dyyy = np.empty((21,x.shape[0]))
+    _ap.ap_ref_third_derivatives(x, y, x.shape[0], ref_dxxx, ref_dxxy,
+                                 ref_dxyy, ref_dyyy)
+    return (ref_dxxx, ref_dxxy, ref_dxyy, ref_dyyy)
+
+def ref_all(x, y):
+    """
+    Calculate the values and first and second derivatives of the Argyris basis
+    functions at given reference points in one pass. Return a (6, 21, N) array
+    of the tables computed by ref_values, ref_gradients, and ref_hessians, so
+    that
+
+        (ref_values, ref_dx, ref_dy, ref_dxx, ref_dxy, ref_dyy) = ref_all(x, y)
+
+    unpacks it.
+
+    Arguments:
+    - `x` : 1-dimensional matrix of x-coordinates.
+    - `y` : 1-dimensional matrix of y-coordinates.
+    """
+    check_evaluation_points(x, y)
+    tables = np.empty((6, 21, x.shape[0]))
+    _ap.ap_ref_all(x, y, x.shape[0], tables)
+    return tables
+
 def physical_maps(x, y):
     """
     Calculate the Argyris change of basis matrices C, B, and b.
@@ -185,6 +302,49 @@ def physical_hessians(C, B, ref_dxx, ref_dxy, ref_dyy):
                              dxx, dxy, dyy)
     return (dxx, dxy, dyy)
 
+def physical_third_derivatives(C, B, ref_dxxx, ref_dxxy, ref_dxyy, ref_dyyy):
+    """
+    Calculate the third derivatives of the Argyris basis functions on a
+    physical element.
+
+    Arguments:
+    - `C`        : (21, 21) Argyris transformation matrix.
+    - `B`        : (2, 2) Affine multiplier matrix.
+    - `ref_dxxx` : (21, N) matrix of reference function xxx-derivative values.
+    - `ref_dxxy` : (21, N) matrix of reference function xxy-derivative values.
+    - `ref_dxyy` : (21, N) matrix of reference function xyy-derivative values.
+    - `ref_dyyy` : (21, N) matrix of reference function yyy-derivative values.
+    """
+    check_transformations(C, B)
+    check_ref_values(ref_dxxx, ref_dxxy, ref_dxyy, ref_dyyy)
+    dxxx = np.empty(ref_dxxx.shape, dtype=np.float64)
+    dxxy = np.empty(ref_dxxx.shape, dtype=np.float64)
+    dxyy = np.empty(ref_dxxx.shape, dtype=np.float64)
+    dyyy = np.empty(ref_dxxx.shape, dtype=np.float64)
+    _ap.ap_physical_third_derivatives(C, B, ref_dxxx, ref_dxxy, ref_dxyy,
+                                      ref_dyyy, ref_dxxx.shape[1], dxxx, dxxy,
+                                      dxyy, dyyy)
+    return (dxxx, dxxy, dxyy, dyyy)
+
+def physical_all(C, B, ref_tables):
+    """
+    Calculate the values and first and second derivatives of the Argyris basis
+    functions on a physical element in one call. Return a (6, 21, N) array of
+    the tables computed by physical_values, physical_gradients, and
+    physical_hessians.
+
+    Arguments:
+    - `C`          : (21, 21) Argyris transformation matrix.
+    - `B`          : (2, 2) Affine multiplier matrix.
+    - `ref_tables` : (6, 21, N) output of ref_all.
+    """
+    check_transformations(C, B)
+    assert ref_tables.ndim == 3 and ref_tables.shape[0] == 6
+    check_ref_values(*ref_tables)
+    tables = np.empty(ref_tables.shape, dtype=np.float64)
+    _ap.ap_physical_all(C, B, ref_tables, ref_tables.shape[2], tables)
+    return tables
+
 def matrix_mass(C, B, ref_values, weights):
     """
     Calculate the local mass matrix on a physical triangle.
@@ -270,6 +430,373 @@ def matrix_biharmonic(C, B, ref_dxx, ref_dxy, ref_dyy, weights):
                              ref_dxx.shape[1], biharmonic)
     return biharmonic
 
+def matrix_mass_stabilized(C, B, ref_values, ref_dx, ref_dy, weights):
+    """
+    Calculate the local stabilized mass matrix on a physical triangle, whose
+    (i, j) entry is the integral of (phi_i)_x phi_j.
+
+    Arguments:
+    - `C`          : (21, 21) Argyris transformation matrix.
+    - `B`          : (2, 2) Affine multiplier matrix.
+    - `ref_values` : (21, N) matrix of reference function values at quadrature
+                     points.
+    - `ref_dx`     : (21, N) matrix of reference function x-derivative values at
+                     quadrature points.
+    - `ref_dy`     : (21, N) matrix of reference function y-derivative values at
+                     quadrature points.
+    - `weights`    : (21,) matrix of the weights corresponding to the quadrature
+                     points.
+    """
+    check_transformations(C, B)
+    check_ref_values(ref_values, ref_dx, ref_dy, weights=weights)
+    mass_stabilized = np.empty((21,21), dtype=np.float64)
+    _ap.ap_matrix_mass_stabilized(C, B, ref_values, ref_dx, ref_dy, weights,
+                                  ref_values.shape[1], mass_stabilized)
+    return mass_stabilized
+
+def matrix_betaplane_stabilized(C, B, ref_dx, ref_dy, weights):
+    """
+    Calculate the local stabilized betaplane matrix on a physical triangle,
+    whose (i, j) entry is the integral of (phi_i)_x (phi_j)_x.
+
+    Arguments:
+    - `C`       : (21, 21) Argyris transformation matrix.
+    - `B`       : (2, 2) Affine multiplier matrix.
+    - `ref_dx`  : (21, N) matrix of reference function x-derivative values at
+                  quadrature points.
+    - `ref_dy`  : (21, N) matrix of reference function y-derivative values at
+                  quadrature points.
+    - `weights` : (21,) matrix of the weights corresponding to the quadrature
+                  points.
+    """
+    check_transformations(C, B)
+    check_ref_values(ref_dx, ref_dy, weights=weights)
+    betaplane_stabilized = np.empty((21,21), dtype=np.float64)
+    _ap.ap_matrix_betaplane_stabilized(C, B, ref_dx, ref_dy, weights,
+                                       ref_dx.shape[1], betaplane_stabilized)
+    return betaplane_stabilized
+
+def matrix_stiffness_stabilized(C, B, ref_dx, ref_dy, ref_dxx, ref_dxy, ref_dyy,
+                                weights):
+    """
+    Calculate the local stabilized stiffness matrix on a physical triangle,
+    whose (i, j) entry is the integral of
+    (phi_i)_xx (phi_j)_x + (phi_i)_xy (phi_j)_y.
+
+    Arguments:
+    - `C`       : (21, 21) Argyris transformation matrix.
+    - `B`       : (2, 2) Affine multiplier matrix.
+    - `ref_dx`  : (21, N) matrix of reference function x-derivative values at
+                  quadrature points.
+    - `ref_dy`  : (21, N) matrix of reference function y-derivative values at
+                  quadrature points.
+    - `ref_dxx` : (21, N) matrix of reference function xx-derivative values at
+                  quadrature points.
+    - `ref_dxy` : (21, N) matrix of reference function xy-derivative values at
+                  quadrature points.
+    - `ref_dyy` : (21, N) matrix of reference function yy-derivative values at
+                  quadrature points.
+    - `weights` : (21,) matrix of the weights corresponding to the quadrature
+                  points.
+    """
+    check_transformations(C, B)
+    check_ref_values(ref_dx, ref_dy, ref_dxx, ref_dxy, ref_dyy,
+                     weights=weights)
+    stiffness_stabilized = np.empty((21,21), dtype=np.float64)
+    _ap.ap_matrix_stiffness_stabilized(C, B, ref_dx, ref_dy, ref_dxx, ref_dxy,
+                                       ref_dyy, weights, ref_dx.shape[1],
+                                       stiffness_stabilized)
+    return stiffness_stabilized
+
+def matrix_biharmonic_stabilized(C, B, ref_dxx, ref_dxy, ref_dyy, ref_dxxx,
+                                 ref_dxxy, ref_dxyy, ref_dyyy, weights):
+    """
+    Calculate the local stabilized biharmonic matrix on a physical triangle,
+    whose (i, j) entry is the integral of
+    ((phi_i)_xxx + (phi_i)_xyy) ((phi_j)_xx + (phi_j)_yy).
+
+    Arguments:
+    - `C`        : (21, 21) Argyris transformation matrix.
+    - `B`        : (2, 2) Affine multiplier matrix.
+    - `ref_dxx`  : (21, N) matrix of reference function xx-derivative values at
+                   quadrature points.
+    - `ref_dxy`  : (21, N) matrix of reference function xy-derivative values at
+                   quadrature points.
+    - `ref_dyy`  : (21, N) matrix of reference function yy-derivative values at
+                   quadrature points.
+    - `ref_dxxx` : (21, N) matrix of reference function xxx-derivative values
+                   at quadrature points.
+    - `ref_dxxy` : (21, N) matrix of reference function xxy-derivative values
+                   at quadrature points.
+    - `ref_dxyy` : (21, N) matrix of reference function xyy-derivative values
+                   at quadrature points.
+    - `ref_dyyy` : (21, N) matrix of reference function yyy-derivative values
+                   at quadrature points.
+    - `weights`  : (21,) matrix of the weights corresponding to the quadrature
+                   points.
+    """
+    check_transformations(C, B)
+    check_ref_values(ref_dxx, ref_dxy, ref_dyy, ref_dxxx, ref_dxxy, ref_dxyy,
+                     ref_dyyy, weights=weights)
+    biharmonic_stabilized = np.empty((21,21), dtype=np.float64)
+    _ap.ap_matrix_biharmonic_stabilized(C, B, ref_dxx, ref_dxy, ref_dyy,
+                                        ref_dxxx, ref_dxxy, ref_dxyy, ref_dyyy,
+                                        weights, ref_dxx.shape[1],
+                                        biharmonic_stabilized)
+    return biharmonic_stabilized
+
+def sparse_triangular_solve(indptr, indices, data, rhs, lower=True):
+    """
+    Solve a sparse triangular system by substitution. The matrix is given by
+    its compressed sparse row arrays (which may be read-only memory maps, as
+    they are not copied if they already have the right types) and every row
+    must store its diagonal entry, which must be nonzero (ValueError is
+    raised otherwise). Entries on the wrong side of the diagonal are
+    ignored.
+
+    Arguments:
+    - `indptr`  : (N + 1,) matrix of row offsets.
+    - `indices` : (nnz,) matrix of zero-based column indices.
+    - `data`    : (nnz,) matrix of entries.
+    - `rhs`     : (N,) right hand side.
+    - `lower`   : True (default) if the matrix is lower triangular and False
+                  if it is upper triangular.
+    """
+    indptr = np.ascontiguousarray(indptr, dtype=np.intc)
+    indices = np.ascontiguousarray(indices, dtype=np.intc)
+    data = np.ascontiguousarray(data, dtype=np.float64)
+    solution = np.array(rhs, dtype=np.float64)
+    num_rows = solution.shape[0]
+    # the kernel indexes with these arrays as they are (and they may come
+    # from a cache file), so check them here rather than with asserts.
+    if solution.ndim != 1 or indptr.shape != (num_rows + 1,):
+        raise ValueError("rhs must be a vector with one entry per row")
+    if indices.ndim != 1 or indices.shape != data.shape:
+        raise ValueError("indices and data must be vectors of equal length")
+    if indptr[0] < 0 or indptr[-1] > indices.shape[0] or \
+       np.any(np.diff(indptr) < 0):
+        raise ValueError("indptr must be nondecreasing offsets in to indices")
+    if indices.shape[0] > 0 and (indices.min() < 0 or
+                                 indices.max() >= num_rows):
+        raise ValueError("column indices must lie in [0, {0})".format(
+            num_rows))
+    status = _ap.ap_sparse_triangular_solve(indptr, indices, data, num_rows,
+                                            int(lower), solution)
+    if status != 0:
+        raise ValueError("row {0} has no nonzero diagonal entry".format(
+            status - 1))
+    return solution
+
+def qg_jacobian(x, y, element_dofs, psi, ref_values, ref_dx, ref_dy, ref_dxxx,
+                ref_dxxy, ref_dxyy, ref_dyyy, weights, jacobians=False):
+    """
+    Calculate the quasi-geostrophic advection term on a whole mesh in one
+    pass: the residual vector whose i-th entry is the integral of
+    J(psi, laplacian(psi)) phi_i, where J(a, b) = a_x b_y - a_y b_x, and,
+    optionally, the local matrices of its derivative with respect to psi.
+    Return the residual or, if jacobians is True, the tuple (residual,
+    local Jacobians).
+
+    Arguments:
+    - `x`            : (E, 3) matrix of the x-coordinates of the corners of
+                       every triangle.
+    - `y`            : (E, 3) matrix of the y-coordinates of the corners.
+    - `element_dofs` : (E, 21) matrix of the zero-based global degrees of
+                       freedom of every element (such as ArgyrisMesh.elements
+                       - 1).
+    - `psi`          : global coefficient vector.
+    - `ref_values`   : (21, N) matrix of reference function values at
+                       quadrature points.
+    - `ref_dx`, `ref_dy` : (21, N) matrices of reference first derivatives.
+    - `ref_dxxx`, `ref_dxxy`, `ref_dxyy`, `ref_dyyy` : (21, N) matrices of
+                       reference third derivatives.
+    - `weights`      : (N,) matrix of the quadrature weights.
+    - `jacobians`    : if True, also return the (E, 21, 21) local matrices
+                       (whose rows and columns follow element_dofs) of the
+                       Jacobian. Defaults to False.
+    """
+    _check_ref_tables([ref_values, ref_dx, ref_dy, ref_dxxx, ref_dxxy,
+                       ref_dxyy, ref_dyyy], weights=weights)
+    psi = np.ascontiguousarray(psi, dtype=np.float64)
+    if psi.ndim != 1:
+        raise ValueError("psi must be a vector")
+    element_dofs = _check_element_dofs(element_dofs, psi.shape[0])
+    num_elements = element_dofs.shape[0]
+    _check_corners(x, y, num_elements)
+    residual = np.zeros(psi.shape[0])
+    local_jacobians = None
+    if jacobians:
+        local_jacobians = np.empty((num_elements, 21, 21))
+    _ap.ap_qg_jacobian(
+        np.ascontiguousarray(x), np.ascontiguousarray(y), element_dofs,
+        num_elements, psi, ref_values, ref_dx, ref_dy, ref_dxxx, ref_dxxy,
+        ref_dxyy, ref_dyyy, weights, ref_values.shape[1], residual,
+        None if local_jacobians is None else local_jacobians.ctypes.data)
+    if jacobians:
+        return (residual, local_jacobians)
+    return residual
+
+def _check_element_dofs(element_dofs, num_dofs):
+    """
+    Return element_dofs as a C-contiguous (E, 21) matrix of C ints after
+    checking that every entry indexes a vector of length num_dofs. The
+    kernels index global vectors with these entries without any checks of
+    their own, so this raises ValueError instead of asserting (asserts are
+    removed by python -O).
+    """
+    element_dofs = np.asarray(element_dofs)
+    if element_dofs.ndim != 2 or element_dofs.shape[1] != 21:
+        raise ValueError("element_dofs must be a (E, 21) matrix, not of "
+                         "shape {0}".format(element_dofs.shape))
+    if element_dofs.size > 0:
+        if not np.issubdtype(element_dofs.dtype, np.integer):
+            raise ValueError("element_dofs must be integers")
+        if element_dofs.min() < 0 or element_dofs.max() >= num_dofs:
+            raise ValueError("element_dofs must lie in [0, {0})".format(
+                num_dofs))
+    return np.ascontiguousarray(element_dofs, dtype=np.intc)
+
+def _check_corners(x, y, num_elements):
+    """
+    Raise ValueError unless x and y are (E, 3) float64 matrices of corner
+    coordinates.
+    """
+    for corners in [x, y]:
+        if corners.shape != (num_elements, 3):
+            raise ValueError("corner coordinates must be a ({0}, 3) matrix, "
+                             "not of shape {1}".format(num_elements,
+                                                      corners.shape))
+        if corners.dtype != np.float64:
+            raise ValueError("corner coordinates must be float64")
+
+def _check_ref_tables(ref_tables, weights=None):
+    """
+    Raise ValueError unless every reference table is a (21, N) float64
+    matrix (and weights, if given, a (N,) float64 vector) for the same N.
+    """
+    num_points = ref_tables[0].shape[-1]
+    for ref_values in ref_tables:
+        if ref_values.shape != (21, num_points) or \
+           ref_values.dtype != np.float64:
+            raise ValueError("reference tables must be (21, {0}) float64 "
+                             "matrices".format(num_points))
+    if weights is not None and (weights.shape != (num_points,) or
+                                weights.dtype != np.float64):
+        raise ValueError("weights must be a ({0},) float64 vector".format(
+            num_points))
+
+def _element_dofs_and_fields(element_dofs, fields, num_dofs=None):
+    """
+    Convert element_dofs and fields to the types used by the gather and
+    scatter kernels. fields may be one (N,) vector or a (F, N) matrix of
+    them; return it as a (F, N) matrix along with a flag that is True if
+    it was one vector.
+    """
+    fields = np.ascontiguousarray(fields, dtype=np.float64)
+    single = fields.ndim == 1
+    if single:
+        fields = fields.reshape((1, -1))
+    if fields.ndim != 2:
+        raise ValueError("fields must be a vector or a matrix of vectors")
+    if num_dofs is None:
+        num_dofs = fields.shape[1]
+    element_dofs = _check_element_dofs(element_dofs, num_dofs)
+    return (element_dofs, fields, single)
+
+def gather(element_dofs, fields):
+    """
+    Copy the coefficients of every element out of one or more global
+    vectors. Return a (E, 21) matrix for one vector or a (F, E, 21) array
+    for F vectors.
+
+    Arguments:
+    - `element_dofs` : (E, 21) matrix of the zero-based global degrees of
+                       freedom of every element.
+    - `fields`       : (N,) global vector or (F, N) matrix of global vectors.
+    """
+    (element_dofs, fields, single) = _element_dofs_and_fields(element_dofs,
+                                                              fields)
+    (num_fields, num_dofs) = fields.shape
+    num_elements = element_dofs.shape[0]
+    local = np.empty((num_fields, num_elements, 21))
+    _ap.ap_gather(element_dofs, num_elements, fields, num_fields, num_dofs,
+                  local)
+    return local[0] if single else local
+
+def scatter_add(element_dofs, local, num_dofs, out=None):
+    """
+    Add the coefficients of every element to one or more global vectors:
+    the transpose of gather. Return a (N,) vector if local is a (E, 21)
+    matrix or a (F, N) matrix if it is a (F, E, 21) array.
+
+    Arguments:
+    - `element_dofs` : (E, 21) matrix of the zero-based global degrees of
+                       freedom of every element.
+    - `local`        : (E, 21) matrix or (F, E, 21) array of element
+                       coefficients.
+    - `num_dofs`     : the length N of the global vectors.
+    - `out`          : (optional) a C-contiguous float64 array of the shape
+                       of the result, to which the sums are added in place.
+    """
+    element_dofs = _check_element_dofs(element_dofs, num_dofs)
+    local = np.ascontiguousarray(local, dtype=np.float64)
+    single = local.ndim == 2
+    if single:
+        local = local.reshape((1,) + local.shape)
+    if local.ndim != 3 or local.shape[1:] != element_dofs.shape:
+        raise ValueError("local must be of shape {0} or (F,) + {0}, not "
+                         "{1}".format(element_dofs.shape, local.shape))
+    (num_fields, num_elements) = local.shape[0:2]
+    if out is None:
+        out = np.zeros((num_fields, num_dofs))
+        fields = out
+    else:
+        if out.dtype != np.float64 or not out.flags['C_CONTIGUOUS'] or \
+           out.size != num_fields*num_dofs:
+            raise ValueError("out must be a C-contiguous float64 array of "
+                             "{0} entries".format(num_fields*num_dofs))
+        fields = out.reshape((num_fields, num_dofs))
+    _ap.ap_scatter_add(element_dofs, num_elements, local, num_fields,
+                       num_dofs, fields)
+    return out[0] if single and out.ndim == 2 else out
+
+def gather_evaluate(x, y, element_dofs, fields, ref_tables):
+    """
+    Evaluate one or more global vectors and their first and second
+    derivatives at the quadrature points of every element, without forming
+    the physical basis functions. Return a (6, E, N) array for one vector
+    or a (6, F, E, N) array for F vectors, whose first index runs over the
+    values, dx, dy, dxx, dxy, and dyy.
+
+    Arguments:
+    - `x`            : (E, 3) matrix of the x-coordinates of the corners of
+                       every triangle.
+    - `y`            : (E, 3) matrix of the y-coordinates of the corners.
+    - `element_dofs` : (E, 21) matrix of the zero-based global degrees of
+                       freedom of every element.
+    - `fields`       : (M,) global vector or (F, M) matrix of global vectors.
+    - `ref_tables`   : (6, 21, N) output of ref_all.
+    """
+    (element_dofs, fields, single) = _element_dofs_and_fields(element_dofs,
+                                                              fields)
+    if ref_tables.ndim != 3 or ref_tables.shape[0] != 6:
+        raise ValueError("ref_tables must be a (6, 21, N) array")
+    _check_ref_tables(ref_tables)
+    (num_fields, num_dofs) = fields.shape
+    num_elements = element_dofs.shape[0]
+    num_points = ref_tables.shape[2]
+    _check_corners(x, y, num_elements)
+    # the kernel indexes the output with C ints.
+    if 6*num_fields*num_elements*num_points > np.iinfo(np.intc).max:
+        raise ValueError("too many fields, elements, or points for one call")
+    tables = np.empty((6, num_fields, num_elements, num_points))
+    if _ap.ap_gather_evaluate(
+            np.ascontiguousarray(x), np.ascontiguousarray(y), element_dofs,
+            num_elements, fields, num_fields, num_dofs, ref_tables,
+            num_points, tables.ctypes.data) != 0:
+        raise MemoryError("could not allocate the gather_evaluate workspace")
+    return tables[:, 0] if single else tables
+
 def check_evaluation_points(x, y):
     """
     Assure that the provided points have the correct shape and type.
@@ -18,17 +18,31 @@ void dgemm(char*, char*, int*, int*, int*, double*, double*, int*, double*, int*
 #include "order_logic.h"
 #include "affine.c"
 #include "diagonal_multiply.c"
+#include "direct_evaluation.c"
 
 #include "ref_values.c"
 #include "ref_gradients.c"
 #include "ref_hessians.c"
+#include "ref_third_derivatives.c"
+#include "ref_all.c"
 
 #include "physical_maps.c"
 #include "physical_values.c"
 #include "physical_gradients.c"
 #include "physical_hessians.c"
+#include "physical_third_derivatives.c"
+#include "physical_all.c"
 
 #include "matrix_mass.c"
 #include "matrix_betaplane.c"
 #include "matrix_stiffness.c"
 #include "matrix_biharmonic.c"
+
+#include "matrix_mass_stabilized.c"
+#include "matrix_betaplane_stabilized.c"
+#include "matrix_stiffness_stabilized.c"
+#include "matrix_biharmonic_stabilized.c"
+
+#include "sparse_triangular_solve.c"
+#include "qg_jacobian.c"
+#include "gather_scatter.c"
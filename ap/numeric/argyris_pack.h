@@ -18,6 +18,16 @@ void ap_ref_hessians(double* restrict x, double* restrict y,
                      LAPACKINDEX num_points, double* restrict ref_dxx,
                      double* restrict ref_dxy, double* restrict ref_dyy);
 
+void ap_ref_third_derivatives(double* restrict x, double* restrict y,
+                              LAPACKINDEX num_points,
+                              double* restrict ref_dxxx,
+                              double* restrict ref_dxxy,
+                              double* restrict ref_dxyy,
+                              double* restrict ref_dyyy);
+
+void ap_ref_all(double* restrict x, double* restrict y, LAPACKINDEX num_points,
+                double* restrict ref_all);
+
 void ap_physical_maps(double* restrict x, double* restrict y,
                       double* restrict C, double* restrict B,
                       double* restrict b);
@@ -36,6 +46,21 @@ void ap_physical_hessians(double* restrict C, double* restrict B,
                           double* restrict dxx, double* restrict dxy,
                           double* restrict dyy);
 
+void ap_physical_third_derivatives(double* restrict C, double* restrict B,
+                                   double* restrict ref_dxxx,
+                                   double* restrict ref_dxxy,
+                                   double* restrict ref_dxyy,
+                                   double* restrict ref_dyyy,
+                                   LAPACKINDEX num_points,
+                                   double* restrict dxxx,
+                                   double* restrict dxxy,
+                                   double* restrict dxyy,
+                                   double* restrict dyyy);
+
+void ap_physical_all(double* restrict C, double* restrict B,
+                     double* restrict ref_all, LAPACKINDEX num_points,
+                     double* restrict all);
+
 void ap_matrix_mass(double* restrict C, double* restrict B,
                     double* restrict ref_functions, double* restrict weights,
                     LAPACKINDEX num_points, double* restrict mass);
@@ -56,5 +81,70 @@ void ap_matrix_biharmonic(double* restrict C, double* restrict B,
                           double* restrict ref_dyy, double* restrict weights,
                           LAPACKINDEX num_points, double* restrict biharmonic);
 
+void ap_matrix_mass_stabilized(double* restrict C, double* restrict B,
+                               double* restrict ref_values,
+                               double* restrict ref_dx,
+                               double* restrict ref_dy,
+                               double* restrict weights,
+                               LAPACKINDEX num_points,
+                               double* restrict mass_stabilized);
+
+void ap_matrix_betaplane_stabilized(double* restrict C, double* restrict B,
+                                    double* restrict ref_dx,
+                                    double* restrict ref_dy,
+                                    double* restrict weights,
+                                    LAPACKINDEX num_points,
+                                    double* restrict betaplane_stabilized);
+
+void ap_matrix_stiffness_stabilized(double* restrict C, double* restrict B,
+                                    double* restrict ref_dx,
+                                    double* restrict ref_dy,
+                                    double* restrict ref_dxx,
+                                    double* restrict ref_dxy,
+                                    double* restrict ref_dyy,
+                                    double* restrict weights,
+                                    LAPACKINDEX num_points,
+                                    double* restrict stiffness_stabilized);
+
+void ap_matrix_biharmonic_stabilized(double* restrict C, double* restrict B,
+                                     double* restrict ref_dxx,
+                                     double* restrict ref_dxy,
+                                     double* restrict ref_dyy,
+                                     double* restrict ref_dxxx,
+                                     double* restrict ref_dxxy,
+                                     double* restrict ref_dxyy,
+                                     double* restrict ref_dyyy,
+                                     double* restrict weights,
+                                     LAPACKINDEX num_points,
+                                     double* restrict biharmonic_stabilized);
+
+int ap_sparse_triangular_solve(int* restrict indptr, int* restrict indices,
+                               double* restrict data, const int num_rows,
+                               const int lower, double* restrict x);
+
+void ap_qg_jacobian(double* restrict x, double* restrict y,
+                    int* restrict element_dofs, LAPACKINDEX num_elements,
+                    double* restrict psi,
+                    double* restrict ref_values,
+                    double* restrict ref_dx, double* restrict ref_dy,
+                    double* restrict ref_dxxx, double* restrict ref_dxxy,
+                    double* restrict ref_dxyy, double* restrict ref_dyyy,
+                    double* restrict weights, LAPACKINDEX num_points,
+                    double* restrict residual, double* restrict jacobians);
+
+void ap_gather(int* restrict element_dofs, LAPACKINDEX num_elements,
+               double* restrict fields, LAPACKINDEX num_fields,
+               LAPACKINDEX num_dofs, double* restrict local);
+
+void ap_scatter_add(int* restrict element_dofs, LAPACKINDEX num_elements,
+                    double* restrict local, LAPACKINDEX num_fields,
+                    LAPACKINDEX num_dofs, double* restrict fields);
+
+int ap_gather_evaluate(double* restrict x, double* restrict y,
+                       int* restrict element_dofs, LAPACKINDEX num_elements,
+                       double* restrict fields, LAPACKINDEX num_fields,
+                       LAPACKINDEX num_dofs, double* restrict ref_all,
+                       LAPACKINDEX num_points, double* restrict all);
+
 void multiply_by_diagonal(const int rows, const int cols,
                           double* restrict diagonal, double* restrict matrix);
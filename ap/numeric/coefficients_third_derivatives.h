@@ -0,0 +1,160 @@
+/* GSL-style data file */
+#ifdef USE_ROW_MAJOR
+
+        double coefficients_dxxx[21*6] = {
+                -60, 360, 0, -360, 0, 180,
+                60, -360, 0, 360, 0, -90,
+                0, 0, 0, 0, 0, -90,
+                -36, 192, 0, -180, 0, 6,
+                0, 0, 108, 0, -192, -60,
+                -24, 168, 0, -180, 0, 21,
+                0, 0, 84, 0, -192, -111,
+                0, 0, 0, 0, 0, -81,
+                0, 0, 0, 0, 0, 21,
+                -9, 36, 0, -30, 0, 9,
+                0, 0, 30, 0, -48, -36,
+                0, 0, 0, 0, 0, 6,
+                3, -24, 0, 30, 0, -1.5,
+                0, 0, -18, 0, 48, 21,
+                0, 0, 0, 0, 0, -4.5,
+                0, 0, 0, 0, 0, -7.5,
+                0, 0, 0, 0, 0, 15,
+                0, 0, 0, 0, 0, -1.5,
+                0, 0, -192, 0, 384, 192,
+                0, 0, 0, 0, 0, -96,
+                0, 0, 0, 0, 0, -48*SQRT2
+        };
+
+        double coefficients_dxxy[21*6] = {
+                0, 0, -120, 0, 360, 180,
+                0, 0, 60, 0, -180, -90,
+                0, 0, 60, 0, -180, -90,
+                0, 0, 40, 0, 12, -60,
+                -22, 108, 40, -96, -120, 6,
+                0, 0, -14, 0, 42, 21,
+                -10, 84, 74, -96, -222, -81,
+                0, 0, 74, 0, -162, -111,
+                0, 0, -14, 0, 42, 21,
+                0, 0, -6, 0, 18, 6,
+                -8, 30, 40, -24, -72, -36,
+                0, 0, -6, 0, 12, 9,
+                0, 0, 1, 0, -3, -1.5,
+                2, -18, -14, 24, 42, 15,
+                0, 0, 5, 0, -9, -7.5,
+                0, 0, 5, 0, -15, -4.5,
+                0, 0, -14, 0, 30, 21,
+                0, 0, 1, 0, -3, -1.5,
+                32, -192, -128, 192, 384, 96,
+                0, 0, 128, 0, -192, -192,
+                0, 0, 32*SQRT2, 0, -96*SQRT2, -48*SQRT2
+        };
+
+        double coefficients_dxyy[21*6] = {
+                0, -120, 0, 180, 360, 0,
+                0, 60, 0, -90, -180, 0,
+                0, 60, 0, -90, -180, 0,
+                -22, 40, 108, 6, -120, -96,
+                0, 40, 0, -60, 12, 0,
+                0, -14, 0, 21, 42, 0,
+                0, 74, 0, -111, -162, 0,
+                -10, 74, 84, -81, -222, -96,
+                0, -14, 0, 21, 42, 0,
+                0, -6, 0, 9, 12, 0,
+                -8, 40, 30, -36, -72, -24,
+                0, -6, 0, 6, 18, 0,
+                0, 1, 0, -1.5, -3, 0,
+                0, -14, 0, 21, 30, 0,
+                0, 5, 0, -4.5, -15, 0,
+                0, 5, 0, -7.5, -9, 0,
+                2, -14, -18, 15, 42, 24,
+                0, 1, 0, -1.5, -3, 0,
+                0, -128, 0, 192, 192, 0,
+                -32, 128, 192, -96, -384, -192,
+                0, 32*SQRT2, 0, -48*SQRT2, -96*SQRT2, 0
+        };
+
+        double coefficients_dyyy[21*6] = {
+                -60, 0, 360, 180, 0, -360,
+                0, 0, 0, -90, 0, 0,
+                60, 0, -360, -90, 0, 360,
+                0, 108, 0, -60, -192, 0,
+                -36, 0, 192, 6, 0, -180,
+                0, 0, 0, 21, 0, 0,
+                0, 0, 0, -81, 0, 0,
+                0, 84, 0, -111, -192, 0,
+                -24, 0, 168, 21, 0, -180,
+                0, 0, 0, 6, 0, 0,
+                0, 30, 0, -36, -48, 0,
+                -9, 0, 36, 9, 0, -30,
+                0, 0, 0, -1.5, 0, 0,
+                0, 0, 0, 15, 0, 0,
+                0, 0, 0, -7.5, 0, 0,
+                0, 0, 0, -4.5, 0, 0,
+                0, -18, 0, 21, 48, 0,
+                3, 0, -24, -1.5, 0, 30,
+                0, 0, 0, 96, 0, 0,
+                0, 192, 0, -192, -384, 0,
+                0, 0, 0, -48*SQRT2, 0, 0
+        };
+#else
+
+        double coefficients_dxxx[21*6] = {
+                -60, 60, 0, -36, 0, -24, 0, 0, 0, -9, 0, 0, 3, 0, 0, 0, 0, 0,
+                0, 0, 0,
+                360, -360, 0, 192, 0, 168, 0, 0, 0, 36, 0, 0, -24, 0, 0, 0, 0,
+                0, 0, 0, 0,
+                0, 0, 0, 0, 108, 0, 84, 0, 0, 0, 30, 0, 0, -18, 0, 0, 0, 0,
+                -192, 0, 0,
+                -360, 360, 0, -180, 0, -180, 0, 0, 0, -30, 0, 0, 30, 0, 0, 0,
+                0, 0, 0, 0, 0,
+                0, 0, 0, 0, -192, 0, -192, 0, 0, 0, -48, 0, 0, 48, 0, 0, 0, 0,
+                384, 0, 0,
+                180, -90, -90, 6, -60, 21, -111, -81, 21, 9, -36, 6, -1.5, 21,
+                -4.5, -7.5, 15, -1.5, 192, -96, -48*SQRT2
+        };
+
+        double coefficients_dxxy[21*6] = {
+                0, 0, 0, 0, -22, 0, -10, 0, 0, 0, -8, 0, 0, 2, 0, 0, 0, 0, 32,
+                0, 0,
+                0, 0, 0, 0, 108, 0, 84, 0, 0, 0, 30, 0, 0, -18, 0, 0, 0, 0,
+                -192, 0, 0,
+                -120, 60, 60, 40, 40, -14, 74, 74, -14, -6, 40, -6, 1, -14, 5,
+                5, -14, 1, -128, 128, 32*SQRT2,
+                0, 0, 0, 0, -96, 0, -96, 0, 0, 0, -24, 0, 0, 24, 0, 0, 0, 0,
+                192, 0, 0,
+                360, -180, -180, 12, -120, 42, -222, -162, 42, 18, -72, 12, -3,
+                42, -9, -15, 30, -3, 384, -192, -96*SQRT2,
+                180, -90, -90, -60, 6, 21, -81, -111, 21, 6, -36, 9, -1.5, 15,
+                -7.5, -4.5, 21, -1.5, 96, -192, -48*SQRT2
+        };
+
+        double coefficients_dxyy[21*6] = {
+                0, 0, 0, -22, 0, 0, 0, -10, 0, 0, -8, 0, 0, 0, 0, 0, 2, 0, 0,
+                -32, 0,
+                -120, 60, 60, 40, 40, -14, 74, 74, -14, -6, 40, -6, 1, -14, 5,
+                5, -14, 1, -128, 128, 32*SQRT2,
+                0, 0, 0, 108, 0, 0, 0, 84, 0, 0, 30, 0, 0, 0, 0, 0, -18, 0, 0,
+                192, 0,
+                180, -90, -90, 6, -60, 21, -111, -81, 21, 9, -36, 6, -1.5, 21,
+                -4.5, -7.5, 15, -1.5, 192, -96, -48*SQRT2,
+                360, -180, -180, -120, 12, 42, -162, -222, 42, 12, -72, 18, -3,
+                30, -15, -9, 42, -3, 192, -384, -96*SQRT2,
+                0, 0, 0, -96, 0, 0, 0, -96, 0, 0, -24, 0, 0, 0, 0, 0, 24, 0, 0,
+                -192, 0
+        };
+
+        double coefficients_dyyy[21*6] = {
+                -60, 0, 60, 0, -36, 0, 0, 0, -24, 0, 0, -9, 0, 0, 0, 0, 0, 3,
+                0, 0, 0,
+                0, 0, 0, 108, 0, 0, 0, 84, 0, 0, 30, 0, 0, 0, 0, 0, -18, 0, 0,
+                192, 0,
+                360, 0, -360, 0, 192, 0, 0, 0, 168, 0, 0, 36, 0, 0, 0, 0, 0,
+                -24, 0, 0, 0,
+                180, -90, -90, -60, 6, 21, -81, -111, 21, 6, -36, 9, -1.5, 15,
+                -7.5, -4.5, 21, -1.5, 96, -192, -48*SQRT2,
+                0, 0, 0, -192, 0, 0, 0, -192, 0, 0, -48, 0, 0, 0, 0, 0, 48, 0,
+                0, -384, 0,
+                -360, 0, 360, 0, -180, 0, 0, 0, -180, 0, 0, -30, 0, 0, 0, 0, 0,
+                30, 0, 0, 0
+        };
+#endif
@@ -0,0 +1,103 @@
+/*
+ * Above this many points the ref_* functions evaluate the basis functions
+ * directly (see ap_direct_evaluation) instead of multiplying a table of
+ * monomials by the coefficients. Define AP_DIRECT_THRESHOLD at compile time
+ * to change it.
+ */
+#ifndef AP_DIRECT_THRESHOLD
+#define AP_DIRECT_THRESHOLD 4096
+#endif
+const int ap_direct_threshold = AP_DIRECT_THRESHOLD;
+
+/*
+ * Points are evaluated in blocks (whose 21 rows of output fit in L1 cache)
+ * and, within a block, in groups of AP_DIRECT_LANES which the compiler keeps
+ * in (vector) registers.
+ */
+#define AP_DIRECT_BLOCK 64
+#define AP_DIRECT_LANES 8
+
+static inline void ap_direct_evaluation(double* restrict coefficients,
+                                        const int degree,
+                                        double* restrict x,
+                                        double* restrict y,
+                                        LAPACKINDEX num_points,
+                                        double* restrict out)
+{
+/*
+ * Evaluate 21 bivariate polynomials of the given degree (at most five) at
+ * every point. Row i of coefficients holds the coefficients of polynomial i
+ * in the monomial basis 1, x, y, x^2, x*y, y^2, ... (as in the
+ * coefficients_*.h tables). Each polynomial is written as
+ *
+ *     q_0(y) + x*(q_1(y) + x*(q_2(y) + ...))
+ *
+ * with each q_a also in Horner form, so evaluating it at one point costs one
+ * multiplication and one addition per monomial. No temporary grows with the
+ * number of points.
+ */
+        double table[21][6][6];
+        double value[AP_DIRECT_LANES];
+        double inner[AP_DIRECT_LANES];
+        int i, j, k, a, b, start, end;
+
+        /* table[i][a][b] is the coefficient of x^a y^b in polynomial i. */
+        for (i = 0; i < 21; i++) {
+                for (a = 0; a <= degree; a++) {
+                        for (b = 0; a + b <= degree; b++) {
+                                table[i][a][b] = coefficients[ORDER(
+                                        i, (a + b)*(a + b + 1)/2 + b, 21,
+                                        (degree + 1)*(degree + 2)/2)];
+                        }
+                }
+        }
+
+        for (start = 0; start < num_points; start += AP_DIRECT_BLOCK) {
+                end = start + AP_DIRECT_BLOCK < num_points ?
+                      start + AP_DIRECT_BLOCK : num_points;
+                for (i = 0; i < 21; i++) {
+                        for (j = start; j + AP_DIRECT_LANES <= end;
+                             j += AP_DIRECT_LANES) {
+                                for (k = 0; k < AP_DIRECT_LANES; k++) {
+                                        value[k] = 0.0;
+                                }
+                                for (a = degree; a >= 0; a--) {
+                                        for (k = 0; k < AP_DIRECT_LANES; k++) {
+                                                inner[k] =
+                                                    table[i][a][degree - a];
+                                        }
+                                        for (b = degree - a - 1; b >= 0; b--) {
+                                                for (k = 0;
+                                                     k < AP_DIRECT_LANES;
+                                                     k++) {
+                                                        inner[k] =
+                                                            inner[k]*y[j + k]
+                                                          + table[i][a][b];
+                                                }
+                                        }
+                                        for (k = 0; k < AP_DIRECT_LANES; k++) {
+                                                value[k] = value[k]*x[j + k]
+                                                         + inner[k];
+                                        }
+                                }
+                                for (k = 0; k < AP_DIRECT_LANES; k++) {
+                                        out[ORDER(i, j + k, 21, num_points)] =
+                                                value[k];
+                                }
+                        }
+                        /* points left over at the end of the last block. */
+                        for (; j < end; j++) {
+                                value[0] = 0.0;
+                                for (a = degree; a >= 0; a--) {
+                                        inner[0] = 0.0;
+                                        for (b = degree - a; b >= 0; b--) {
+                                                inner[0] = inner[0]*y[j]
+                                                         + table[i][a][b];
+                                        }
+                                        value[0] = value[0]*x[j] + inner[0];
+                                }
+                                out[ORDER(i, j, 21, num_points)] = value[0];
+                        }
+                }
+        }
+}
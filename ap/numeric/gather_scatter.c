@@ -0,0 +1,197 @@
+void ap_gather(int* restrict element_dofs, LAPACKINDEX num_elements,
+               double* restrict fields, LAPACKINDEX num_fields,
+               LAPACKINDEX num_dofs, double* restrict local)
+{
+/*
+ * Copy the coefficients of every element out of one or more global vectors:
+ * fields is a (num_fields, num_dofs) array, element_dofs holds the
+ * (num_elements, 21) zero-based degrees of freedom of the elements, and
+ * local receives the (num_fields*num_elements, 21) array whose row
+ * f*num_elements + e holds the coefficients of field f on element e.
+ */
+        int field, element, j;
+
+        /* num_dofs only enters ORDER in row-major storage. */
+        (void) num_dofs;
+
+        for (field = 0; field < num_fields; field++) {
+                for (element = 0; element < num_elements; element++) {
+                        const int row = field*num_elements + element;
+                        for (j = 0; j < 21; j++) {
+                                const int dof = element_dofs[
+                                        ORDER(element, j, num_elements, 21)];
+                                local[ORDER(row, j, num_fields*num_elements,
+                                            21)] =
+                                        fields[ORDER(field, dof, num_fields,
+                                                     num_dofs)];
+                        }
+                }
+        }
+}
+
+void ap_scatter_add(int* restrict element_dofs, LAPACKINDEX num_elements,
+                    double* restrict local, LAPACKINDEX num_fields,
+                    LAPACKINDEX num_dofs, double* restrict fields)
+{
+/*
+ * The transpose of ap_gather: add every row of local (laid out as in
+ * ap_gather) to the entries of its field given by element_dofs.
+ */
+        int field, element, j;
+
+        /* num_dofs only enters ORDER in row-major storage. */
+        (void) num_dofs;
+
+        for (field = 0; field < num_fields; field++) {
+                for (element = 0; element < num_elements; element++) {
+                        const int row = field*num_elements + element;
+                        for (j = 0; j < 21; j++) {
+                                const int dof = element_dofs[
+                                        ORDER(element, j, num_elements, 21)];
+                                fields[ORDER(field, dof, num_fields,
+                                             num_dofs)] +=
+                                        local[ORDER(row, j,
+                                                    num_fields*num_elements,
+                                                    21)];
+                        }
+                }
+        }
+}
+
+int ap_gather_evaluate(double* restrict x, double* restrict y,
+                       int* restrict element_dofs, LAPACKINDEX num_elements,
+                       double* restrict fields, LAPACKINDEX num_fields,
+                       LAPACKINDEX num_dofs, double* restrict ref_all,
+                       LAPACKINDEX num_points, double* restrict all)
+{
+/*
+ * Gather one or more fields (as in ap_gather) and evaluate them, and their
+ * first and second derivatives, at the quadrature points of every element
+ * without forming the physical basis functions. x and y are the
+ * (num_elements, 3) corner coordinates and ref_all the six reference tables
+ * computed by ap_ref_all. all receives a (6*num_fields*num_elements,
+ * num_points) array: row (k*num_fields + f)*num_elements + e holds table k
+ * (values, dx, dy, dxx, dxy, dyy) of field f on element e.
+ *
+ * On each element the coefficients of all fields are mapped to the
+ * reference basis with one DGEMM by C^T and then multiplied by each
+ * reference table, so the cost per element is about
+ * 21*num_fields*(21 + 6*num_points) multiplications instead of the
+ * 6*21*21*num_points needed to build the physical tables first. The
+ * temporary arrays (of 21*num_fields*2 + 6*num_fields*num_points doubles)
+ * are allocated once per call on the heap. Return 0 on success and -1 if
+ * they could not be allocated, in which case all is not touched.
+ */
+        int element, field, i, j, k;
+        double corner_x[3], corner_y[3];
+        double C[21*21], B[2*2], b[2];
+        double gradient_map[2][2], hessian_map[3][3];
+        double *coefficients, *reference, *tables;
+        const int size = 21*num_points;
+        const int table_size = num_fields*num_points;
+        double B_det_inv, B_inv00, B_inv01, B_inv10, B_inv11;
+
+        /* stuff for DGEMM */
+        LAPACKINDEX i_twentyone = 21;
+
+        /* num_dofs only enters ORDER in row-major storage. */
+        (void) num_dofs;
+
+        coefficients = malloc(sizeof(double)*(size_t) num_fields
+                              *(42 + 6*(size_t) num_points));
+        if (coefficients == NULL) {
+                return -1;
+        }
+        reference = coefficients + 21*num_fields;
+        tables = reference + 21*num_fields;
+
+        for (element = 0; element < num_elements; element++) {
+                for (k = 0; k < 3; k++) {
+                        corner_x[k] = x[ORDER(element, k, num_elements, 3)];
+                        corner_y[k] = y[ORDER(element, k, num_elements, 3)];
+                }
+                ap_physical_maps(corner_x, corner_y, C, B, b);
+
+                /* See physical_all.c. */
+                B_det_inv = 1/(B[ORDER(0, 0, 2, 2)]*B[ORDER(1, 1, 2, 2)] -
+                               B[ORDER(0, 1, 2, 2)]*B[ORDER(1, 0, 2, 2)]);
+                B_inv00 = B_det_inv*B[ORDER(1, 1, 2, 2)];
+                B_inv01 = -B_det_inv*B[ORDER(0, 1, 2, 2)];
+                B_inv10 = -B_det_inv*B[ORDER(1, 0, 2, 2)];
+                B_inv11 = B_det_inv*B[ORDER(0, 0, 2, 2)];
+
+                gradient_map[0][0] = B_inv00;
+                gradient_map[0][1] = B_inv10;
+                gradient_map[1][0] = B_inv01;
+                gradient_map[1][1] = B_inv11;
+
+                hessian_map[0][0] = B_inv00*B_inv00;
+                hessian_map[0][1] = 2.0*B_inv00*B_inv10;
+                hessian_map[0][2] = B_inv10*B_inv10;
+                hessian_map[1][0] = B_inv00*B_inv01;
+                hessian_map[1][1] = B_inv00*B_inv11 + B_inv01*B_inv10;
+                hessian_map[1][2] = B_inv10*B_inv11;
+                hessian_map[2][0] = B_inv01*B_inv01;
+                hessian_map[2][1] = 2.0*B_inv01*B_inv11;
+                hessian_map[2][2] = B_inv11*B_inv11;
+
+                /* the (21, num_fields) coefficients in the reference basis. */
+                for (j = 0; j < 21; j++) {
+                        const int dof = element_dofs[ORDER(element, j,
+                                                           num_elements, 21)];
+                        for (field = 0; field < num_fields; field++) {
+                                coefficients[ORDER(j, field, 21, num_fields)]
+                                        = fields[ORDER(field, dof, num_fields,
+                                                       num_dofs)];
+                        }
+                }
+                DGEMM_WRAPPER_TN(i_twentyone, num_fields, i_twentyone, C,
+                                 coefficients, reference);
+
+                /* the six (num_fields, num_points) reference tables. */
+                for (k = 0; k < 6; k++) {
+                        DGEMM_WRAPPER_TN(num_fields, num_points, i_twentyone,
+                                         reference, ref_all + k*size,
+                                         tables + k*table_size);
+                }
+
+                /* map them to physical derivatives. */
+                for (field = 0; field < num_fields; field++) {
+                        for (i = 0; i < num_points; i++) {
+                                const int point = ORDER(field, i, num_fields,
+                                                        num_points);
+                                const double ref_field[6] = {
+                                        tables[point],
+                                        tables[point + table_size],
+                                        tables[point + 2*table_size],
+                                        tables[point + 3*table_size],
+                                        tables[point + 4*table_size],
+                                        tables[point + 5*table_size]};
+                                double result[6];
+
+                                result[0] = ref_field[0];
+                                for (k = 0; k < 2; k++) {
+                                        result[1 + k] =
+                                            gradient_map[k][0]*ref_field[1]
+                                          + gradient_map[k][1]*ref_field[2];
+                                }
+                                for (k = 0; k < 3; k++) {
+                                        result[3 + k] =
+                                            hessian_map[k][0]*ref_field[3]
+                                          + hessian_map[k][1]*ref_field[4]
+                                          + hessian_map[k][2]*ref_field[5];
+                                }
+                                for (k = 0; k < 6; k++) {
+                                        const int row = (k*num_fields + field)
+                                                *num_elements + element;
+                                        all[ORDER(row, i, 6*num_fields
+                                                  *num_elements, num_points)]
+                                                = result[k];
+                                }
+                        }
+                }
+        }
+
+        free(coefficients);
+        return 0;
+}
@@ -0,0 +1,169 @@
+#! /usr/bin/env python
+"""
+Generate the tables of coefficients of derivatives of the reference Argyris
+basis functions (the GSL-style data files included by the ref_*.c kernels)
+by differentiating the table in coefficients_values.h exactly.
+
+Row i of a table holds the coefficients of basis function i in the monomial
+basis 1, x, y, x^2, x*y, y^2, x^3, ... (ordered by degree and then by
+decreasing powers of x). Entries are rational multiples of either one or
+SQRT2, so differentiation loses nothing. Regenerate the third derivative
+tables with
+
+    python ap/numeric/generate_coefficients.py
+
+from the root of the repository.
+"""
+import fractions
+import os
+import re
+
+_NUMERIC_PATH = os.path.dirname(os.path.abspath(__file__))
+
+
+def monomial_index(x_power, y_power):
+    """Position of x**x_power*y**y_power in the monomial basis."""
+    degree = x_power + y_power
+    return degree*(degree + 1)//2 + y_power
+
+
+def monomial_powers(num_monomials):
+    """List of the (x power, y power) pairs of the first monomials."""
+    powers = []
+    degree = 0
+    while len(powers) < num_monomials:
+        powers.extend((degree - y_power, y_power)
+                      for y_power in range(degree + 1))
+        degree += 1
+    return powers[0:num_monomials]
+
+
+def _parse_entry(entry):
+    """
+    Parse an entry like '-24*SQRT2' or '0.5' in to the tuple (rational
+    multiplier, power of SQRT2).
+    """
+    if entry.endswith('*SQRT2'):
+        return (fractions.Fraction(entry[0:-len('*SQRT2')]), 1)
+    return (fractions.Fraction(entry), 0)
+
+
+def read_table(file_name, name, num_monomials):
+    """
+    Read the row-major table called name from a GSL-style data file. Return
+    a list of 21 rows of (rational multiplier, power of SQRT2) tuples.
+    """
+    with open(file_name) as data_file:
+        contents = data_file.read()
+    row_major = contents.split('#else')[0]
+    match = re.search(r'\b' + name + r'\[[^]]*\]\s*=\s*\{([^}]*)\}',
+                      row_major)
+    if match is None:
+        raise ValueError("No table named " + name + " in " + file_name)
+    entries = [_parse_entry(entry.strip())
+               for entry in match.group(1).split(',')]
+    if len(entries) != 21*num_monomials:
+        raise ValueError("The table " + name + " should have "
+                         + str(21*num_monomials) + " entries")
+    return [entries[row*num_monomials:(row + 1)*num_monomials]
+            for row in range(21)]
+
+
+def differentiate(table, x_order, y_order):
+    """
+    Differentiate every row of a table x_order times in x and y_order times
+    in y. The result has one coefficient for each monomial of degree at
+    most (original degree - x_order - y_order).
+    """
+    powers = monomial_powers(len(table[0]))
+    degree = max(x_power + y_power for (x_power, y_power) in powers)
+    num_monomials = monomial_index(0, degree - x_order - y_order) + 1
+    derivative = []
+    for row in table:
+        new_row = [(fractions.Fraction(0), 0)]*num_monomials
+        for (x_power, y_power), (multiplier, sqrt2_power) in zip(powers, row):
+            if x_power < x_order or y_power < y_order or multiplier == 0:
+                continue
+            factor = 1
+            for power in range(x_order):
+                factor *= x_power - power
+            for power in range(y_order):
+                factor *= y_power - power
+            new_row[monomial_index(x_power - x_order, y_power - y_order)] = \
+                (factor*multiplier, sqrt2_power)
+        derivative.append(new_row)
+    return derivative
+
+
+def _format_entry(entry):
+    """Write an entry in the style of the existing data files."""
+    (multiplier, sqrt2_power) = entry
+    if multiplier.denominator == 1:
+        text = str(multiplier.numerator)
+    else:
+        text = repr(float(multiplier))
+        if fractions.Fraction(text) != multiplier:
+            raise ValueError("Entries must be exact in floating point")
+    if sqrt2_power == 1 and multiplier != 0:
+        text += '*SQRT2'
+    return text
+
+
+def _format_block(name, entries, num_rows, num_columns):
+    """Format a C array definition, one row per group of lines."""
+    lines = ["        double {0}[{1}*{2}] = {{".format(
+        name, *sorted([num_rows, num_columns], reverse=True))]
+    for row in range(num_rows):
+        texts = [_format_entry(entry) + ','
+                 for entry in entries[row*num_columns:(row + 1)*num_columns]]
+        line = " "*15
+        for text in texts:
+            if len(line) + len(text) + 1 > 79:
+                lines.append(line)
+                line = " "*15
+            line += " " + text
+        lines.append(line)
+    lines[-1] = lines[-1][0:-1]
+    lines.append("        };")
+    return lines
+
+
+def format_tables(tables):
+    """
+    Format the (name, table) pairs as a GSL-style data file with both row
+    and column major versions of every table.
+    """
+    lines = ["/* GSL-style data file */", "#ifdef USE_ROW_MAJOR", ""]
+    for (name, table) in tables:
+        num_columns = len(table[0])
+        lines.extend(_format_block(name, [entry for row in table
+                                          for entry in row],
+                                   21, num_columns))
+        lines.append("")
+    lines[-1] = "#else"
+    lines.append("")
+    for (name, table) in tables:
+        num_columns = len(table[0])
+        lines.extend(_format_block(name, [table[row][column]
+                                          for column in range(num_columns)
+                                          for row in range(21)],
+                                   num_columns, 21))
+        lines.append("")
+    lines[-1] = "#endif"
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    values = read_table(os.path.join(_NUMERIC_PATH, "coefficients_values.h"),
+                        "coefficients", 21)
+    tables = [("coefficients_dxxx", differentiate(values, 3, 0)),
+              ("coefficients_dxxy", differentiate(values, 2, 1)),
+              ("coefficients_dxyy", differentiate(values, 1, 2)),
+              ("coefficients_dyyy", differentiate(values, 0, 3))]
+    with open(os.path.join(_NUMERIC_PATH,
+                           "coefficients_third_derivatives.h"), 'w') as out:
+        out.write(format_tables(tables))
+
+
+if __name__ == '__main__':
+    main()
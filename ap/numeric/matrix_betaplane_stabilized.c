@@ -0,0 +1,37 @@
+void ap_matrix_betaplane_stabilized(double* restrict C, double* restrict B,
+                                    double* restrict ref_dx,
+                                    double* restrict ref_dy,
+                                    double* restrict weights,
+                                    LAPACKINDEX num_points,
+                                    double* restrict betaplane_stabilized)
+{
+        int i;
+        double dx[21*num_points];
+        double dx_scaled[21*num_points];
+        double dy[21*num_points];
+        double weights_scaled[num_points];
+
+        /* stuff for DGEMM. */
+        LAPACKINDEX i_twentyone = 21;
+
+        const double jacobian = fabs(B[ORDER(0, 0, 2, 2)]*B[ORDER(1, 1, 2, 2)] -
+                                     B[ORDER(0, 1, 2, 2)]*B[ORDER(1, 0, 2, 2)]);
+
+        ap_physical_gradients(C, B, ref_dx, ref_dy, num_points, dx, dy);
+
+        /* scale the weights by the jacobian. */
+        for (i = 0; i < num_points; i++) {
+                weights_scaled[i] = weights[i]*jacobian;
+        }
+
+        memcpy(dx_scaled, dx, sizeof(double)*(21*num_points));
+
+        /*
+         * scale one copy of the x-derivatives by the weights and determinant.
+         * Then perform matrix multiplication, so that entry (i, j) is the
+         * integral of (phi_i)_x (phi_j)_x.
+         */
+        ap_diagonal_multiply(21, num_points, dx_scaled, weights_scaled);
+        DGEMM_WRAPPER_NT(i_twentyone, i_twentyone, num_points, dx_scaled, dx,
+                         betaplane_stabilized);
+}
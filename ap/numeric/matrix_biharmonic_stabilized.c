@@ -0,0 +1,56 @@
+void ap_matrix_biharmonic_stabilized(double* restrict C, double* restrict B,
+                                     double* restrict ref_dxx,
+                                     double* restrict ref_dxy,
+                                     double* restrict ref_dyy,
+                                     double* restrict ref_dxxx,
+                                     double* restrict ref_dxxy,
+                                     double* restrict ref_dxyy,
+                                     double* restrict ref_dyyy,
+                                     double* restrict weights,
+                                     LAPACKINDEX num_points,
+                                     double* restrict biharmonic_stabilized)
+{
+        int i;
+        double dxx[21*num_points];
+        double dxy[21*num_points];
+        double dyy[21*num_points];
+        double dxxx[21*num_points];
+        double dxxy[21*num_points];
+        double dxyy[21*num_points];
+        double dyyy[21*num_points];
+        double weights_scaled[num_points];
+
+        /* stuff for LAPACK */
+        LAPACKINDEX i_twentyone = 21;
+
+        const double jacobian = fabs(B[ORDER(0, 0, 2, 2)]*B[ORDER(1, 1, 2, 2)] -
+                                     B[ORDER(0, 1, 2, 2)]*B[ORDER(1, 0, 2, 2)]);
+
+        ap_physical_hessians(C, B, ref_dxx, ref_dxy, ref_dyy, num_points, dxx,
+                             dxy, dyy);
+        ap_physical_third_derivatives(C, B, ref_dxxx, ref_dxxy, ref_dxyy,
+                                      ref_dyyy, num_points, dxxx, dxxy, dxyy,
+                                      dyyy);
+
+        /*
+         * Reassign dxx to be values of the laplacian and dxxx to be values of
+         * the x-derivative of the laplacian.
+         */
+        for (i = 0; i < 21*num_points; i++) {
+                dxx[i] += dyy[i];
+                dxxx[i] += dxyy[i];
+        }
+
+        for (i = 0; i < num_points; i++) {
+                weights_scaled[i] = weights[i]*jacobian;
+        }
+
+        /*
+         * Scale the derivatives of the laplacian by the weights (themselves
+         * scaled by the Jacobian) and then calculate the matrix of inner
+         * products.
+         */
+        ap_diagonal_multiply(21, num_points, dxxx, weights_scaled);
+        DGEMM_WRAPPER_NT(i_twentyone, i_twentyone, num_points, dxxx, dxx,
+                         biharmonic_stabilized);
+}
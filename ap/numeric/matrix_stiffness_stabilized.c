@@ -0,0 +1,45 @@
+void ap_matrix_stiffness_stabilized(double* restrict C, double* restrict B,
+                                    double* restrict ref_dx,
+                                    double* restrict ref_dy,
+                                    double* restrict ref_dxx,
+                                    double* restrict ref_dxy,
+                                    double* restrict ref_dyy,
+                                    double* restrict weights,
+                                    LAPACKINDEX num_points,
+                                    double* restrict stiffness_stabilized)
+{
+        int i;
+        double dx[21*num_points];
+        double dy[21*num_points];
+        double dxx[21*num_points];
+        double dxy[21*num_points];
+        double dyy[21*num_points];
+        double weights_scaled[num_points];
+
+        /* stuff for DGEMM. */
+        LAPACKINDEX i_twentyone = 21;
+
+        const double jacobian = fabs(B[ORDER(0, 0, 2, 2)]*B[ORDER(1, 1, 2, 2)] -
+                                     B[ORDER(0, 1, 2, 2)]*B[ORDER(1, 0, 2, 2)]);
+
+        ap_physical_gradients(C, B, ref_dx, ref_dy, num_points, dx, dy);
+        ap_physical_hessians(C, B, ref_dxx, ref_dxy, ref_dyy, num_points, dxx,
+                             dxy, dyy);
+
+        /* scale the weights by the jacobian. */
+        for (i = 0; i < num_points; i++) {
+                weights_scaled[i] = weights[i]*jacobian;
+        }
+
+        /*
+         * scale the second derivatives by the weights and determinant. Then
+         * perform matrix multiplication, so that entry (i, j) is the integral
+         * of (phi_i)_xx (phi_j)_x + (phi_i)_xy (phi_j)_y.
+         */
+        ap_diagonal_multiply(21, num_points, dxx, weights_scaled);
+        ap_diagonal_multiply(21, num_points, dxy, weights_scaled);
+        DGEMM_WRAPPER_NT(i_twentyone, i_twentyone, num_points, dxx, dx,
+                         stiffness_stabilized);
+        DGEMM_WRAPPER_NT_ADD_C(i_twentyone, i_twentyone, num_points, dxy, dy,
+                               stiffness_stabilized);
+}
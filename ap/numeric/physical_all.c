@@ -0,0 +1,58 @@
+void ap_physical_all(double* restrict C, double* restrict B,
+                     double* restrict ref_all, LAPACKINDEX num_points,
+                     double* restrict all)
+{
+        double unmapped[21*num_points];
+        const int size = 21*num_points;
+        int i, k;
+
+        /* stuff for DGEMM */
+        LAPACKINDEX i_twentyone = 21;
+
+        /* the six tables of ref_all (see ref_all.c). */
+        double* ref_dx = ref_all + size;
+        double* ref_dy = ref_all + 2*size;
+        double* ref_dxx = ref_all + 3*size;
+        double* ref_dxy = ref_all + 4*size;
+        double* ref_dyy = ref_all + 5*size;
+
+        /* See physical_gradients.c and physical_hessians.c. */
+        const double B_det_inv = 1/(B[ORDER(0, 0, 2, 2)]*B[ORDER(1, 1, 2, 2)] -
+                                    B[ORDER(0, 1, 2, 2)]*B[ORDER(1, 0, 2, 2)]);
+
+        const double B_inv00 = B_det_inv*B[ORDER(1, 1, 2, 2)];
+        const double B_inv01 = -B_det_inv*B[ORDER(0, 1, 2, 2)];
+        const double B_inv10 = -B_det_inv*B[ORDER(1, 0, 2, 2)];
+        const double B_inv11 = B_det_inv*B[ORDER(0, 0, 2, 2)];
+
+        const double gradient_map[2][2] = {{B_inv00, B_inv10},
+                                           {B_inv01, B_inv11}};
+        const double hessian_map[3][3] = {
+                {B_inv00*B_inv00, 2.0*B_inv00*B_inv10, B_inv10*B_inv10},
+                {B_inv00*B_inv01, B_inv00*B_inv11 + B_inv01*B_inv10,
+                 B_inv10*B_inv11},
+                {B_inv01*B_inv01, 2.0*B_inv01*B_inv11, B_inv11*B_inv11}};
+
+        /*
+         * Map each table to physical derivatives (without C) in turn and then
+         * multiply it by C, so that only one temporary table is needed.
+         */
+        for (k = 0; k < 6; k++) {
+                if (k == 0) {
+                        memcpy(unmapped, ref_all, sizeof(double)*size);
+                } else if (k < 3) {
+                        for (i = 0; i < size; i++) {
+                                unmapped[i] = gradient_map[k - 1][0]*ref_dx[i]
+                                            + gradient_map[k - 1][1]*ref_dy[i];
+                        }
+                } else {
+                        for (i = 0; i < size; i++) {
+                                unmapped[i] = hessian_map[k - 3][0]*ref_dxx[i]
+                                            + hessian_map[k - 3][1]*ref_dxy[i]
+                                            + hessian_map[k - 3][2]*ref_dyy[i];
+                        }
+                }
+                DGEMM_WRAPPER(i_twentyone, num_points, i_twentyone, C,
+                              unmapped, all + k*size);
+        }
+}
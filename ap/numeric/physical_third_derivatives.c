@@ -0,0 +1,91 @@
+static inline void ap_third_derivative_map(double* restrict B,
+                                           double map[4][4])
+{
+/*
+ * By the chain rule d/dx = B_inv00 d/dxi + B_inv10 d/deta and
+ * d/dy = B_inv01 d/dxi + B_inv11 d/deta. Expanding the products of three such
+ * operators gives a 4x4 matrix (the third order analogue of Theta in
+ * physical_hessians.c): row k of map holds the coefficients of the reference
+ * derivatives (xxx, xxy, xyy, yyy) in the k-th physical derivative.
+ */
+        const double B_det_inv = 1/(B[ORDER(0, 0, 2, 2)]*B[ORDER(1, 1, 2, 2)] -
+                                    B[ORDER(0, 1, 2, 2)]*B[ORDER(1, 0, 2, 2)]);
+
+        const double B_inv00 = B_det_inv*B[ORDER(1, 1, 2, 2)];
+        const double B_inv01 = -B_det_inv*B[ORDER(0, 1, 2, 2)];
+        const double B_inv10 = -B_det_inv*B[ORDER(1, 0, 2, 2)];
+        const double B_inv11 = B_det_inv*B[ORDER(0, 0, 2, 2)];
+
+        map[0][0] = B_inv00*B_inv00*B_inv00;
+        map[0][1] = 3.0*B_inv00*B_inv00*B_inv10;
+        map[0][2] = 3.0*B_inv00*B_inv10*B_inv10;
+        map[0][3] = B_inv10*B_inv10*B_inv10;
+
+        map[1][0] = B_inv00*B_inv00*B_inv01;
+        map[1][1] = B_inv00*B_inv00*B_inv11 + 2.0*B_inv00*B_inv01*B_inv10;
+        map[1][2] = 2.0*B_inv00*B_inv10*B_inv11 + B_inv01*B_inv10*B_inv10;
+        map[1][3] = B_inv10*B_inv10*B_inv11;
+
+        map[2][0] = B_inv00*B_inv01*B_inv01;
+        map[2][1] = 2.0*B_inv00*B_inv01*B_inv11 + B_inv01*B_inv01*B_inv10;
+        map[2][2] = B_inv00*B_inv11*B_inv11 + 2.0*B_inv01*B_inv10*B_inv11;
+        map[2][3] = B_inv10*B_inv11*B_inv11;
+
+        map[3][0] = B_inv01*B_inv01*B_inv01;
+        map[3][1] = 3.0*B_inv01*B_inv01*B_inv11;
+        map[3][2] = 3.0*B_inv01*B_inv11*B_inv11;
+        map[3][3] = B_inv11*B_inv11*B_inv11;
+}
+
+void ap_physical_third_derivatives(double* restrict C, double* restrict B,
+                                   double* restrict ref_dxxx,
+                                   double* restrict ref_dxxy,
+                                   double* restrict ref_dxyy,
+                                   double* restrict ref_dyyy,
+                                   LAPACKINDEX num_points,
+                                   double* restrict dxxx,
+                                   double* restrict dxxy,
+                                   double* restrict dxyy,
+                                   double* restrict dyyy)
+{
+        double dxxx_unmapped[21*num_points];
+        double dxxy_unmapped[21*num_points];
+        double dxyy_unmapped[21*num_points];
+        double dyyy_unmapped[21*num_points];
+        int i;
+
+        /* stuff for DGEMM */
+        LAPACKINDEX i_twentyone = 21;
+
+        double map[4][4];
+        ap_third_derivative_map(B, map);
+
+        for (i = 0; i < i_twentyone*num_points; i++) {
+                dxxx_unmapped[i] = ref_dxxx[i]*map[0][0]
+                                 + ref_dxxy[i]*map[0][1]
+                                 + ref_dxyy[i]*map[0][2]
+                                 + ref_dyyy[i]*map[0][3];
+                dxxy_unmapped[i] = ref_dxxx[i]*map[1][0]
+                                 + ref_dxxy[i]*map[1][1]
+                                 + ref_dxyy[i]*map[1][2]
+                                 + ref_dyyy[i]*map[1][3];
+                dxyy_unmapped[i] = ref_dxxx[i]*map[2][0]
+                                 + ref_dxxy[i]*map[2][1]
+                                 + ref_dxyy[i]*map[2][2]
+                                 + ref_dyyy[i]*map[2][3];
+                dyyy_unmapped[i] = ref_dxxx[i]*map[3][0]
+                                 + ref_dxxy[i]*map[3][1]
+                                 + ref_dxyy[i]*map[3][2]
+                                 + ref_dyyy[i]*map[3][3];
+        }
+
+        /* perform the transformation using the C matrix. */
+        DGEMM_WRAPPER(i_twentyone, num_points, i_twentyone, C, dxxx_unmapped,
+                      dxxx);
+        DGEMM_WRAPPER(i_twentyone, num_points, i_twentyone, C, dxxy_unmapped,
+                      dxxy);
+        DGEMM_WRAPPER(i_twentyone, num_points, i_twentyone, C, dxyy_unmapped,
+                      dxyy);
+        DGEMM_WRAPPER(i_twentyone, num_points, i_twentyone, C, dyyy_unmapped,
+                      dyyy);
+}
@@ -0,0 +1,176 @@
+void ap_qg_jacobian(double* restrict x, double* restrict y,
+                    int* restrict element_dofs, LAPACKINDEX num_elements,
+                    double* restrict psi,
+                    double* restrict ref_values,
+                    double* restrict ref_dx, double* restrict ref_dy,
+                    double* restrict ref_dxxx, double* restrict ref_dxxy,
+                    double* restrict ref_dxyy, double* restrict ref_dyyy,
+                    double* restrict weights, LAPACKINDEX num_points,
+                    double* restrict residual, double* restrict jacobians)
+{
+/*
+ * Evaluate the quasi-geostrophic advection term on a whole mesh: add
+ *
+ *     residual[i] += integral of J(psi, laplacian(psi)) phi_i
+ *
+ * to the global residual, where J(a, b) = a_x b_y - a_y b_x. x and y are the
+ * (num_elements, 3) corner coordinates, element_dofs the (num_elements, 21)
+ * zero-based global degrees of freedom of every element, and psi the global
+ * coefficient vector. The reference tables are (21, num_points) arrays at
+ * the quadrature points.
+ *
+ * The residual only needs psi and its derivatives at the quadrature points,
+ * so it is computed without the physical basis functions: psi is C^T c in
+ * the reference basis, and the integrals against the reference functions are
+ * mapped back with C. This costs a few matrix-vector products per element.
+ *
+ * If jacobians is not NULL it receives the num_elements local (21, 21)
+ * matrices of the derivative of the residual with respect to psi, whose
+ * (i, j) entry is the integral of
+ *
+ *     (J(phi_j, laplacian(psi)) + J(psi, laplacian(phi_j))) phi_i,
+ *
+ * which requires the physical basis functions (five DGEMMs per element).
+ */
+        int element, i, j, k, m;
+        double corner_x[3], corner_y[3];
+        double C[21*21], B[2*2], b[2];
+        double coefficients[21], reference[21], projections[21];
+        double map[4][4];
+        double laplacian_x[4], laplacian_y[4];
+        double psi_x[num_points], psi_y[num_points];
+        double lap_x[num_points], lap_y[num_points];
+        double scale[num_points];
+        double ref_field[6];
+        double advection;
+        double B_det, B_inv00, B_inv01, B_inv10, B_inv11;
+
+        /* stuff for DGEMM */
+        LAPACKINDEX i_twentyone = 21;
+
+        for (element = 0; element < num_elements; element++) {
+                for (k = 0; k < 3; k++) {
+                        corner_x[k] = x[ORDER(element, k, num_elements, 3)];
+                        corner_y[k] = y[ORDER(element, k, num_elements, 3)];
+                }
+                ap_physical_maps(corner_x, corner_y, C, B, b);
+
+                B_det = B[ORDER(0, 0, 2, 2)]*B[ORDER(1, 1, 2, 2)] -
+                        B[ORDER(0, 1, 2, 2)]*B[ORDER(1, 0, 2, 2)];
+                B_inv00 = B[ORDER(1, 1, 2, 2)]/B_det;
+                B_inv01 = -B[ORDER(0, 1, 2, 2)]/B_det;
+                B_inv10 = -B[ORDER(1, 0, 2, 2)]/B_det;
+                B_inv11 = B[ORDER(0, 0, 2, 2)]/B_det;
+                ap_third_derivative_map(B, map);
+                for (m = 0; m < 4; m++) {
+                        laplacian_x[m] = map[0][m] + map[2][m];
+                        laplacian_y[m] = map[1][m] + map[3][m];
+                }
+
+                /* psi in the reference basis. */
+                for (j = 0; j < 21; j++) {
+                        coefficients[j] = psi[element_dofs[
+                                ORDER(element, j, num_elements, 21)]];
+                }
+                for (k = 0; k < 21; k++) {
+                        reference[k] = 0.0;
+                        for (j = 0; j < 21; j++) {
+                                reference[k] += C[ORDER(j, k, 21, 21)]
+                                              *coefficients[j];
+                        }
+                }
+
+                /* derivatives of psi and the weighted advection term. */
+                for (k = 0; k < 21; k++) {
+                        projections[k] = 0.0;
+                }
+                for (i = 0; i < num_points; i++) {
+                        for (m = 0; m < 6; m++) {
+                                ref_field[m] = 0.0;
+                        }
+                        for (k = 0; k < 21; k++) {
+                                const int index = ORDER(k, i, 21, num_points);
+                                ref_field[0] += reference[k]*ref_dx[index];
+                                ref_field[1] += reference[k]*ref_dy[index];
+                                ref_field[2] += reference[k]*ref_dxxx[index];
+                                ref_field[3] += reference[k]*ref_dxxy[index];
+                                ref_field[4] += reference[k]*ref_dxyy[index];
+                                ref_field[5] += reference[k]*ref_dyyy[index];
+                        }
+                        psi_x[i] = B_inv00*ref_field[0] + B_inv10*ref_field[1];
+                        psi_y[i] = B_inv01*ref_field[0] + B_inv11*ref_field[1];
+                        lap_x[i] = 0.0;
+                        lap_y[i] = 0.0;
+                        for (m = 0; m < 4; m++) {
+                                lap_x[i] += laplacian_x[m]*ref_field[2 + m];
+                                lap_y[i] += laplacian_y[m]*ref_field[2 + m];
+                        }
+                        scale[i] = weights[i]*fabs(B_det);
+                        advection = scale[i]*(psi_x[i]*lap_y[i]
+                                              - psi_y[i]*lap_x[i]);
+                        for (k = 0; k < 21; k++) {
+                                projections[k] += advection*ref_values[
+                                        ORDER(k, i, 21, num_points)];
+                        }
+                }
+
+                /* map the integrals back to the physical basis. */
+                for (j = 0; j < 21; j++) {
+                        double sum = 0.0;
+                        for (k = 0; k < 21; k++) {
+                                sum += C[ORDER(j, k, 21, 21)]*projections[k];
+                        }
+                        residual[element_dofs[
+                                ORDER(element, j, num_elements, 21)]] += sum;
+                }
+
+                if (jacobians != NULL) {
+                        double values[21*num_points];
+                        double dx[21*num_points], dy[21*num_points];
+                        double dlap_x[21*num_points], dlap_y[21*num_points];
+                        double unmapped[21*num_points];
+                        double *jacobian = jacobians + 21*21*element;
+
+                        /* the physical basis functions and derivatives. */
+                        ap_physical_values(C, ref_values, num_points, values);
+                        ap_physical_gradients(C, B, ref_dx, ref_dy,
+                                              num_points, dx, dy);
+                        for (i = 0; i < 21*num_points; i++) {
+                                unmapped[i] = laplacian_x[0]*ref_dxxx[i]
+                                            + laplacian_x[1]*ref_dxxy[i]
+                                            + laplacian_x[2]*ref_dxyy[i]
+                                            + laplacian_x[3]*ref_dyyy[i];
+                        }
+                        DGEMM_WRAPPER(i_twentyone, num_points, i_twentyone, C,
+                                      unmapped, dlap_x);
+                        for (i = 0; i < 21*num_points; i++) {
+                                unmapped[i] = laplacian_y[0]*ref_dxxx[i]
+                                            + laplacian_y[1]*ref_dxxy[i]
+                                            + laplacian_y[2]*ref_dxyy[i]
+                                            + laplacian_y[3]*ref_dyyy[i];
+                        }
+                        DGEMM_WRAPPER(i_twentyone, num_points, i_twentyone, C,
+                                      unmapped, dlap_y);
+
+                        /*
+                         * Reuse unmapped for the linearized advection of
+                         * every basis function and values for the weighted
+                         * test functions.
+                         */
+                        for (j = 0; j < 21; j++) {
+                                for (i = 0; i < num_points; i++) {
+                                        const int index = ORDER(j, i, 21,
+                                                                num_points);
+                                        unmapped[index] =
+                                                dx[index]*lap_y[i]
+                                                - dy[index]*lap_x[i]
+                                                + psi_x[i]*dlap_y[index]
+                                                - psi_y[i]*dlap_x[index];
+                                }
+                        }
+                        ap_diagonal_multiply(21, num_points, values, scale);
+                        DGEMM_WRAPPER_NT(i_twentyone, i_twentyone, num_points,
+                                         values, unmapped, jacobian);
+                }
+        }
+}
@@ -0,0 +1,105 @@
+void ap_ref_all(double* restrict x, double* restrict y, LAPACKINDEX num_points,
+                double* restrict ref_all)
+{
+        int i, k, m;
+        int degrees[6] = {5, 4, 4, 3, 3, 3};
+        double* tables[6];
+        double stacked[6*21*21];
+
+        /* stuff for dgemm */
+        LAPACKINDEX i_twentyone = 21;
+#ifdef USE_ROW_MAJOR
+        LAPACKINDEX i_stacked = 6*21;
+#endif
+
+#include "coefficients_values.h"
+#include "coefficients_gradients.h"
+#include "coefficients_hessians.h"
+
+        /*
+         * ref_all holds six (21, num_points) tables one after another: the
+         * values and the x, y, xx, xy, and yy derivatives.
+         */
+        tables[0] = coefficients;
+        tables[1] = coefficients_dx;
+        tables[2] = coefficients_dy;
+        tables[3] = coefficients_dxx;
+        tables[4] = coefficients_dxy;
+        tables[5] = coefficients_dyy;
+
+        /* avoid the large table of monomials for many points. */
+        if (num_points > AP_DIRECT_THRESHOLD) {
+                for (k = 0; k < 6; k++) {
+                        ap_direct_evaluation(tables[k], degrees[k], x, y,
+                                             num_points,
+                                             ref_all + k*21*num_points);
+                }
+                return;
+        }
+
+        double monomials[21*num_points];
+
+        /*
+         * Pad every table of coefficients to all 21 monomials (the monomials
+         * are ordered by degree, so the first columns of the padded table are
+         * the original table) and stack them.
+         */
+        for (k = 0; k < 6; k++) {
+                const int num_monomials = (degrees[k] + 1)*(degrees[k] + 2)/2;
+                for (i = 0; i < 21; i++) {
+                        for (m = 0; m < 21; m++) {
+                                stacked[k*21*21 + ORDER(i, m, 21, 21)] =
+                                        m < num_monomials ?
+                                        tables[k][ORDER(i, m, 21,
+                                                        num_monomials)] : 0.0;
+                        }
+                }
+        }
+
+        /* See ref_values.c. */
+        for (i = 0; i < num_points; i++) {
+                monomials[ORDER(0,  i, 21, num_points)] = 1.0;
+                monomials[ORDER(1,  i, 21, num_points)] = x[i];
+                monomials[ORDER(2,  i, 21, num_points)] = y[i];
+                monomials[ORDER(3,  i, 21, num_points)] = x[i]*x[i];
+                monomials[ORDER(4,  i, 21, num_points)] = x[i]*y[i];
+                monomials[ORDER(5,  i, 21, num_points)] = y[i]*y[i];
+                monomials[ORDER(6,  i, 21, num_points)] = x[i]*x[i]*x[i];
+                monomials[ORDER(7,  i, 21, num_points)] = x[i]*x[i]*y[i];
+                monomials[ORDER(8,  i, 21, num_points)] = x[i]*y[i]*y[i];
+                monomials[ORDER(9,  i, 21, num_points)] = y[i]*y[i]*y[i];
+                monomials[ORDER(10, i, 21, num_points)] = x[i]*x[i]*x[i]*x[i];
+                monomials[ORDER(11, i, 21, num_points)] = x[i]*x[i]*x[i]*y[i];
+                monomials[ORDER(12, i, 21, num_points)] = x[i]*x[i]*y[i]*y[i];
+                monomials[ORDER(13, i, 21, num_points)] = x[i]*y[i]*y[i]*y[i];
+                monomials[ORDER(14, i, 21, num_points)] = y[i]*y[i]*y[i]*y[i];
+                monomials[ORDER(15, i, 21, num_points)] =
+                        x[i]*x[i]*x[i]*x[i]*x[i];
+                monomials[ORDER(16, i, 21, num_points)] =
+                        x[i]*x[i]*x[i]*x[i]*y[i];
+                monomials[ORDER(17, i, 21, num_points)] =
+                        x[i]*x[i]*x[i]*y[i]*y[i];
+                monomials[ORDER(18, i, 21, num_points)] =
+                        x[i]*x[i]*y[i]*y[i]*y[i];
+                monomials[ORDER(19, i, 21, num_points)] =
+                        x[i]*y[i]*y[i]*y[i]*y[i];
+                monomials[ORDER(20, i, 21, num_points)] =
+                        y[i]*y[i]*y[i]*y[i]*y[i];
+        }
+
+#ifdef USE_ROW_MAJOR
+        /*
+         * In row major order the stacked tables form one (126, 21) matrix and
+         * ref_all one (126, num_points) matrix, so one multiplication
+         * computes everything.
+         */
+        DGEMM_WRAPPER(i_stacked, num_points, i_twentyone, stacked, monomials,
+                      ref_all);
+#else
+        for (k = 0; k < 6; k++) {
+                DGEMM_WRAPPER(i_twentyone, num_points, i_twentyone,
+                              stacked + k*21*21, monomials,
+                              ref_all + k*21*num_points);
+        }
+#endif
+}
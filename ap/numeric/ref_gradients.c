@@ -1,7 +1,6 @@
 void ap_ref_gradients(double* restrict x, double* restrict y, LAPACKINDEX num_points,
                       double* restrict ref_dx, double* restrict ref_dy)
 {
-        double monomials[15*num_points];
         int i;
 
         /* stuff for dgemm */
@@ -10,6 +9,17 @@ void ap_ref_gradients(double* restrict x, double* restrict y, LAPACKINDEX num_po
 
 #include "coefficients_gradients.h"
 
+        /* avoid the large table of monomials for many points. */
+        if (num_points > AP_DIRECT_THRESHOLD) {
+                ap_direct_evaluation(coefficients_dx, 4, x, y, num_points,
+                                     ref_dx);
+                ap_direct_evaluation(coefficients_dy, 4, x, y, num_points,
+                                     ref_dy);
+                return;
+        }
+
+        double monomials[15*num_points];
+
         /*
          * Rows in the monomial matrix correspond to monomials (x, y, x^2, etc)
          * while columns correspond to quadrature points. The monomial basis
@@ -2,7 +2,6 @@ void ap_ref_hessians(double* restrict x, double* restrict y, LAPACKINDEX num_poi
                      double* restrict ref_dxx, double* restrict ref_dxy,
                      double* restrict ref_dyy)
 {
-        double monomials[10*num_points];
         int i;
 
         /* stuff for dgemm */
@@ -11,6 +10,19 @@ void ap_ref_hessians(double* restrict x, double* restrict y, LAPACKINDEX num_poi
 
 #include "coefficients_hessians.h"
 
+        /* avoid the large table of monomials for many points. */
+        if (num_points > AP_DIRECT_THRESHOLD) {
+                ap_direct_evaluation(coefficients_dxx, 3, x, y, num_points,
+                                     ref_dxx);
+                ap_direct_evaluation(coefficients_dxy, 3, x, y, num_points,
+                                     ref_dxy);
+                ap_direct_evaluation(coefficients_dyy, 3, x, y, num_points,
+                                     ref_dyy);
+                return;
+        }
+
+        double monomials[10*num_points];
+
         /*
          * Rows in the monomial matrix correspond to monomials (x, y, x^2, etc)
          * while columns correspond to quadrature points. The monomial basis
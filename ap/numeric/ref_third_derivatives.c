@@ -0,0 +1,53 @@
+void ap_ref_third_derivatives(double* restrict x, double* restrict y,
+                              LAPACKINDEX num_points,
+                              double* restrict ref_dxxx,
+                              double* restrict ref_dxxy,
+                              double* restrict ref_dxyy,
+                              double* restrict ref_dyyy)
+{
+        int i;
+
+        /* stuff for dgemm */
+        LAPACKINDEX i_twentyone = 21;
+        LAPACKINDEX i_six = 6;
+
+#include "coefficients_third_derivatives.h"
+
+        /* avoid the large table of monomials for many points. */
+        if (num_points > AP_DIRECT_THRESHOLD) {
+                ap_direct_evaluation(coefficients_dxxx, 2, x, y, num_points,
+                                     ref_dxxx);
+                ap_direct_evaluation(coefficients_dxxy, 2, x, y, num_points,
+                                     ref_dxxy);
+                ap_direct_evaluation(coefficients_dxyy, 2, x, y, num_points,
+                                     ref_dxyy);
+                ap_direct_evaluation(coefficients_dyyy, 2, x, y, num_points,
+                                     ref_dyyy);
+                return;
+        }
+
+        double monomials[6*num_points];
+
+        /*
+         * Rows in the monomial matrix correspond to monomials (x, y, x^2, etc)
+         * while columns correspond to quadrature points. The monomial basis
+         * spans quadratic polynomials of dimension 2 (hence 6 rows).
+         */
+        for (i = 0; i < num_points; i++) {
+            monomials[ORDER(0, i, 6, num_points)] = 1.0;
+            monomials[ORDER(1, i, 6, num_points)] = x[i];
+            monomials[ORDER(2, i, 6, num_points)] = y[i];
+            monomials[ORDER(3, i, 6, num_points)] = x[i]*x[i];
+            monomials[ORDER(4, i, 6, num_points)] = x[i]*y[i];
+            monomials[ORDER(5, i, 6, num_points)] = y[i]*y[i];
+        }
+
+        DGEMM_WRAPPER(i_twentyone, num_points, i_six, coefficients_dxxx,
+                      monomials, ref_dxxx);
+        DGEMM_WRAPPER(i_twentyone, num_points, i_six, coefficients_dxxy,
+                      monomials, ref_dxxy);
+        DGEMM_WRAPPER(i_twentyone, num_points, i_six, coefficients_dxyy,
+                      monomials, ref_dxyy);
+        DGEMM_WRAPPER(i_twentyone, num_points, i_six, coefficients_dyyy,
+                      monomials, ref_dyyy);
+}
@@ -1,7 +1,6 @@
 void ap_ref_values(double* restrict x, double* restrict y, LAPACKINDEX num_points,
                    double* restrict ref_values)
 {
-        double monomials[21*num_points];
         int i;
 
         /* stuff for dgemm */
@@ -9,6 +8,15 @@ void ap_ref_values(double* restrict x, double* restrict y, LAPACKINDEX num_point
 
 #include "coefficients_values.h"
 
+        /* avoid the large table of monomials for many points. */
+        if (num_points > AP_DIRECT_THRESHOLD) {
+                ap_direct_evaluation(coefficients, 5, x, y, num_points,
+                                     ref_values);
+                return;
+        }
+
+        double monomials[21*num_points];
+
         /*
          * Rows in the monomial matrix correspond to monomials (x, y, x^2, etc)
          * while columns correspond to quadrature points. The monomial basis
@@ -0,0 +1,37 @@
+int ap_sparse_triangular_solve(int* restrict indptr, int* restrict indices,
+                               double* restrict data, const int num_rows,
+                               const int lower, double* restrict x)
+{
+/*
+ * Solve T x = b in place (x holds b on entry) for a sparse triangular matrix
+ * T stored in compressed sparse row format with zero-based indices. Every
+ * row must store its diagonal entry; entries on the other side of the
+ * diagonal are ignored, so the factors need not be split out of a larger
+ * matrix. Rows are solved in increasing order if lower is nonzero and in
+ * decreasing order otherwise, so this costs one pass over the entries.
+ *
+ * Return 0 on success. If a row has no diagonal entry, or a zero one, stop
+ * and return one plus the index of that row (the rows not yet solved keep
+ * their values from b).
+ */
+        int row, step, k;
+        double sum, diagonal;
+
+        for (step = 0; step < num_rows; step++) {
+                row = lower ? step : num_rows - 1 - step;
+                sum = x[row];
+                diagonal = 0.0;
+                for (k = indptr[row]; k < indptr[row + 1]; k++) {
+                        if (indices[k] == row) {
+                                diagonal = data[k];
+                        } else if ((indices[k] < row) == (lower != 0)) {
+                                sum -= data[k]*x[indices[k]];
+                        }
+                }
+                if (diagonal == 0.0) {
+                        return row + 1;
+                }
+                x[row] = sum/diagonal;
+        }
+        return 0;
+}
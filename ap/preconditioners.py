@@ -0,0 +1,160 @@
+#! /usr/bin/env python
+"""
+Preconditioners for Argyris finite element matrices built from the dense
+blocks of the degrees of freedom of each vertex and each edge.
+
+Every vertex of an Argyris mesh carries six strongly coupled degrees of
+freedom (the value, gradient, and Hessian of the solution there), which
+scalar (point) Jacobi treats as unrelated. The preconditioners here invert
+the matrix restricted to small groups of degrees of freedom instead:
+
+* block_jacobi inverts the 6 by 6 block of every vertex and the diagonal
+  entry of every normal derivative (the groups do not overlap).
+* additive_schwarz inverts, for every edge, the 13 by 13 block of its
+  normal derivative and the degrees of freedom of its two vertices, and
+  adds the corrections (the groups overlap).
+
+Both return a BlockPreconditioner, whose aslinearoperator method gives the
+argument M of the solvers in scipy.sparse.linalg. For example,
+
+    matrix = ap.assembly.assemble(mesh, 'biharmonic')
+    preconditioner = additive_schwarz(matrix, mesh)
+    (solution, info) = scipy.sparse.linalg.cg(
+        matrix, rhs, M=preconditioner.aslinearoperator())
+"""
+import numpy as np
+
+
+def vertex_blocks(mesh):
+    """
+    Return the (V, 6) array of the zero-based numbers of the degrees of
+    freedom (value, dx, dy, dxx, dxy, dyy) of every vertex of an
+    ArgyrisMesh, in increasing order of the corner node.
+    """
+    corners = np.array(sorted(mesh.stacked_nodes.keys()), dtype=int)
+    stacked = np.array([mesh.stacked_nodes[corner] for corner in corners],
+                       dtype=int).reshape((-1, 5))
+    return np.column_stack((corners, stacked)) - 1
+
+
+def edge_blocks(mesh):
+    """
+    Return the (M, 13) array of the zero-based numbers of the degrees of
+    freedom of every edge of an ArgyrisMesh: its normal derivative followed
+    by the six degrees of freedom of each endpoint.
+    """
+    table = mesh.edges_by_midpoint.table
+    blocks = vertex_blocks(mesh)
+    position = np.zeros(mesh.num_nodes + 1, dtype=int)
+    position[blocks[:, 0] + 1] = np.arange(len(blocks))
+    return np.column_stack((table[:, 0] - 1, blocks[position[table[:, 3]]],
+                            blocks[position[table[:, 4]]]))
+
+
+def _dense_blocks(matrix, blocks):
+    """
+    Extract the (K, b, b) dense blocks matrix[block, block] of a CSR matrix
+    for every row of the (K, b) array of zero-based indices blocks.
+    """
+    (num_blocks, size) = blocks.shape
+    rows = np.repeat(blocks, size, axis=1).ravel()
+    columns = np.tile(blocks, (1, size)).ravel()
+    # look up every entry by binary search in its (sorted) row.
+    matrix.sort_indices()
+    starts = matrix.indptr[rows]
+    ends = matrix.indptr[rows + 1]
+    codes = np.repeat(np.arange(matrix.shape[0], dtype=np.int64),
+                      np.diff(matrix.indptr))*matrix.shape[1] \
+        + matrix.indices
+    positions = np.searchsorted(codes, rows.astype(np.int64)*matrix.shape[1]
+                                + columns)
+    positions = np.minimum(positions, len(codes) - 1)
+    found = (positions >= starts) & (positions < ends) \
+        & (matrix.indices[positions] == columns)
+    values = np.where(found, matrix.data[positions], 0.0)
+    return values.reshape((num_blocks, size, size))
+
+
+class BlockPreconditioner(object):
+    """
+    The (additive) block preconditioner
+
+        M^{-1} r = sum_i R_i^T (R_i A R_i^T)^{-1} R_i r,
+
+    where each R_i restricts a vector to one group of degrees of freedom.
+
+    Required Arguments
+    ------------------
+    * matrix : the matrix A: a scipy.sparse matrix or an
+               ap.assembly.BlockedMatrix.
+    * groups : a list of (K, b) arrays of zero-based indices; every row is
+               one group. Groups in different arrays may have different
+               sizes.
+
+    Methods
+    -------
+    * solve(residual) : apply M^{-1} to a vector.
+    * aslinearoperator() : M^{-1} as a scipy.sparse.linalg.LinearOperator.
+    """
+    def __init__(self, matrix, groups):
+        if hasattr(matrix, 'tocsr'):
+            matrix = matrix.tocsr()
+        self.shape = matrix.shape
+        self.groups = [np.asarray(group, dtype=int) for group in groups]
+        self.inverses = [np.linalg.inv(_dense_blocks(matrix, group))
+                         for group in self.groups]
+
+    def solve(self, residual):
+        """Apply the preconditioner to a vector."""
+        residual = np.asarray(residual, dtype=np.float64).reshape(-1)
+        result = np.zeros(self.shape[0])
+        for group, inverse in zip(self.groups, self.inverses):
+            corrections = np.einsum('kij,kj->ki', inverse, residual[group])
+            result += np.bincount(group.ravel(), corrections.ravel(),
+                                  minlength=self.shape[0])
+        return result
+
+    def aslinearoperator(self):
+        """Wrap the preconditioner as a scipy LinearOperator."""
+        import scipy.sparse.linalg as linalg
+
+        return linalg.LinearOperator(self.shape, matvec=self.solve,
+                                     dtype=np.float64)
+
+
+def block_jacobi(matrix, mesh):
+    """
+    Build the block Jacobi preconditioner of a matrix assembled on an
+    ArgyrisMesh: the inverse of its 6 by 6 vertex blocks and of the diagonal
+    entries of the normal derivatives.
+
+    Required Arguments
+    ------------------
+    * matrix : the matrix (see BlockPreconditioner).
+    * mesh   : the ArgyrisMesh on which it was assembled.
+
+    Output
+    ------
+    A BlockPreconditioner.
+    """
+    normal_derivatives = mesh.edges_by_midpoint.table[:, 0:1] - 1
+    return BlockPreconditioner(matrix, [vertex_blocks(mesh),
+                                        normal_derivatives])
+
+
+def additive_schwarz(matrix, mesh):
+    """
+    Build the overlapping additive Schwarz preconditioner of a matrix
+    assembled on an ArgyrisMesh, whose subdomains are the edge blocks (see
+    edge_blocks). Every degree of freedom lies in at least one of them.
+
+    Required Arguments
+    ------------------
+    * matrix : the matrix (see BlockPreconditioner).
+    * mesh   : the ArgyrisMesh on which it was assembled.
+
+    Output
+    ------
+    A BlockPreconditioner.
+    """
+    return BlockPreconditioner(matrix, [edge_blocks(mesh)])
@@ -1,46 +1,185 @@
 #! /usr/bin/env python
+"""
+Convert finite element meshes to Argyris (or Lagrange) meshes in bulk.
 
-from MeshParser import ParseMESHFormat
-import numpy as np
-from math import pi
+Each input mesh is parsed, converted, and saved by a separate worker
+process, so converting many meshes uses every core. For example,
 
-def main():
-    s = ParseMESHFormat(mesh_file, special_borders = {'ocean' : (1,2,3,4)})
-    s.save_argyris_outfiles()
+    python -m ap.runMESH --border ocean=1,2,3,4 --format binary \\
+        --output-directory out/ basins/*.msh
 
-def lambert_azimuthal_projection(coordinate_tripples, longitude_offset = -pi/4):
+writes out/NAME.apm for every basin mesh (reload them with
+ap.mesh.meshes.load) and prints the time spent on each file. A mesh stored
+as a pair of text files is given as ELEMENTS.txt,NODES.txt (the
+order of ap.mesh.parsers.ParseTXTFormat).
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+import ap.mesh.meshes as meshes
+import ap.mesh.parsers as parsers
+import ap.mesh.projections as projections
+
+_PROJECTIONS = {'none': None,
+                'lambert_azimuthal': projections.lambert_azimuthal,
+                'miller_cylindrical': projections.miller_cylindrical}
+
+
+def parse_border(border):
+    """
+    Parse a border specification of the form NAME=1,2,3 in to the tuple
+    (NAME, (1, 2, 3)).
     """
-    An area-preserving projection from geophysical coordinates to the plane.
+    try:
+        name, labels = border.split('=')
+        return (name, tuple(int(label) for label in labels.split(',')))
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            "borders must be of the form NAME=1,2,3, not " + border)
 
-    Required Arguements
-    -------------------
-    * coordinate_tripples : 3-column, N row tripples of sphere coordinates.
 
-    Optional Arguements
-    -------------------
-    * longitude_offset : offset in Radians from Greenwich, England. Negative
-      moves towards New York, positive moves towards Moscow.
+def convert(job):
+    """
+    Parse, convert, and save one mesh. Return the tuple (mesh files,
+    timings, error) where timings is a dictionary of the seconds spent on
+    each step and error is None if the conversion succeeded.
 
-    Output
-    ------
-    * the Lambert Azimuthal projection (not scaled) of the coordinate_tripples.
+    Required Arguments
+    ------------------
+    * job : the tuple (mesh files, output prefix, options) where options is
+            a dictionary with the keys 'argyris', 'format', 'borders',
+            'default_border', 'ignore_given_edges', and 'projection' (a key
+            of _PROJECTIONS).
     """
-    x = coordinate_tripples[:,0]
-    y = coordinate_tripples[:,1]
-    z = coordinate_tripples[:,2]
-    # convert to latitude / longitude coordinates.
-    rho = np.sqrt(x**2) + np.sqrt(y**2) + np.sqrt(z**2)
-    azimuth = np.arctan2(y,x)                    # same as longitude
-    inclination = -1 * (np.arccos(z/rho) - pi/2) # same as latitude
+    mesh_files, prefix, options = job
+    timings = dict()
+    try:
+        start = time.time()
+        parsed_mesh = parsers.parser_factory(*mesh_files)
+        timings['parse'] = time.time() - start
+
+        start = time.time()
+        keywords = {'borders': options['borders'],
+                    'default_border': options['default_border'],
+                    'ignore_given_edges': options['ignore_given_edges'],
+                    'projection': _PROJECTIONS[options['projection']]}
+        if options['argyris']:
+            mesh = meshes.ArgyrisMesh(parsed_mesh, **keywords)
+        else:
+            mesh = meshes.Mesh(parsed_mesh, **keywords)
+        timings['build'] = time.time() - start
+
+        start = time.time()
+        if options['format'] == 'binary':
+            mesh.save(prefix + '.apm')
+        else:
+            mesh.savetxt(prefix)
+        timings['write'] = time.time() - start
+    except Exception:
+        return (mesh_files, timings, traceback.format_exc())
+    return (mesh_files, timings, None)
+
+
+def build_jobs(arguments):
+    """
+    Build the list of jobs (see convert) from the parsed command line
+    arguments. Raise a ValueError if two meshes would be written to the same
+    files (for example, a/mesh.msh and b/mesh.msh with one output directory,
+    or NAME.mesh and NAME_elements.txt,NAME_nodes.txt).
+    """
+    options = {'argyris': not arguments.lagrange,
+               'format': arguments.format,
+               'borders': dict(arguments.border),
+               'default_border': arguments.default_border,
+               'ignore_given_edges': arguments.ignore_given_edges,
+               'projection': arguments.projection}
+    jobs = []
+    prefixes = dict()
+    for mesh in arguments.meshes:
+        mesh_files = mesh.split(',')
+        name = os.path.splitext(os.path.basename(mesh_files[0]))[0]
+        if len(mesh_files) == 2 and name.endswith('_elements'):
+            name = name[0:-len('_elements')]
+        directory = arguments.output_directory
+        if directory is None:
+            directory = os.path.dirname(mesh_files[0])
+        prefix = os.path.join(directory, name)
+        key = os.path.normcase(os.path.abspath(prefix))
+        if key in prefixes:
+            raise ValueError("{0} and {1} would both be saved as {2}".format(
+                prefixes[key], mesh, prefix))
+        prefixes[key] = mesh
+        jobs.append((mesh_files, prefix, options))
+    return jobs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Convert meshes to Argyris meshes in parallel.")
+    parser.add_argument('meshes', nargs='+', metavar='MESH',
+                        help=".mesh or .msh file, or a pair of text files "
+                        "given as ELEMENTS.txt,NODES.txt")
+    parser.add_argument('--border', action='append', default=[],
+                        type=parse_border, metavar='NAME=1,2,3',
+                        help="collect the edges with the given GMSH labels "
+                        "in to the border NAME (may be repeated)")
+    parser.add_argument('--default-border', default='land',
+                        help="name of the border containing all other edges "
+                        "(default: land)")
+    parser.add_argument('--ignore-given-edges', action='store_true',
+                        help="extract the boundary edges from the elements "
+                        "instead of using the edges in the mesh files")
+    parser.add_argument('--projection', default='none',
+                        choices=sorted(_PROJECTIONS.keys()),
+                        help="projection applied to three dimensional nodes "
+                        "(default: none)")
+    parser.add_argument('--lagrange', action='store_true',
+                        help="save the Lagrange mesh instead of the Argyris "
+                        "mesh")
+    parser.add_argument('--format', default='text',
+                        choices=['text', 'binary'],
+                        help="save text files (PREFIX_nodes.txt, ...) or one "
+                        "binary PREFIX.apm file (default: text)")
+    parser.add_argument('--output-directory', default=None,
+                        help="directory for the output files (default: next "
+                        "to each input)")
+    parser.add_argument('--processes', type=int, default=None,
+                        help="number of worker processes (default: number "
+                        "of cores)")
+    arguments = parser.parse_args(argv)
 
-    # project to 2D.
-    k = np.sqrt(2 / (1 + np.cos(inclination) * np.cos(azimuth - longitude_offset)))
+    try:
+        jobs = build_jobs(arguments)
+    except ValueError as error:
+        parser.error(str(error))
 
-    x_projected = (k * np.cos(inclination) * np.sin(azimuth - longitude_offset))
-    y_projected = (k * np.sin(inclination))
+    if arguments.output_directory is not None and \
+            not os.path.isdir(arguments.output_directory):
+        os.makedirs(arguments.output_directory)
+    start = time.time()
+    failures = 0
+    pool = multiprocessing.Pool(arguments.processes)
+    try:
+        for mesh_files, timings, error in pool.imap_unordered(convert, jobs):
+            name = ','.join(mesh_files)
+            if error is None:
+                print("{0}: parse {1:.3f}s, build {2:.3f}s, write {3:.3f}s, "
+                      "total {4:.3f}s".format(
+                          name, timings['parse'], timings['build'],
+                          timings['write'], sum(timings.values())))
+            else:
+                failures += 1
+                sys.stderr.write(name + ": failed\n" + error)
+    finally:
+        pool.close()
+        pool.join()
+    print("converted {0} of {1} meshes in {2:.3f}s".format(
+        len(jobs) - failures, len(jobs), time.time() - start))
+    return 1 if failures else 0
 
-    return np.hstack((x_projected.reshape((len(x),1)),
-                      y_projected.reshape((len(x),1))))
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
@@ -22,13 +22,13 @@ def test_triangle(xs, ys):
 
     # calculate all the numeric quantities.
     (quad_x, quad_y, quad_weights) = nm.get_quad_points()
-    ref_values = nm.ref_values(quad_x, quad_y)
-    (ref_dx, ref_dy) = nm.ref_gradients(quad_x, quad_y)
-    (ref_dxx, ref_dxy, ref_dyy) = nm.ref_hessians(quad_x, quad_y)
+    ref_tables = nm.ref_all(quad_x, quad_y)
+    (ref_values, ref_dx, ref_dy, ref_dxx, ref_dxy, ref_dyy) = ref_tables
+    (ref_dxxx, ref_dxxy, ref_dxyy, ref_dyyy) = nm.ref_third_derivatives(quad_x,
+                                                                        quad_y)
     (C, B, b) = nm.physical_maps(xs, ys)
-    physical_values = nm.physical_values(C, ref_values)
-    (dx, dy) = nm.physical_gradients(C, B, ref_dx, ref_dy)
-    (dxx, dxy, dyy) = nm.physical_hessians(C, B, ref_dxx, ref_dxy, ref_dyy)
+    (physical_values, dx, dy, dxx, dxy, dyy) = nm.physical_all(C, B,
+                                                               ref_tables)
 
     mass_symbolic = ip.mass(symbolic_interpolation)
     mass_numeric  = nm.matrix_mass(C, B, ref_values, quad_weights)
@@ -51,6 +51,35 @@ def test_triangle(xs, ys):
     print "max relative error for biharmonic matrix:", \
         relative_error(biharmonic_symbolic, biharmonic_numeric)
 
+    mass_stabilized_symbolic = ip.mass_stabilized(symbolic_interpolation)
+    mass_stabilized_numeric  = nm.matrix_mass_stabilized(C, B, ref_values, ref_dx,
+                                                         ref_dy, quad_weights)
+    print "max relative error for stabilized mass matrix:", \
+        relative_error(mass_stabilized_symbolic, mass_stabilized_numeric)
+
+    stiffness_stabilized_symbolic = ip.stiffness_stabilized(symbolic_interpolation)
+    stiffness_stabilized_numeric  = nm.matrix_stiffness_stabilized(
+        C, B, ref_dx, ref_dy, ref_dxx, ref_dxy, ref_dyy, quad_weights)
+    print "max relative error for stabilized stiffness matrix:", \
+        relative_error(stiffness_stabilized_symbolic,
+                       stiffness_stabilized_numeric)
+
+    betaplane_stabilized_symbolic = ip.betaplane_stabilized(symbolic_interpolation)
+    betaplane_stabilized_numeric  = nm.matrix_betaplane_stabilized(
+        C, B, ref_dx, ref_dy, quad_weights)
+    print "max relative error for stabilized betaplane matrix:", \
+        relative_error(betaplane_stabilized_symbolic,
+                       betaplane_stabilized_numeric)
+
+    biharmonic_stabilized_symbolic = \
+        ip.biharmonic_stabilized(symbolic_interpolation)
+    biharmonic_stabilized_numeric  = nm.matrix_biharmonic_stabilized(
+        C, B, ref_dxx, ref_dxy, ref_dyy, ref_dxxx, ref_dxxy, ref_dxyy,
+        ref_dyyy, quad_weights)
+    print "max relative error for stabilized biharmonic matrix:", \
+        relative_error(biharmonic_stabilized_symbolic,
+                       biharmonic_stabilized_numeric)
+
     symbolic_values = np.zeros(ref_values.shape, dtype=np.float64)*np.nan
     symbolic_dx     = np.zeros(ref_values.shape, dtype=np.float64)*np.nan
     symbolic_dy     = np.zeros(ref_values.shape, dtype=np.float64)*np.nan
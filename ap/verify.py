@@ -0,0 +1,625 @@
+#! /usr/bin/env python
+"""
+Fast checks of the numeric kernels which only require NumPy (ap.test, in
+contrast, compares them with the symbolic implementation through SAGE).
+Every check runs on many random triangles at once:
+
+* duality: the degrees of freedom of the physical basis functions form the
+  identity matrix.
+* reproduction: interpolating a quintic polynomial reproduces it, and its
+  first, second, and third derivatives, exactly.
+* matrices: the local matrices (plain and stabilized) agree with quadrature
+  of the physical basis functions, are symmetric (mass, stiffness,
+  biharmonic, and stabilized betaplane), are positive (semi)definite, and
+  vanish on the right polynomials (constants for the stiffness matrices and
+  harmonic polynomials for the biharmonic matrix).
+* combined: ref_all and physical_all agree with the separate kernels.
+* direct: evaluating the reference basis functions at more points than
+  kernels.direct_threshold (which switches to direct evaluation) agrees
+  with evaluating them a few points at a time.
+* triangular: sparse_triangular_solve agrees with dense substitution.
+* qg: the native quasi-geostrophic advection term and its Jacobian agree
+  with quadrature of the physical basis functions, and the Jacobian is
+  exact (the term is quadratic in psi).
+
+The checks take the module of kernels as an argument, so another
+implementation with the interface of ap.numeric (say, a batched one) is
+checked the same way; compare_kernels compares two implementations
+directly. Run everything with
+
+    import ap.verify; ap.verify.run()
+"""
+import time
+import numpy as np
+import ap.numeric as nm
+
+# Reference points at which the degrees of freedom are evaluated: the
+# corners and then the midpoints of the edges (0, 1), (0, 2), and (1, 2).
+_DOF_X = np.array([0.0, 1.0, 0.0, 0.5, 0.0, 0.5])
+_DOF_Y = np.array([0.0, 0.0, 1.0, 0.0, 0.5, 0.5])
+_EDGES = [(0, 1), (0, 2), (1, 2)]
+
+# Orders (in x and in y) of the derivatives in physical_tables and in
+# physical_third_derivative_tables.
+_ORDERS = [(0, 0), (1, 0), (0, 1), (2, 0), (1, 1), (0, 2)]
+_THIRD_ORDERS = [(3, 0), (2, 1), (1, 2), (0, 3)]
+
+_MATRICES = ['mass', 'stiffness', 'betaplane', 'biharmonic',
+             'mass_stabilized', 'stiffness_stabilized',
+             'betaplane_stabilized', 'biharmonic_stabilized']
+
+# Largest acceptable errors, relative to the size of the compared values.
+TOLERANCES = {'duality': 1e-9, 'reproduction': 1e-8, 'matrices': 1e-10,
+              'symmetry': 1e-12, 'definiteness': 1e-10, 'null_space': 1e-8,
+              'combined': 1e-12, 'direct': 1e-12, 'triangular': 1e-12,
+              'qg': 1e-12, 'gather': 1e-12}
+
+
+def random_triangles(num_triangles, seed=0, min_quality=0.1):
+    """
+    Generate random triangles of widely varying size, position, shape, and
+    orientation.
+
+    Required Arguments
+    ------------------
+    * num_triangles : the number of triangles.
+
+    Optional Arguments
+    ------------------
+    * seed        : seed of the random number generator. Defaults to 0.
+    * min_quality : smallest acceptable value of 4*sqrt(3)*area/(sum of the
+                    squared edge lengths), which is one for an equilateral
+                    triangle. Defaults to 0.1.
+
+    Output
+    ------
+    The tuple (xs, ys) of (num_triangles, 3) arrays of vertex coordinates.
+    """
+    random = np.random.RandomState(seed)
+    xs = np.zeros((0, 3))
+    ys = np.zeros((0, 3))
+    while len(xs) < num_triangles:
+        scales = 10.0**random.uniform(-2, 2, size=(num_triangles, 1))
+        shifts = random.uniform(-100, 100, size=(num_triangles, 2))
+        new_xs = shifts[:, 0:1] \
+            + scales*random.uniform(size=(num_triangles, 3))
+        new_ys = shifts[:, 1:2] \
+            + scales*random.uniform(size=(num_triangles, 3))
+        areas = 0.5*np.abs((new_xs[:, 1] - new_xs[:, 0])
+                           *(new_ys[:, 2] - new_ys[:, 0])
+                           - (new_xs[:, 2] - new_xs[:, 0])
+                           *(new_ys[:, 1] - new_ys[:, 0]))
+        squared_lengths = ((new_xs - np.roll(new_xs, 1, axis=1))**2
+                           + (new_ys - np.roll(new_ys, 1, axis=1))**2).sum(1)
+        good = 4*np.sqrt(3)*areas/squared_lengths >= min_quality
+        xs = np.vstack((xs, new_xs[good]))
+        ys = np.vstack((ys, new_ys[good]))
+    return (xs[0:num_triangles], ys[0:num_triangles])
+
+
+def physical_tables(kernels, xs, ys, x, y):
+    """
+    Evaluate the physical basis functions and their derivatives on every
+    triangle.
+
+    Required Arguments
+    ------------------
+    * kernels : module with the interface of ap.numeric.
+    * xs, ys  : (T, 3) arrays of vertex coordinates.
+    * x, y    : reference coordinates of the evaluation points.
+
+    Output
+    ------
+    The tuple (values, dx, dy, dxx, dxy, dyy) of (T, 21, N) arrays.
+    """
+    ref_values = kernels.ref_values(x, y)
+    (ref_dx, ref_dy) = kernels.ref_gradients(x, y)
+    (ref_dxx, ref_dxy, ref_dyy) = kernels.ref_hessians(x, y)
+    tables = np.empty((6, len(xs), 21, len(x)))
+    for index in range(len(xs)):
+        (C, B, b) = kernels.physical_maps(xs[index], ys[index])
+        tables[0, index] = kernels.physical_values(C, ref_values)
+        tables[1:3, index] = kernels.physical_gradients(C, B, ref_dx, ref_dy)
+        tables[3:6, index] = kernels.physical_hessians(C, B, ref_dxx, ref_dxy,
+                                                       ref_dyy)
+    return tuple(tables)
+
+
+def physical_third_derivative_tables(kernels, xs, ys, x, y):
+    """
+    Evaluate the third derivatives of the physical basis functions on every
+    triangle. Return the tuple (dxxx, dxxy, dxyy, dyyy) of (T, 21, N)
+    arrays (see physical_tables).
+    """
+    ref_tables = kernels.ref_third_derivatives(x, y)
+    tables = np.empty((4, len(xs), 21, len(x)))
+    for index in range(len(xs)):
+        (C, B, b) = kernels.physical_maps(xs[index], ys[index])
+        tables[:, index] = kernels.physical_third_derivatives(C, B,
+                                                              *ref_tables)
+    return tuple(tables)
+
+
+def local_matrices(kernels, xs, ys):
+    """
+    Compute the local mass, stiffness, betaplane, and biharmonic matrices,
+    and their stabilized versions, of every triangle with the default
+    quadrature rule. Return a dictionary of (T, 21, 21) arrays.
+    """
+    (x, y, weights) = kernels.get_quad_points()
+    ref_values = kernels.ref_values(x, y)
+    (ref_dx, ref_dy) = kernels.ref_gradients(x, y)
+    (ref_dxx, ref_dxy, ref_dyy) = kernels.ref_hessians(x, y)
+    ref_third_derivatives = kernels.ref_third_derivatives(x, y)
+    matrices = {name: np.empty((len(xs), 21, 21)) for name in _MATRICES}
+    for index in range(len(xs)):
+        (C, B, b) = kernels.physical_maps(xs[index], ys[index])
+        matrices['mass'][index] = kernels.matrix_mass(C, B, ref_values,
+                                                      weights)
+        matrices['stiffness'][index] = kernels.matrix_stiffness(
+            C, B, ref_dx, ref_dy, weights)
+        matrices['betaplane'][index] = kernels.matrix_betaplane(
+            C, B, ref_values, ref_dx, ref_dy, weights)
+        matrices['biharmonic'][index] = kernels.matrix_biharmonic(
+            C, B, ref_dxx, ref_dxy, ref_dyy, weights)
+        matrices['mass_stabilized'][index] = kernels.matrix_mass_stabilized(
+            C, B, ref_values, ref_dx, ref_dy, weights)
+        matrices['stiffness_stabilized'][index] = \
+            kernels.matrix_stiffness_stabilized(C, B, ref_dx, ref_dy, ref_dxx,
+                                                ref_dxy, ref_dyy, weights)
+        matrices['betaplane_stabilized'][index] = \
+            kernels.matrix_betaplane_stabilized(C, B, ref_dx, ref_dy, weights)
+        matrices['biharmonic_stabilized'][index] = \
+            kernels.matrix_biharmonic_stabilized(
+                C, B, ref_dxx, ref_dxy, ref_dyy, *(ref_third_derivatives
+                                                   + (weights,)))
+    return matrices
+
+
+def _normals(xs, ys):
+    """
+    Unit normals of the edges (0, 1), (0, 2), and (1, 2) used by the normal
+    derivative degrees of freedom: the edge direction rotated a quarter turn
+    counterclockwise. Return a (T, 3, 2) array.
+    """
+    normals = np.empty((len(xs), 3, 2))
+    for edge, (first, second) in enumerate(_EDGES):
+        normals[:, edge, 0] = ys[:, first] - ys[:, second]
+        normals[:, edge, 1] = xs[:, second] - xs[:, first]
+    return normals/np.sqrt((normals**2).sum(axis=2))[:, :, np.newaxis]
+
+
+def _dofs(normals, values, dx, dy, dxx, dxy, dyy):
+    """
+    Apply the 21 degrees of freedom to functions given by their values and
+    derivatives at the corners and edge midpoints (arrays whose first axis
+    is the triangle and second axis is the point, in the order of _DOF_X).
+    The result has the shape (T, 21, ...).
+    """
+    dofs = [values[:, 0:3]]
+    dofs.append(np.stack((dx[:, 0:3], dy[:, 0:3]), axis=2).reshape(
+        (len(values), 6) + values.shape[2:]))
+    dofs.append(np.stack((dxx[:, 0:3], dxy[:, 0:3], dyy[:, 0:3]),
+                         axis=2).reshape((len(values), 9) + values.shape[2:]))
+    extra_axes = (np.newaxis,)*(values.ndim - 2)
+    dofs.append(normals[(Ellipsis, 0) + extra_axes]*dx[:, 3:6]
+                + normals[(Ellipsis, 1) + extra_axes]*dy[:, 3:6])
+    return np.concatenate(dofs, axis=1)
+
+
+def check_duality(kernels, xs, ys):
+    """
+    Return the largest entry of the difference between the identity and the
+    degrees of freedom of the physical basis functions.
+    """
+    tables = physical_tables(kernels, xs, ys, _DOF_X, _DOF_Y)
+    # make the point the second axis and the basis function the third.
+    tables = [table.transpose((0, 2, 1)) for table in tables]
+    dofs = _dofs(_normals(xs, ys), *tables)
+    return np.abs(dofs - np.eye(21)).max()
+
+
+def _random_quintic(random):
+    """
+    Coefficients c[i, j] of x**i*y**j of a random polynomial of degree five.
+    """
+    degrees = np.add.outer(np.arange(6), np.arange(6))
+    return np.where(degrees <= 5, random.uniform(-1, 1, size=(6, 6)), 0.0)
+
+
+def _polynomial_tables(coefficients, xs, ys, x, y, orders=_ORDERS):
+    """
+    Evaluate a polynomial, written in coordinates centered at the first
+    vertex and scaled by the size of each triangle, and its derivatives at
+    the reference points (x, y) of every triangle. Return a tuple of (T, N)
+    arrays, one for each (x order, y order) pair; by default these are
+    (values, dx, dy, dxx, dxy, dyy).
+    """
+    poly = np.polynomial.polynomial
+    scales = np.sqrt((xs[:, 1] - xs[:, 0])**2 + (ys[:, 1] - ys[:, 0])**2)
+    # map the reference points to the scaled coordinates.
+    s = (np.outer(xs[:, 1] - xs[:, 0], x) + np.outer(xs[:, 2] - xs[:, 0], y)) \
+        / scales[:, np.newaxis]
+    t = (np.outer(ys[:, 1] - ys[:, 0], x) + np.outer(ys[:, 2] - ys[:, 0], y)) \
+        / scales[:, np.newaxis]
+    tables = []
+    for (x_order, y_order) in orders:
+        derivative = poly.polyder(poly.polyder(coefficients, x_order, axis=0),
+                                  y_order, axis=1)
+        tables.append(poly.polyval2d(s, t, derivative)
+                      / scales[:, np.newaxis]**(x_order + y_order))
+    return tuple(tables)
+
+
+def check_reproduction(kernels, xs, ys, num_polynomials=3, seed=0):
+    """
+    Interpolate random quintic polynomials and return the largest error in
+    the values or first, second, or third derivatives at the quadrature
+    points, relative to the largest exact value of the same kind on each
+    triangle.
+    """
+    random = np.random.RandomState(seed)
+    (x, y, weights) = kernels.get_quad_points()
+    basis = physical_tables(kernels, xs, ys, x, y) \
+        + physical_third_derivative_tables(kernels, xs, ys, x, y)
+    normals = _normals(xs, ys)
+    error = 0.0
+    for polynomial in range(num_polynomials):
+        coefficients = _random_quintic(random)
+        dofs = _dofs(normals, *_polynomial_tables(coefficients, xs, ys,
+                                                   _DOF_X, _DOF_Y))
+        exact = _polynomial_tables(coefficients, xs, ys, x, y,
+                                   orders=_ORDERS + _THIRD_ORDERS)
+        for table, exact_table in zip(basis, exact):
+            interpolated = np.einsum('ti,tin->tn', dofs, table)
+            size = np.abs(exact_table).max(axis=1)
+            error = max(error, (np.abs(interpolated - exact_table).max(axis=1)
+                                / size).max())
+    return error
+
+
+def check_matrices(kernels, xs, ys):
+    """
+    Check the local matrices of every triangle. Return a dictionary of the
+    largest relative errors:
+
+    * matrices     : difference from quadrature of the physical basis
+                     functions computed by the same kernels.
+    * symmetry     : asymmetry of the mass, stiffness, biharmonic, and
+                     stabilized betaplane matrices.
+    * definiteness : most negative eigenvalue of the same matrices (and the
+                     smallest eigenvalue of the mass matrix, which must be
+                     positive, enters as zero if it is not).
+    * null_space   : size of the stiffness matrices applied to a constant, of
+                     the biharmonic matrix applied to harmonic polynomials,
+                     and of the difference between the betaplane matrix
+                     applied to the function x and the mass matrix applied to
+                     a constant.
+    """
+    matrices = local_matrices(kernels, xs, ys)
+    (x, y, weights) = kernels.get_quad_points()
+    (values, dx, dy, dxx, dxy, dyy) = physical_tables(kernels, xs, ys, x, y)
+    (dxxx, dxxy, dxyy, dyyy) = physical_third_derivative_tables(kernels, xs,
+                                                                ys, x, y)
+    jacobians = np.abs((xs[:, 1] - xs[:, 0])*(ys[:, 2] - ys[:, 0])
+                       - (xs[:, 2] - xs[:, 0])*(ys[:, 1] - ys[:, 0]))
+    scaled_weights = np.outer(jacobians, weights)[:, np.newaxis, :]
+
+    def inner_products(left, right):
+        return np.einsum('tin,tjn->tij', left*scaled_weights, right)
+
+    def relative(difference, matrix):
+        return (np.abs(difference).max(axis=(1, 2))
+                / np.abs(matrix).max(axis=(1, 2))).max()
+
+    laplacians = dxx + dyy
+    quadrature = {'mass': inner_products(values, values),
+                  'stiffness': inner_products(dx, dx)
+                  + inner_products(dy, dy),
+                  'betaplane': inner_products(values, dx),
+                  'biharmonic': inner_products(laplacians, laplacians),
+                  'mass_stabilized': inner_products(dx, values),
+                  'stiffness_stabilized': inner_products(dxx, dx)
+                  + inner_products(dxy, dy),
+                  'betaplane_stabilized': inner_products(dx, dx),
+                  'biharmonic_stabilized': inner_products(dxxx + dxyy,
+                                                          laplacians)}
+    errors = {'matrices': max(relative(matrices[name] - quadrature[name],
+                                       quadrature[name])
+                              for name in quadrature)}
+
+    symmetric = ['mass', 'stiffness', 'biharmonic', 'betaplane_stabilized']
+    errors['symmetry'] = max(
+        relative(matrices[name] - matrices[name].transpose((0, 2, 1)),
+                 matrices[name]) for name in symmetric)
+    definiteness = 0.0
+    for name in symmetric:
+        matrix = matrices[name]
+        eigenvalues = np.linalg.eigvalsh(0.5*(matrix
+                                              + matrix.transpose((0, 2, 1))))
+        definiteness = max(definiteness, (-eigenvalues[:, 0]
+                                          / eigenvalues[:, -1]).max())
+        if name == 'mass' and np.any(eigenvalues[:, 0] <= 0):
+            definiteness = np.inf
+    errors['definiteness'] = definiteness
+
+    # degrees of freedom of 1, x, and the harmonic polynomials x*y and
+    # x**2 - y**2 (in the scaled coordinates of _polynomial_tables).
+    normals = _normals(xs, ys)
+    constant = np.zeros((6, 6))
+    constant[0, 0] = 1.0
+    linear = np.zeros((6, 6))
+    linear[1, 0] = 1.0
+    harmonic = np.zeros((6, 6))
+    harmonic[1, 1] = 1.0
+    harmonic[2, 0] = 0.7
+    harmonic[0, 2] = -0.7
+    (constant, linear, harmonic) = [
+        _dofs(normals, *_polynomial_tables(coefficients, xs, ys, _DOF_X,
+                                           _DOF_Y))
+        for coefficients in [constant, linear, harmonic]]
+    scales = np.sqrt((xs[:, 1] - xs[:, 0])**2 + (ys[:, 1] - ys[:, 0])**2)
+
+    def apply(name, dofs):
+        return np.einsum('tij,tj->ti', matrices[name], dofs)
+
+    def norms(vectors):
+        return np.abs(vectors).max(axis=1)
+
+    null_space = [
+        norms(apply('stiffness', constant))
+        / norms(matrices['stiffness'].reshape((len(xs), -1))),
+        norms(apply('stiffness_stabilized', constant))
+        / norms(matrices['stiffness_stabilized'].reshape((len(xs), -1))),
+        norms(apply('betaplane_stabilized', constant))
+        / norms(matrices['betaplane_stabilized'].reshape((len(xs), -1))),
+        norms(apply('biharmonic', harmonic))
+        / norms(matrices['biharmonic'].reshape((len(xs), -1))),
+        norms(apply('betaplane', linear)*scales[:, np.newaxis]
+              - apply('mass', constant)) / norms(apply('mass', constant))]
+    errors['null_space'] = max(error.max() for error in null_space)
+    return {name: float(error) for name, error in errors.items()}
+
+
+def check_combined(kernels, xs, ys):
+    """
+    Return the largest difference between the tables computed by ref_all
+    and physical_all and those computed by the separate kernels (see
+    physical_tables), relative to the largest value of each table.
+    """
+    (x, y, weights) = kernels.get_quad_points()
+    separate = physical_tables(kernels, xs, ys, x, y)
+    ref_tables = kernels.ref_all(x, y)
+    error = 0.0
+    for index in range(len(xs)):
+        (C, B, b) = kernels.physical_maps(xs[index], ys[index])
+        tables = kernels.physical_all(C, B, ref_tables)
+        for table, expected in zip(tables, separate):
+            error = max(error, np.abs(table - expected[index]).max()
+                        / np.abs(expected[index]).max())
+    # the direct evaluation path of ref_all.
+    num_points = 2*kernels.direct_threshold + 13
+    random = np.random.RandomState(0)
+    x = random.uniform(size=num_points)
+    y = random.uniform(size=num_points)*(1.0 - x)
+    separate = ((kernels.ref_values(x, y),) + kernels.ref_gradients(x, y)
+                + kernels.ref_hessians(x, y))
+    for table, expected in zip(kernels.ref_all(x, y), separate):
+        error = max(error, np.abs(table - expected).max()
+                    / np.abs(expected).max())
+    return error
+
+
+def check_direct_evaluation(kernels, seed=0):
+    """
+    Evaluate the reference basis functions and their derivatives at a
+    little more than twice kernels.direct_threshold random points, all at
+    once and in pieces of at most kernels.direct_threshold points. Return
+    the largest difference relative to the largest value of each table.
+    """
+    random = np.random.RandomState(seed)
+    num_points = 2*kernels.direct_threshold + 13
+    x = random.uniform(size=num_points)
+    y = random.uniform(size=num_points)*(1.0 - x)
+    pieces = range(0, num_points, kernels.direct_threshold)
+    error = 0.0
+    for function in [kernels.ref_values, kernels.ref_gradients,
+                     kernels.ref_hessians, kernels.ref_third_derivatives]:
+        tables = function(x, y)
+        piecewise = [function(x[start:start + kernels.direct_threshold],
+                              y[start:start + kernels.direct_threshold])
+                     for start in pieces]
+        if function is kernels.ref_values:
+            (tables, piecewise) = ((tables,), [(piece,) for piece in
+                                               piecewise])
+        for index, table in enumerate(tables):
+            expected = np.hstack([piece[index] for piece in piecewise])
+            error = max(error, np.abs(table - expected).max()
+                        / np.abs(expected).max())
+    return error
+
+
+def check_triangular_solve(kernels, size=200, seed=0):
+    """
+    Solve random sparse lower and upper triangular systems (with entries on
+    both sides of the diagonal, which must be ignored, and unsorted
+    columns) with sparse_triangular_solve. Return the largest residual
+    relative to the size of the right hand side.
+    """
+    random = np.random.RandomState(seed)
+    dense = random.uniform(-1.0, 1.0, (size, size))
+    dense[random.uniform(size=(size, size)) < 0.9] = 0.0
+    dense[np.arange(size), np.arange(size)] = random.uniform(1.0, 2.0, size)
+    (rows, columns) = np.nonzero(dense)
+    order = np.lexsort((random.uniform(size=len(rows)), rows))
+    (rows, columns) = (rows[order], columns[order])
+    indptr = np.searchsorted(rows, np.arange(size + 1))
+    rhs = random.uniform(-1.0, 1.0, size)
+    error = 0.0
+    for (lower, triangle) in [(True, np.tril(dense)), (False, np.triu(dense))]:
+        solution = kernels.sparse_triangular_solve(
+            indptr, columns, dense[rows, columns], rhs, lower=lower)
+        error = max(error, np.abs(triangle.dot(solution) - rhs).max()
+                    / np.abs(rhs).max())
+    return error
+
+
+def check_qg_jacobian(kernels, xs, ys, seed=0):
+    """
+    Evaluate the quasi-geostrophic advection term (see
+    ap.numeric.qg_jacobian) on the triangles, treated as a mesh of
+    disconnected elements, for a random psi. Compare the residual and the
+    local Jacobians with quadrature of the physical tables, and check that
+    (R(psi + d) - R(psi - d))/2 equals the Jacobian times d, which holds
+    exactly since R is quadratic. Return the largest relative error.
+    """
+    random = np.random.RandomState(seed)
+    (x, y, weights) = kernels.get_quad_points()
+    tables = list(kernels.ref_all(x, y)[0:3]) \
+        + list(kernels.ref_third_derivatives(x, y))
+    element_dofs = np.arange(21*len(xs)).reshape((-1, 21))
+    psi = random.standard_normal(21*len(xs))
+    (residual, jacobians) = kernels.qg_jacobian(
+        xs, ys, element_dofs, psi, *(tables + [weights]), jacobians=True)
+
+    (values, dx, dy) = physical_tables(kernels, xs, ys, x, y)[0:3]
+    (dxxx, dxxy, dxyy, dyyy) = physical_third_derivative_tables(
+        kernels, xs, ys, x, y)
+    (laplacian_x, laplacian_y) = (dxxx + dxyy, dxxy + dyyy)
+    coefficients = psi.reshape((-1, 21))
+
+    def field(table):
+        return np.einsum('ti,tiq->tq', coefficients, table)
+
+    (psi_x, psi_y) = (field(dx), field(dy))
+    (lap_x, lap_y) = (field(laplacian_x), field(laplacian_y))
+    areas = 0.5*np.abs((xs[:, 1] - xs[:, 0])*(ys[:, 2] - ys[:, 0])
+                       - (xs[:, 2] - xs[:, 0])*(ys[:, 1] - ys[:, 0]))
+    scaled = values*(2.0*areas[:, np.newaxis]*weights)[:, np.newaxis, :]
+    expected = np.einsum('tiq,tq->ti', scaled,
+                         psi_x*lap_y - psi_y*lap_x).ravel()
+    linearized = dx*lap_y[:, np.newaxis, :] - dy*lap_x[:, np.newaxis, :] \
+        + psi_x[:, np.newaxis, :]*laplacian_y \
+        - psi_y[:, np.newaxis, :]*laplacian_x
+    expected_jacobians = np.einsum('tiq,tjq->tij', scaled, linearized)
+
+    direction = random.standard_normal(21*len(xs))
+    difference = 0.5*(
+        kernels.qg_jacobian(xs, ys, element_dofs, psi + direction,
+                            *(tables + [weights]))
+        - kernels.qg_jacobian(xs, ys, element_dofs, psi - direction,
+                              *(tables + [weights])))
+    product = np.einsum('tij,tj->ti', jacobians,
+                        direction.reshape((-1, 21))).ravel()
+    return max(np.abs(residual - expected).max()/np.abs(expected).max(),
+               np.abs(jacobians - expected_jacobians).max()
+               / np.abs(expected_jacobians).max(),
+               np.abs(difference - product).max()/np.abs(product).max())
+
+
+def check_gather_scatter(kernels, xs, ys, num_fields=3, seed=0):
+    """
+    Number the degrees of freedom of the triangles at random, with repeats,
+    and check the gather and scatter kernels against NumPy indexing and the
+    fused evaluation (ap.numeric.gather_evaluate) of several fields against
+    the physical tables. Return the largest relative error.
+    """
+    random = np.random.RandomState(seed)
+    num_dofs = 10*len(xs)
+    element_dofs = random.randint(0, num_dofs, size=(len(xs), 21))
+    fields = random.standard_normal((num_fields, num_dofs))
+    local = kernels.gather(element_dofs, fields)
+    expected_local = fields[:, element_dofs]
+
+    expected_sums = np.zeros((num_fields, num_dofs))
+    for index in range(num_fields):
+        np.add.at(expected_sums[index], element_dofs, local[index])
+    sums = kernels.scatter_add(element_dofs, local, num_dofs)
+
+    (x, y, weights) = kernels.get_quad_points()
+    evaluated = kernels.gather_evaluate(xs, ys, element_dofs, fields,
+                                        kernels.ref_all(x, y))
+    tables = np.array(physical_tables(kernels, xs, ys, x, y))
+    expected = np.einsum('fti,ktiq->kftq', expected_local, tables)
+    single = kernels.gather_evaluate(xs, ys, element_dofs, fields[0],
+                                     kernels.ref_all(x, y))
+    return max(np.abs(local - expected_local).max(),
+               np.abs(sums - expected_sums).max()/np.abs(expected_sums).max(),
+               np.abs(evaluated - expected).max()/np.abs(expected).max(),
+               np.abs(single - evaluated[:, 0]).max()
+               / np.abs(expected).max())
+
+
+def compare_kernels(reference, candidate, xs, ys):
+    """
+    Compare two implementations of the kernels (modules with the interface
+    of ap.numeric) on the given triangles. Return a dictionary relating the
+    name of each table or matrix to the largest difference, relative to the
+    largest reference value on each triangle.
+    """
+    (x, y, weights) = reference.get_quad_points()
+    names = ['values', 'dx', 'dy', 'dxx', 'dxy', 'dyy', 'dxxx', 'dxxy',
+             'dxyy', 'dyyy']
+    differences = dict()
+    for name, expected, computed in zip(
+            names, physical_tables(reference, xs, ys, x, y)
+            + physical_third_derivative_tables(reference, xs, ys, x, y),
+            physical_tables(candidate, xs, ys, x, y)
+            + physical_third_derivative_tables(candidate, xs, ys, x, y)):
+        differences[name] = float((
+            np.abs(computed - expected).max(axis=(1, 2))
+            / np.abs(expected).max(axis=(1, 2))).max())
+    expected = local_matrices(reference, xs, ys)
+    computed = local_matrices(candidate, xs, ys)
+    for name in expected:
+        differences[name] = float((
+            np.abs(computed[name] - expected[name]).max(axis=(1, 2))
+            / np.abs(expected[name]).max(axis=(1, 2))).max())
+    return differences
+
+
+def run(num_triangles=1000, seed=0, kernels=nm, verbose=True):
+    """
+    Run every check on random triangles and raise an AssertionError if any
+    error exceeds its tolerance (see TOLERANCES).
+
+    Optional Arguments
+    ------------------
+    * num_triangles : the number of random triangles. Defaults to 1000.
+    * seed          : seed for the triangles and polynomials. Defaults to 0.
+    * kernels       : the module of kernels to check. Defaults to
+                      ap.numeric.
+    * verbose       : if True (the default), print each error.
+
+    Output
+    ------
+    A dictionary relating the name of each check to its error.
+    """
+    start = time.time()
+    (xs, ys) = random_triangles(num_triangles, seed=seed)
+    errors = {'duality': float(check_duality(kernels, xs, ys)),
+              'reproduction': float(check_reproduction(kernels, xs, ys,
+                                                       seed=seed))}
+    errors.update(check_matrices(kernels, xs, ys))
+    errors['combined'] = float(check_combined(kernels, xs, ys))
+    errors['direct'] = float(check_direct_evaluation(kernels, seed=seed))
+    errors['triangular'] = float(check_triangular_solve(kernels, seed=seed))
+    errors['qg'] = float(check_qg_jacobian(kernels, xs, ys, seed=seed))
+    errors['gather'] = float(check_gather_scatter(kernels, xs, ys,
+                                                  seed=seed))
+    failures = []
+    for name in sorted(errors.keys()):
+        if verbose:
+            print("max relative error for {0}: {1:.3e}".format(name,
+                                                               errors[name]))
+        if not errors[name] <= TOLERANCES[name]:
+            failures.append(name)
+    if verbose:
+        print("checked {0} triangles in {1:.2f}s".format(num_triangles,
+                                                         time.time() - start))
+    assert not failures, "checks failed: " + ", ".join(failures)
+    return errors
+
+
+if __name__ == '__main__':
+    run()